@@ -0,0 +1,115 @@
+"""
+Benchmarks the crossed-out check of `Evaluator` against per-phrase loops.
+
+Substring semantics: the previous loop (one `lower()` and substring search
+per crossed-out phrase) against `PhraseMatcher`, which scans each answer once
+with a trie-shaped regex over its phrases. Whole-word semantics: a per-phrase
+`\\b...\\b` regex search against `PhraseMatcher(word_boundary=True)`, which
+splits each answer into words once and looks all phrases up by hash.
+
+Answers are synthetic sentences; each paper has `--phrases` crossed-out
+phrases spread over its answers, a quarter of which the prediction repeats.
+The matcher is built once per paper outside the timed loop, as the evaluator
+keeps it with the compiled ground truth; "build" includes the first pass,
+which compiles the per-answer scanners of the substring matcher.
+
+With few phrases per answer both ways take microseconds; the matchers pay
+off as the phrases grow, since the loops scan an answer once per phrase.
+The run fails unless both matchers beat the loops by `--min_speedup` at the
+largest phrase count.
+
+Usage: python bench_crossed_out.py [--phrases 10 100 1000] [--answer_words 50] [--min_speedup 1.5]
+"""
+import argparse
+import random
+import re
+import time
+from fonix_ocr_bench.utils import PhraseMatcher
+
+
+def substring_loop(answers, crossed_out):
+    """The previous crossed-out count, summed over the answers."""
+    total = 0
+    for answer, phrases in zip(answers, crossed_out):
+        answer_lower = answer.lower()
+        for phrase in phrases:
+            if phrase.lower() in answer_lower:
+                total += 1
+    return total
+
+
+def word_regex_loop(answers, crossed_out):
+    """Whole-word matching done the direct way, one regex search per phrase."""
+    total = 0
+    for answer, phrases in zip(answers, crossed_out):
+        for phrase in phrases:
+            if re.search(r"\b" + re.escape(phrase) + r"\b", answer, re.IGNORECASE):
+                total += 1
+    return total
+
+
+def matcher_scan(matcher, answers, crossed_out):
+    return sum(matcher.count(answer, phrases) for answer, phrases in zip(answers, crossed_out) if phrases)
+
+
+def synthetic_paper(rng, num_phrases, num_answers, answer_words, vocab_size=5000):
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    answers = [" ".join(rng.choices(vocab, k=answer_words)) for _ in range(num_answers)]
+    crossed_out = [[] for _ in range(num_answers)]
+    for _ in range(num_phrases):
+        a = rng.randrange(num_answers)
+        phrase = " ".join(rng.choices(vocab, k=rng.randint(1, 3)))
+        crossed_out[a].append(phrase.upper())
+        if rng.random() < 0.25:
+            answers[a] += " " + phrase
+    return answers, crossed_out
+
+
+def best_time(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start_time)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crossed-out phrase matching")
+    parser.add_argument("--phrases", type=int, nargs="+", default=[10, 100, 1000, 5000], help="Crossed-out phrases per paper")
+    parser.add_argument("--answers", type=int, default=20, help="Answers per paper")
+    parser.add_argument("--answer_words", type=int, default=50, help="Words per answer")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per measurement (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min_speedup", type=float, default=1.5, help="Speedup both matchers must reach at the largest phrase count")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'phrases':>8} {'loop':>9} {'matcher':>9} {'speedup':>8} {'word regex':>10} {'matcher':>9} {'speedup':>8} {'build':>9}"
+          f"   hits (substring / whole words)")
+    for num_phrases in args.phrases:
+        answers, crossed_out = synthetic_paper(rng, num_phrases, args.answers, args.answer_words)
+        all_phrases = [phrase for phrases in crossed_out for phrase in phrases]
+        def build():
+            matcher = PhraseMatcher(all_phrases)
+            matcher_scan(matcher, answers, crossed_out)
+            return matcher
+
+        build_time, matcher = best_time(build, args.repeats)
+        word_matcher = PhraseMatcher(all_phrases, word_boundary=True)
+        loop_time, loop_hits = best_time(lambda: substring_loop(answers, crossed_out), args.repeats)
+        scan_time, scan_hits = best_time(lambda: matcher_scan(matcher, answers, crossed_out), args.repeats)
+        regex_time, regex_hits = best_time(lambda: word_regex_loop(answers, crossed_out), args.repeats)
+        word_time, word_hits = best_time(lambda: matcher_scan(word_matcher, answers, crossed_out), args.repeats)
+        print(f"{num_phrases:>8} {loop_time * 1000:>7.2f}ms {scan_time * 1000:>7.2f}ms {loop_time / scan_time:>7.1f}x"
+              f" {regex_time * 1000:>8.2f}ms {word_time * 1000:>7.2f}ms {regex_time / word_time:>7.1f}x {build_time * 1000:>7.2f}ms"
+              f"   {loop_hits}={scan_hits} / {regex_hits}={word_hits}")
+        assert loop_hits == scan_hits and regex_hits == word_hits, "matcher counts differ from the loops"
+        speedups = (loop_time / scan_time, regex_time / word_time)
+
+    if min(speedups) < args.min_speedup:
+        raise SystemExit(f"Speedup at {args.phrases[-1]} phrases below {args.min_speedup}x: "
+                         f"substring {speedups[0]:.1f}x, whole words {speedups[1]:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,23 @@
 from .model_interface import ModelInterface, PredictionResult, UsageStats
 from .gemini3_model import Gemini3Model
-from .dataset import BenchmarkDataset
+from .cache import CachedModel, DiskLRUCache
+from .policy import ResilientModel, RetryPolicy, CircuitBreaker, TokenBucket
+from .rendering import PageCache, RenderOptions
+from .context_cache import ContextCacheManager
+from .batch import BatchTransport, GeminiBatchTransport, LocalBatchTransport
+from .files import FileStore, FileRegistry, FileUploader, GeminiFileUploader, LocalFileUploader
+from .dataset import BenchmarkDataset, LazyBenchmarkDataset
+from .gt_index import CompiledGT, GroundTruthIndex
+from .results import ResultSink, SummaryAggregator
+from .sharding import ShardedDataset, merge_runs
+from .stages import EvaluationStage, RefinementStage
 from .runner import BenchmarkRunner
 from .evaluation import Evaluator
-from .refinement import Refiner
-from .utils import word_diff
+from .columnar import AnswerTable, ColumnarEvaluator
+from .prefilter import DiffRules
+from .refinement import Refiner, VerdictStore
+from .json_extract import ExtractedJSON, extract_json
+from .utils import PhraseMatcher, word_diff
 from .logger import logger
 
 __all__ = [
@@ -12,10 +25,43 @@ __all__ = [
     "PredictionResult",
     "UsageStats",
     "Gemini3Model",
+    "CachedModel",
+    "DiskLRUCache",
+    "ResilientModel",
+    "RetryPolicy",
+    "CircuitBreaker",
+    "TokenBucket",
+    "PageCache",
+    "RenderOptions",
+    "ContextCacheManager",
+    "BatchTransport",
+    "GeminiBatchTransport",
+    "LocalBatchTransport",
+    "FileStore",
+    "FileRegistry",
+    "FileUploader",
+    "GeminiFileUploader",
+    "LocalFileUploader",
     "BenchmarkDataset",
+    "LazyBenchmarkDataset",
+    "CompiledGT",
+    "GroundTruthIndex",
+    "ResultSink",
+    "SummaryAggregator",
+    "ShardedDataset",
+    "merge_runs",
+    "EvaluationStage",
+    "RefinementStage",
     "BenchmarkRunner",
     "Evaluator",
+    "AnswerTable",
+    "ColumnarEvaluator",
+    "DiffRules",
     "Refiner",
+    "VerdictStore",
+    "ExtractedJSON",
+    "extract_json",
     "word_diff",
+    "PhraseMatcher",
     "logger",
 ]
@@ -0,0 +1,182 @@
+import json
+import os
+import pathlib
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Union
+from .model_interface import ModelInterface, PredictionResult, UsageStats
+from .logger import logger
+
+
+@dataclass
+class BatchRequest:
+    """One model request of a batch job, as serialized to `batch_requests.jsonl`."""
+    key: str
+    prompt: str
+    system_instruction: str
+    image_path: Optional[str] = None
+
+
+def write_batch_requests(requests: List[BatchRequest], path: Union[str, pathlib.Path]):
+    with open(path, "w", encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(asdict(request)) + "\n")
+
+
+def read_batch_requests(path: Union[str, pathlib.Path]) -> Iterator[BatchRequest]:
+    with open(path, "r", encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield BatchRequest(**json.loads(line))
+
+
+class BatchTransport(ABC):
+    """
+    Submits a file of BatchRequests as one job and returns the results.
+
+    `cost_factor` scales `ModelInterface.calculate_cost` for batch pricing.
+    """
+
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    RUNNING = "running"
+
+    cost_factor: float = 1.0
+
+    @abstractmethod
+    def submit(self, requests_path: str) -> str:
+        """Submits the requests in `requests_path` and returns a job id."""
+        pass
+
+    @abstractmethod
+    def poll(self, job_id: str) -> str:
+        """Returns the job state: SUCCEEDED, FAILED or RUNNING."""
+        pass
+
+    @abstractmethod
+    def results(self, job_id: str) -> Dict[str, Union[PredictionResult, Exception]]:
+        """Maps each request key to its PredictionResult, or the error it failed with."""
+        pass
+
+    def wait(self, job_id: str, poll_interval: float = 30.0, timeout: Optional[float] = None) -> Dict[str, Union[PredictionResult, Exception]]:
+        start_time = time.monotonic()
+        while True:
+            state = self.poll(job_id)
+            if state == self.SUCCEEDED:
+                return self.results(job_id)
+            if state == self.FAILED:
+                raise RuntimeError(f"Batch job {job_id} failed")
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                raise TimeoutError(f"Batch job {job_id} still running after {timeout}s")
+            logger.info(f"Batch job {job_id} still running, checking again in {poll_interval}s")
+            time.sleep(poll_interval)
+
+
+class LocalBatchTransport(BatchTransport):
+    """
+    Runs a batch synchronously through any ModelInterface and stores the
+    results as JSONL under `jobs_dir`. A stand-in for provider batch APIs.
+    """
+
+    def __init__(self, model: ModelInterface, jobs_dir: str = ".fonix_cache/batch_jobs"):
+        self.model = model
+        self.jobs_dir = pathlib.Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+
+    def _results_path(self, job_id: str) -> pathlib.Path:
+        return self.jobs_dir / f"{job_id}.results.jsonl"
+
+    def submit(self, requests_path: str) -> str:
+        job_id = uuid.uuid4().hex
+        tmp_path = self._results_path(job_id).with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            for request in read_batch_requests(requests_path):
+                try:
+                    result = self.model.call(request.prompt, request.system_instruction, image_path=request.image_path)
+                    line = {"key": request.key, "text": result.text, "usage": asdict(result.usage)}
+                except Exception as e:
+                    line = {"key": request.key, "error": str(e)}
+                f.write(json.dumps(line) + "\n")
+        os.replace(tmp_path, self._results_path(job_id))
+        return job_id
+
+    def poll(self, job_id: str) -> str:
+        return self.SUCCEEDED if self._results_path(job_id).exists() else self.FAILED
+
+    def results(self, job_id: str) -> Dict[str, Union[PredictionResult, Exception]]:
+        results = {}
+        with open(self._results_path(job_id), "r", encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "error" in entry:
+                    results[entry["key"]] = RuntimeError(entry["error"])
+                else:
+                    results[entry["key"]] = PredictionResult(text=entry["text"], usage=UsageStats(**entry["usage"]))
+        return results
+
+
+class GeminiBatchTransport(BatchTransport):
+    """
+    Gemini Batch API transport. Requests are converted with
+    `Gemini3Model.batch_request`, uploaded as a JSONL file and billed at the
+    batch price (half the interactive price). Set the model's `file_store`
+    to reference uploaded PDFs instead of inlining them in the JSONL.
+    """
+
+    cost_factor = 0.5
+
+    # Per-request failures of a partially succeeded job are reported in its results file
+    SUCCEEDED_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+    FAILED_STATES = {"JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.client = model.client
+
+    def submit(self, requests_path: str) -> str:
+        provider_path = pathlib.Path(requests_path).with_suffix(".gemini.jsonl")
+        with open(provider_path, "w", encoding='utf-8') as f:
+            for request in read_batch_requests(requests_path):
+                line = {
+                    "key": request.key,
+                    "request": self.model.batch_request(request.prompt, request.system_instruction, request.image_path)
+                }
+                f.write(json.dumps(line) + "\n")
+
+        uploaded = self.client.files.upload(file=str(provider_path), config={"mime_type": "jsonl"})
+        job = self.client.batches.create(
+            model=self.model.model_name,
+            src=uploaded.name,
+            config={"display_name": pathlib.Path(requests_path).parent.name}
+        )
+        logger.info(f"Submitted batch job {job.name}")
+        return job.name
+
+    def _job(self, job_id: str):
+        return self.client.batches.get(name=job_id)
+
+    def poll(self, job_id: str) -> str:
+        state = getattr(self._job(job_id).state, "name", None)
+        if state in self.SUCCEEDED_STATES:
+            return self.SUCCEEDED
+        if state in self.FAILED_STATES:
+            return self.FAILED
+        return self.RUNNING
+
+    def results(self, job_id: str) -> Dict[str, Union[PredictionResult, Exception]]:
+        job = self._job(job_id)
+        content = self.client.files.download(file=job.dest.file_name)
+        results = {}
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "error" in entry:
+                results[entry["key"]] = RuntimeError(json.dumps(entry["error"]))
+                continue
+            results[entry["key"]] = self.model.batch_result(entry["response"])
+        return results
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from .model_interface import ModelInterface, PredictionResult, UsageStats, run_blocking
+from .logger import logger
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DiskLRUCache:
+    """
+    Content-addressed byte store on disk with size-based LRU eviction.
+
+    Entries live in `cache_dir/<key[:2]>/<key>`. Recency is tracked in memory
+    and mirrored to file mtimes so it survives restarts.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1 << 30):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._load_index()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / key
+
+    def _load_index(self):
+        files = [p for p in self.cache_dir.glob("*/*") if p.is_file() and not p.name.endswith(".tmp")]
+        files.sort(key=lambda p: p.stat().st_mtime)
+        for p in files:
+            size = p.stat().st_size
+            self._entries[p.name] = size
+            self._size += size
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Evicted cache entry {key[:12]} ({size} bytes)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                self._size -= self._entries.pop(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{key}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._size += len(data)
+            self._evict()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._size
+
+
+class CachedModel(ModelInterface):
+    """
+    Wraps any ModelInterface and serves repeated requests from an on-disk cache.
+
+    The cache key is a hash over the wrapped model's config (see
+    `ModelInterface.get_config`), the system instruction, the prompt, any
+    extra call arguments and the bytes of the attached PDF/page image.
+
+    Hits come back with `cached=True` and the usage of the original call,
+    so the runner can report their cost as saved instead of spent.
+    """
+
+    def __init__(self, model: ModelInterface, cache_dir: str = ".fonix_cache/responses", max_bytes: int = 1 << 30):
+        self.model = model
+        self.cache = DiskLRUCache(cache_dir, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Expose settings of the wrapped model (model_name, temperature, ...)
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.model.get_config()
+
+    def cache_key(self, prompt: str, system_instruction: str, image_path: Optional[str] = None,
+                  image_bytes: Optional[bytes] = None, **kwargs) -> str:
+        header = {
+            "model": self.model.get_config(),
+            "system_instruction": system_instruction,
+            "prompt": prompt,
+            "kwargs": kwargs,
+        }
+        h = hashlib.sha256(json.dumps(header, sort_keys=True, default=str).encode("utf-8"))
+        if image_path is not None:
+            h.update(b"\x00file:" + file_digest(image_path).encode("ascii"))
+        if image_bytes is not None:
+            h.update(b"\x00bytes:" + hashlib.sha256(image_bytes).hexdigest().encode("ascii"))
+        return h.hexdigest()
+
+    def _lookup(self, key: str) -> Optional[PredictionResult]:
+        data = self.cache.get(key)
+        if data is None:
+            return None
+        try:
+            entry = json.loads(data)
+            return PredictionResult(text=entry["text"], usage=UsageStats(**entry["usage"]), cached=True)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring corrupt cache entry {key[:12]}: {e}")
+            return None
+
+    def _store(self, key: str, result: PredictionResult):
+        entry = {"text": result.text, "usage": result.usage.__dict__}
+        self.cache.put(key, json.dumps(entry).encode("utf-8"))
+
+    def _record(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def call(self, prompt: str, system_instruction: str, image_path: Optional[str] = None,
+             image_bytes: Optional[bytes] = None, **kwargs) -> PredictionResult:
+        key = self.cache_key(prompt, system_instruction, image_path, image_bytes, **kwargs)
+        cached = self._lookup(key)
+        self._record(cached is not None)
+        if cached is not None:
+            logger.debug(f"Response cache hit ({key[:12]})")
+            return cached
+
+        if image_path is not None:
+            kwargs["image_path"] = image_path
+        if image_bytes is not None:
+            kwargs["image_bytes"] = image_bytes
+        result = self.model.call(prompt, system_instruction, **kwargs)
+        self._store(key, result)
+        return result
+
+    async def acall(self, prompt: str, system_instruction: str, image_path: Optional[str] = None,
+                    image_bytes: Optional[bytes] = None, **kwargs) -> PredictionResult:
+        # Hashing the PDF/page and the cache's disk reads and writes are blocking, keep them off the event loop
+        key = await run_blocking(self.cache_key, prompt, system_instruction, image_path, image_bytes, **kwargs)
+        cached = await run_blocking(self._lookup, key)
+        self._record(cached is not None)
+        if cached is not None:
+            logger.debug(f"Response cache hit ({key[:12]})")
+            return cached
+
+        if image_path is not None:
+            kwargs["image_path"] = image_path
+        if image_bytes is not None:
+            kwargs["image_bytes"] = image_bytes
+        result = await self.model.acall(prompt, system_instruction, **kwargs)
+        await run_blocking(self._store, key, result)
+        return result
+
+    def calculate_cost(self, usage: Any) -> float:
+        return self.model.calculate_cost(usage)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and storage usage, as written into summary.json."""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total > 0 else 0,
+            "entries": len(self.cache),
+            "size_bytes": self.cache.size_bytes,
+            "max_bytes": self.cache.max_bytes,
+        }
@@ -6,7 +6,7 @@ import argparse
 import dotenv
 from google.genai import types
 from .model_interface import ModelInterface
-from .gemini_model import GeminiModel
+from .gemini3_model import Gemini3Model
 from .dataset import BenchmarkDataset
 from .runner import BenchmarkRunner
 
@@ -36,6 +36,7 @@ def main():
 Examples:
   fonix-ocr-bench --data_dir ./data --output_dir ./results
   fonix-ocr-bench --model gemini-3-flash-preview
+  fonix-ocr-bench --resume ./results/20250101_120000
   
 Environment Variables:
   GOOGLE_API_KEY    Google API key for Gemini models
@@ -45,6 +46,7 @@ Environment Variables:
     parser.add_argument("--output_dir", type=str, default="./results", help="Path to output directory")
     parser.add_argument("--api_key", type=str, default=os.getenv("GOOGLE_API_KEY"), help="Google API Key")
     parser.add_argument("--model", type=str, default="gemini-3-flash-preview", help="Gemini Model Name")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN_DIR", help="Continue an interrupted run in RUN_DIR")
     
     args = parser.parse_args()
     
@@ -53,7 +55,7 @@ Environment Variables:
         return 1
 
     # Initialize Components
-    model = GeminiModel(api_key=args.api_key, model_name=args.model)
+    model = Gemini3Model(api_key=args.api_key, model_name=args.model)
     
     dataset = BenchmarkDataset(data_dir=args.data_dir)
     runner = BenchmarkRunner(dataset=dataset, model=model, output_dir=args.output_dir)
@@ -62,7 +64,8 @@ Environment Variables:
     print(f"Starting Benchmark with model: {args.model}")
     runner.run(
         system_instruction=SYSTEM_INSTRUCTION,
-        prompt_template=PROMPT_TEMPLATE
+        prompt_template=PROMPT_TEMPLATE,
+        resume_from=args.resume
     )
     
     return 0
@@ -0,0 +1,243 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from .evaluation import Evaluator
+from .gt_index import CompiledGT, MISSING, compile_ground_truth, resolve_path
+from .prefilter import DiffRules
+from .utils import word_diff
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+QTYPE_FIELDS = ["fabricated", "crossed", "illegible", "gt_words", "hallu_words"]
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Columnar evaluation requires NumPy. Install it with `pip install numpy`.")
+
+
+def question_type_totals(samples: Iterable[Optional[Dict[str, Dict[str, int]]]]) -> Dict[str, Dict[str, int]]:
+    """
+    Sums the `question_type_metrics` of many samples per question type with NumPy group-bys.
+
+    The counts are those of the run-level `question_type_summary` before
+    rates are added; question types appear in order of first occurrence.
+    """
+    _require_numpy()
+    names: Dict[str, int] = {}
+    codes = []
+    rows = []
+    for metrics in samples:
+        for qtype, counts in (metrics or {}).items():
+            codes.append(names.setdefault(qtype, len(names)))
+            rows.append([counts.get(name, 0) for name in QTYPE_FIELDS])
+    if not rows:
+        return {}
+    keys = np.array(codes, dtype=np.int64)
+    values = np.array(rows, dtype=np.int64)
+    sums = {name: np.bincount(keys, weights=values[:, i], minlength=len(names)).astype(np.int64)
+            for i, name in enumerate(QTYPE_FIELDS)}
+    return {qtype: {name: int(sums[name][code]) for name in QTYPE_FIELDS} for qtype, code in names.items()}
+
+
+@dataclass
+class AnswerTable:
+    """
+    Every GT/prediction leaf answer of a set of samples, one row per answer.
+
+    Columns are filled row by row while flattening and turned into NumPy
+    arrays by `columns`. The word diff and crossed-out matching are string
+    work and happen while flattening; everything counted from them is
+    aggregated with vectorized group-bys.
+    """
+    sample: List[int] = field(default_factory=list)
+    qtype: List[int] = field(default_factory=list)
+    essay: List[bool] = field(default_factory=list)
+    gt_blank: List[bool] = field(default_factory=list)
+    pred_filled: List[bool] = field(default_factory=list)
+    gt_legible: List[bool] = field(default_factory=list)
+    pred_legible: List[bool] = field(default_factory=list)
+    crossed: List[int] = field(default_factory=list)
+    scored: List[bool] = field(default_factory=list)
+    gt_words: List[int] = field(default_factory=list)
+    hallu_words: List[int] = field(default_factory=list)
+    qtype_names: List[str] = field(default_factory=list)
+    num_samples: int = 0
+    replaced_word_pairs: List[List[Dict[str, Any]]] = field(default_factory=list)
+    inserted_words: List[List[Dict[str, Any]]] = field(default_factory=list)
+    rules: Optional[DiffRules] = None
+
+    def _qtype_code(self, qtype: str, codes: Dict[str, int]) -> int:
+        if qtype not in codes:
+            codes[qtype] = len(self.qtype_names)
+            self.qtype_names.append(qtype)
+        return codes[qtype]
+
+    def _add_row(self, sample: int, qtype: int, essay: bool, gt_blank: bool, pred_filled: bool,
+                 gt_legible: bool, pred_legible: bool, crossed: int, scored: bool, gt_words: int, hallu_words: int):
+        self.sample.append(sample)
+        self.qtype.append(qtype)
+        self.essay.append(essay)
+        self.gt_blank.append(gt_blank)
+        self.pred_filled.append(pred_filled)
+        self.gt_legible.append(gt_legible)
+        self.pred_legible.append(pred_legible)
+        self.crossed.append(crossed)
+        self.scored.append(scored)
+        self.gt_words.append(gt_words)
+        self.hallu_words.append(hallu_words)
+
+    def _diff(self, sample: int, gt_text: str, pred_text: str, tnum: Any, sub_path: Any, qtype: Any) -> int:
+        """Word-diffs one answer, records the replaced/inserted words and returns the hallucinated word count."""
+        hallu_words = 0
+        location = {"question": tnum} if sub_path is None else {"question": tnum, "sub_question": sub_path}
+        location["question_type"] = qtype
+        for tag, gtw, prw in word_diff(gt_text, pred_text):
+            if tag == "replace" and gtw != prw:
+                entry = {**location, "gt_words": gtw, "pred_words": prw}
+                self.replaced_word_pairs[sample].append(entry if self.rules is None else self.rules.annotate(entry, gtw, prw))
+                hallu_words += len(prw)
+            elif tag == "insert" and prw:
+                entry = {**location, "words": prw}
+                self.inserted_words[sample].append(entry if self.rules is None else self.rules.annotate(entry, [], prw))
+                hallu_words += len(prw)
+        return hallu_words
+
+    @classmethod
+    def from_samples(cls, pairs: Iterable[Tuple[Union[Dict[str, Any], CompiledGT], Dict[str, Any]]],
+                     crossed_out_word_boundary: bool = False, rules: Optional[DiffRules] = None) -> "AnswerTable":
+        """
+        Flattens (ground truth, prediction) pairs; row `sample` is the index of the pair.
+        Ground truths may be given as dicts or precompiled `CompiledGT`s.
+        """
+        table = cls(rules=rules)
+        codes: Dict[str, int] = {}
+        for sample, (gt, pred) in enumerate(pairs):
+            table.num_samples += 1
+            table.replaced_word_pairs.append([])
+            table.inserted_words.append([])
+            compiled = gt if isinstance(gt, CompiledGT) else compile_ground_truth(gt)
+            crossed_out = compiled.crossed_out_matcher(crossed_out_word_boundary)
+            pred_questions = {q["test_number"]: q for q in pred.get("questions", [])}
+            for leaf in compiled.leaves:
+                tnum = leaf.test_number
+                if tnum not in pred_questions:
+                    continue
+                qtype = table._qtype_code(leaf.question_type, codes)
+                pred_ans = pred_questions[tnum].get("student_answers", "")
+
+                if leaf.essay:
+                    gt_ans = leaf.answer
+                    scored = isinstance(pred_ans, str) and gt_ans.strip() != ""
+                    hallu_words = table._diff(sample, gt_ans, pred_ans, tnum, None, leaf.question_type) if scored else 0
+                    table._add_row(sample, qtype, True, gt_ans == "", pred_ans != "", True, False, 0,
+                                   scored, len(gt_ans.split()) if scored else 0, hallu_words)
+                    continue
+
+                predqa = resolve_path(pred_ans, leaf.path)
+                if predqa is MISSING:
+                    continue
+                pred_answer = predqa.get("answer", "")
+                crossed = 0
+                if leaf.crossedout_text and pred_answer:
+                    crossed = crossed_out.count(predqa["answer"], leaf.crossedout_text)
+                scored = leaf.answer != "" and pred_answer != ""
+                hallu_words = table._diff(sample, leaf.answer, predqa["answer"], tnum, leaf.sub_path, leaf.question_type) if scored else 0
+                table._add_row(
+                    sample, qtype, False, leaf.answer == "", pred_answer != "",
+                    str(leaf.is_legible).lower() == "true",
+                    str(predqa.get("is_legible", "")).lower() == "true",
+                    crossed, scored, len(leaf.answer.split()) if scored else 0, hallu_words
+                )
+        return table
+
+    def columns(self) -> Dict[str, Any]:
+        """The table as NumPy arrays, with the derived per-answer event columns."""
+        _require_numpy()
+        essay = np.array(self.essay, dtype=bool)
+        gt_blank = np.array(self.gt_blank, dtype=bool)
+        pred_filled = np.array(self.pred_filled, dtype=bool)
+        crossed = np.array(self.crossed, dtype=np.int64)
+        scored = np.array(self.scored, dtype=bool)
+        fabricated = gt_blank & pred_filled
+        # Essays carry no legibility flag and are never counted as illegibility hallucinations
+        illegible = ~essay & ~np.array(self.gt_legible, dtype=bool) & (np.array(self.pred_legible, dtype=bool) | pred_filled)
+        return {
+            "sample": np.array(self.sample, dtype=np.int64),
+            "qtype": np.array(self.qtype, dtype=np.int64),
+            "fabricated": fabricated.astype(np.int64),
+            "crossed": crossed,
+            "illegible": illegible.astype(np.int64),
+            "gt_words": np.array(self.gt_words, dtype=np.int64),
+            "hallu_words": np.array(self.hallu_words, dtype=np.int64),
+            # A question type shows up in a sample's metrics once any of its answers was counted
+            "touched": (fabricated | (crossed > 0) | illegible | scored).astype(np.int64),
+        }
+
+    def _group_sums(self, cols: Dict[str, Any], keys: Any, size: int) -> Dict[str, Any]:
+        return {
+            name: np.bincount(keys, weights=cols[name], minlength=size).astype(np.int64)
+            for name in QTYPE_FIELDS + ["touched"]
+        }
+
+    def sample_metrics(self) -> List[Dict[str, Any]]:
+        """Per-sample results in the format of `Evaluator.calculate_hallucinations`."""
+        cols = self.columns()
+        num_qtypes = len(self.qtype_names)
+        per_sample = self._group_sums(cols, cols["sample"], self.num_samples)
+        per_cell = self._group_sums(cols, cols["sample"] * num_qtypes + cols["qtype"], self.num_samples * num_qtypes)
+
+        gt_words = per_sample["gt_words"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = {
+                name: np.where(gt_words > 0, per_sample[name] / np.maximum(gt_words, 1), 0.0)
+                for name in ["fabricated", "crossed", "illegible", "hallu_words"]
+            }
+
+        results = []
+        for s in range(self.num_samples):
+            question_type_metrics = {}
+            for q in range(num_qtypes):
+                cell = s * num_qtypes + q
+                if per_cell["touched"][cell]:
+                    question_type_metrics[self.qtype_names[q]] = {name: int(per_cell[name][cell]) for name in QTYPE_FIELDS}
+            results.append({
+                "fabricated_hallucinations": int(per_sample["fabricated"][s]),
+                "fabricated_hallucination_rate": float(rates["fabricated"][s]),
+                "crossed_out_hallucinations": int(per_sample["crossed"][s]),
+                "crossed_out_hallucination_rate": float(rates["crossed"][s]),
+                "illegibility_hallucinations": int(per_sample["illegible"][s]),
+                "illegibility_hallucination_rate": float(rates["illegible"][s]),
+                "word_level_hallucination_rate": float(rates["hallu_words"][s]),
+                "total_hallucinated_words": int(per_sample["hallu_words"][s]),
+                "total_gt_words": int(gt_words[s]),
+                "replaced_word_pairs": self.replaced_word_pairs[s],
+                "inserted_words": self.inserted_words[s],
+                "question_type_metrics": question_type_metrics
+            })
+        return results
+
+
+class ColumnarEvaluator(Evaluator):
+    """
+    Evaluator that flattens answers into an `AnswerTable` and counts with
+    NumPy group-bys. Produces the same metrics as `Evaluator`.
+
+    `evaluate_many` evaluates many samples in one table, which is where the
+    vectorization pays off. `calculate_hallucinations` is inherited: a table
+    of one sample costs more than walking it directly, so single samples go
+    through `Evaluator` and this class can stand in for it anywhere.
+    `question_type_totals` lets `SummaryAggregator` sum the per-type
+    metrics of a run with group-bys too.
+    """
+
+    def __init__(self, crossed_out_word_boundary: bool = False, rules: Optional[DiffRules] = None):
+        super().__init__(crossed_out_word_boundary, rules)
+        _require_numpy()
+
+    question_type_totals = staticmethod(question_type_totals)
+
+    def evaluate_many(self, pairs: Iterable[Tuple[Union[Dict[str, Any], CompiledGT], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        return AnswerTable.from_samples(pairs, self.crossed_out_word_boundary, self.rules).sample_metrics()
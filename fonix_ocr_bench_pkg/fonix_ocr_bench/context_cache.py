@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from google.genai import types
+from .logger import logger
+
+
+@dataclass
+class CachedContext:
+    name: str
+    expires_at: float
+    refcount: int = 0
+
+
+class ContextCacheManager:
+    """
+    Creates and reuses provider-side cached content for repeated prompt prefixes.
+
+    One cache is kept per (model, system instruction, prefix). Callers
+    `acquire` a handle before a request and `release` it afterwards; the TTL
+    is extended when a handle is acquired close to expiry, and `close`
+    deletes every cache no request is using. Prefixes the provider refuses
+    to cache (e.g. below its minimum token count) are remembered and sent
+    uncached from then on; after any other failure (rate limit, server
+    error, timeout) only that request goes inline and the next one tries
+    to create the cache again.
+    """
+
+    def __init__(self, client: Any, ttl_seconds: int = 3600, refresh_margin: int = 300):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.created = 0
+        self.reused = 0
+        self.refreshed = 0
+        self.failed = 0
+        self._entries: Dict[str, CachedContext] = {}
+        self._by_name: Dict[str, str] = {}
+        self._unsupported = set()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def _refused(error: Exception) -> bool:
+        """Whether the provider rejected the prefix itself (400 invalid argument, e.g. too few tokens)."""
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if code is not None:
+            return code == 400
+        message = str(error).lower()
+        return "invalid_argument" in message or "too small" in message or "too few" in message
+
+    @staticmethod
+    def key(model_name: str, system_instruction: str, prefix: str) -> str:
+        h = hashlib.sha256()
+        for part in (model_name, system_instruction or "", prefix or ""):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _create(self, model_name: str, system_instruction: str, prefix: str) -> CachedContext:
+        contents = [types.Content(role="user", parts=[types.Part(text=prefix)])] if prefix else None
+        cache = self.client.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                contents=contents,
+                ttl=f"{self.ttl_seconds}s"
+            )
+        )
+        return CachedContext(name=cache.name, expires_at=time.time() + self.ttl_seconds)
+
+    def _refresh(self, entry: CachedContext):
+        self.client.caches.update(name=entry.name, config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s"))
+        entry.expires_at = time.time() + self.ttl_seconds
+
+    def acquire(self, model_name: str, system_instruction: str, prefix: str = "") -> Optional[str]:
+        """Returns the cached-content name to send with the request, or None to send the prefix inline."""
+        key = self.key(model_name, system_instruction, prefix)
+        with self._lock:
+            if key in self._unsupported:
+                return None
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Creation and refresh are network calls, only serialize callers of the same prefix
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            now = time.time()
+            try:
+                if entry is None or entry.expires_at <= now:
+                    expired = entry
+                    entry = self._create(model_name, system_instruction, prefix)
+                    with self._lock:
+                        if expired is not None:
+                            self._by_name.pop(expired.name, None)
+                        self._entries[key] = entry
+                        self._by_name[entry.name] = key
+                        self.created += 1
+                    logger.info(f"Created context cache {entry.name} (TTL {self.ttl_seconds}s)")
+                else:
+                    if entry.expires_at - now < self.refresh_margin:
+                        self._refresh(entry)
+                        with self._lock:
+                            self.refreshed += 1
+                    with self._lock:
+                        self.reused += 1
+            except Exception as e:
+                refused = self._refused(e)
+                if refused:
+                    logger.warning(f"Context caching unavailable for this prefix, sending it inline: {e}")
+                else:
+                    logger.warning(f"Failed to create or refresh context cache, sending this request inline: {e}")
+                with self._lock:
+                    if refused:
+                        self._unsupported.add(key)
+                    self.failed += 1
+                return None
+
+            with self._lock:
+                entry.refcount += 1
+            return entry.name
+
+    def release(self, name: Optional[str]):
+        if name is None:
+            return
+        with self._lock:
+            key = self._by_name.get(name)
+            if key is not None and key in self._entries:
+                self._entries[key].refcount = max(0, self._entries[key].refcount - 1)
+
+    def close(self):
+        """Deletes every cache that is not in use, so storage stops being billed."""
+        with self._lock:
+            idle = [(key, entry) for key, entry in self._entries.items() if entry.refcount == 0]
+            for key, entry in idle:
+                del self._entries[key]
+                self._by_name.pop(entry.name, None)
+        for _, entry in idle:
+            try:
+                self.client.caches.delete(name=entry.name)
+            except Exception as e:
+                logger.warning(f"Failed to delete context cache {entry.name}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "active": len(self._entries),
+            }
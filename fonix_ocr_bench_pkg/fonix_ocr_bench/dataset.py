@@ -1,53 +1,73 @@
 import json
 import os
 import pathlib
-from typing import List, Dict, Tuple
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+from .cache import file_digest
+from .gt_index import CompiledGT, GroundTruthIndex
 from .logger import logger
 
 class BenchmarkDataset:
     def __init__(self, data_dir: str):
         self.data_dir = pathlib.Path(data_dir)
+        self.gt_index = GroundTruthIndex()
         self.samples = self._load_samples()
-    
-    def _load_samples(self) -> List[Tuple[str, str, Dict]]:
-        """
-        Loads PDF and JSON pairs from the data directory.
-        Returns a list of (pdf_path, json_path, ground_truth_json).
-        """
-        samples = []
+
+    def __iter__(self) -> Iterator[Tuple[str, str, Dict]]:
+        return iter(self.samples)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def _search_dirs(self) -> List[pathlib.Path]:
         # Support both flat directory and nested 'all_together' if it exists inside data_dir
         search_dirs = [self.data_dir]
         if (self.data_dir / "all_together").exists():
              search_dirs.append(self.data_dir / "all_together")
+        return search_dirs
 
-        for d in search_dirs:
+    def _iter_pairs(self) -> Iterator[Tuple[pathlib.Path, pathlib.Path]]:
+        """Yields (pdf_path, json_path) for every PDF with a ground-truth JSON next to it."""
+        for d in self._search_dirs():
             for file in d.glob("*.pdf"):
-                base_name = file.stem
-                json_path = d / f"{base_name}.json"
+                json_path = d / f"{file.stem}.json"
                 if json_path.exists():
-                    try:
-                        with open(json_path, 'r', encoding='utf-8') as f:
-                            gt = json.load(f)
-                        samples.append((str(file), str(json_path), gt))
-                    except json.JSONDecodeError as e:
-                        error_msg = (
-                            f"\n{'='*70}\n"
-                            f"ERROR: Malformed JSON file detected!\n"
-                            f"{'='*70}\n"
-                            f"File: {json_path}\n"
-                            f"Line: {e.lineno}, Column: {e.colno}\n"
-                            f"Error: {e.msg}\n"
-                            f"{'='*70}\n"
-                            f"Please fix the JSON syntax error before running the benchmark.\n"
-                            f"{'='*70}"
-                        )
-                        logger.error(f"Malformed JSON in {json_path}")
-                        raise ValueError(error_msg) from e
+                    yield file, json_path
+
+    @staticmethod
+    def _read_ground_truth(json_path: pathlib.Path) -> Dict:
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except json.JSONDecodeError as e:
+            error_msg = (
+                f"\n{'='*70}\n"
+                f"ERROR: Malformed JSON file detected!\n"
+                f"{'='*70}\n"
+                f"File: {json_path}\n"
+                f"Line: {e.lineno}, Column: {e.colno}\n"
+                f"Error: {e.msg}\n"
+                f"{'='*70}\n"
+                f"Please fix the JSON syntax error before running the benchmark.\n"
+                f"{'='*70}"
+            )
+            logger.error(f"Malformed JSON in {json_path}")
+            raise ValueError(error_msg) from e
+
+    def _load_samples(self) -> List[Tuple[str, str, Dict]]:
+        """
+        Loads PDF and JSON pairs from the data directory.
+        Returns a list of (pdf_path, json_path, ground_truth_json).
+        """
+        samples = []
+        for file, json_path in self._iter_pairs():
+            samples.append((str(file), str(json_path), self._read_ground_truth(json_path)))
         
         logger.info(f"Loaded {len(samples)} samples from {self.data_dir}")
         if len(samples) == 0:
             logger.warning(f"No PDF/JSON pairs found in {self.data_dir}")
-            logger.debug(f"Searched in directories: {[str(d) for d in search_dirs]}")
+            logger.debug(f"Searched in directories: {[str(d) for d in self._search_dirs()]}")
         
         return samples
 
@@ -59,6 +79,29 @@ class BenchmarkDataset:
         structure = self._clean_structure(answer_json)
         return json.dumps(structure, indent=4)
 
+    def _index_key(self, json_path: str) -> str:
+        return str(json_path)
+
+    def _compile(self, json_path: str, gt: Dict) -> CompiledGT:
+        return self.gt_index.add(self._index_key(json_path), gt, self.create_structure_injected(gt))
+
+    def structure_injected(self, json_path: str, gt: Dict) -> str:
+        """
+        The STRUCTURE_INJECTED string of a sample, built once per paper.
+        Papers with the same layout share one template string.
+        """
+        compiled = self.compiled_ground_truth(json_path, gt)
+        structure = self.gt_index.template(compiled.structure_digest)
+        if structure is None:
+            # Template file missing from a persisted index
+            structure = self.gt_index.template(self._compile(json_path, gt).structure_digest)
+        return structure
+
+    def compiled_ground_truth(self, json_path: str, gt: Dict) -> CompiledGT:
+        """The sample's ground truth flattened to its answer leaves, for the evaluator. Compiled on first access."""
+        compiled = self.gt_index.get(self._index_key(json_path))
+        return compiled if compiled is not None else self._compile(json_path, gt)
+
     def _clean_structure(self, data):
         if isinstance(data, dict):
             new_data = {}
@@ -80,3 +123,186 @@ class BenchmarkDataset:
             return [self._clean_structure(item) for item in data]
         else:
             return data
+
+
+class LazySample:
+    """
+    A (pdf_path, json_path, ground_truth) sample whose ground truth is only read
+    when it is accessed. Indexes and unpacks like the tuples in
+    `BenchmarkDataset.samples`; `sample[0]` and `sample[1]` never touch the JSON.
+    """
+
+    __slots__ = ("pdf_path", "json_path", "_dataset")
+
+    def __init__(self, pdf_path: str, json_path: str, dataset: "LazyBenchmarkDataset"):
+        self.pdf_path = pdf_path
+        self.json_path = json_path
+        self._dataset = dataset
+
+    @property
+    def ground_truth(self) -> Dict:
+        return self._dataset.load_ground_truth(self.json_path)
+
+    def __len__(self) -> int:
+        return 3
+
+    def __getitem__(self, index: int):
+        if index in (0, -3):
+            return self.pdf_path
+        if index in (1, -2):
+            return self.json_path
+        if index in (2, -1):
+            return self.ground_truth
+        raise IndexError(index)
+
+    def __iter__(self):
+        yield self.pdf_path
+        yield self.json_path
+        yield self.ground_truth
+
+    def __repr__(self) -> str:
+        return f"LazySample({self.pdf_path!r}, {self.json_path!r})"
+
+
+class LazyBenchmarkDataset(BenchmarkDataset):
+    """
+    Dataset backed by a manifest instead of loading every ground truth up front.
+
+    The manifest (JSON, by default `<data_dir>/.fonix_manifest.json`) records
+    each pair's paths, sizes, mtimes, content hashes, set name and question
+    types. Only files whose size or mtime changed since the manifest was
+    written are hashed and parsed again. Samples are yielded as `LazySample`s
+    and their ground truth is loaded on demand through a small LRU. Compiled
+    ground truths are kept in a `GroundTruthIndex` directory next to the
+    manifest: compiled on a paper's first use, read back from there on later
+    runs, and held in memory for at most `cache_size` papers.
+
+    Args:
+        data_dir (str): Directory with the PDF/JSON pairs.
+        manifest_path (str, optional): Where to keep the manifest.
+        sets (List[str], optional): Only include these sets (e.g. "set_1" for set_1_*.pdf).
+        question_types (List[str], optional): Only include papers with at least one
+            question of these types (e.g. "FITB", "W").
+        cache_size (int): Number of parsed and of compiled ground truths kept in memory.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self,
+                 data_dir: str,
+                 manifest_path: Optional[str] = None,
+                 sets: Optional[List[str]] = None,
+                 question_types: Optional[List[str]] = None,
+                 cache_size: int = 32):
+        self.data_dir = pathlib.Path(data_dir)
+        self.manifest_path = pathlib.Path(manifest_path) if manifest_path else self.data_dir / ".fonix_manifest.json"
+        self.sets = set(sets) if sets else None
+        self.question_types = set(question_types) if question_types else None
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.gt_index = GroundTruthIndex(str(self.manifest_path.with_suffix(".gt_index")), max_entries=cache_size)
+
+        manifest = self._build_manifest()
+        self.entries = [entry for entry in manifest if self._selected(entry)]
+        self._digests = {entry["json_path"]: entry["json_sha256"] for entry in manifest}
+        logger.info(f"Indexed {len(self.entries)} of {len(manifest)} samples from {self.data_dir}")
+        if not manifest:
+            logger.warning(f"No PDF/JSON pairs found in {self.data_dir}")
+            logger.debug(f"Searched in directories: {[str(d) for d in self._search_dirs()]}")
+
+    @staticmethod
+    def set_name(pdf_path: str) -> str:
+        """`set_1_2.pdf` -> `set_1`."""
+        stem = pathlib.Path(pdf_path).stem
+        return stem.rsplit("_", 1)[0] if "_" in stem else stem
+
+    @staticmethod
+    def _question_types(gt: Dict) -> List[str]:
+        return sorted({str(q["question_type"]) for q in gt.get("questions", []) if isinstance(q, dict) and "question_type" in q})
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, "r", encoding='utf-8') as f:
+                manifest = json.load(f)
+        except json.JSONDecodeError:
+            logger.warning(f"Rebuilding unreadable manifest {self.manifest_path}")
+            return {}
+        if manifest.get("version") != self.MANIFEST_VERSION:
+            return {}
+        return {entry["json_path"]: entry for entry in manifest.get("entries", [])}
+
+    def _build_manifest(self) -> List[Dict]:
+        previous = self._read_manifest()
+        entries = []
+        changed = False
+        for pdf_path, json_path in self._iter_pairs():
+            pdf_stat = pdf_path.stat()
+            json_stat = json_path.stat()
+            entry = previous.get(str(json_path))
+            if (entry is None or entry["pdf_path"] != str(pdf_path)
+                    or entry["pdf_size"] != pdf_stat.st_size or entry["pdf_mtime"] != pdf_stat.st_mtime
+                    or entry["json_size"] != json_stat.st_size or entry["json_mtime"] != json_stat.st_mtime):
+                gt = self._read_ground_truth(json_path)
+                json_sha256 = file_digest(str(json_path))
+                entry = {
+                    "pdf_path": str(pdf_path),
+                    "json_path": str(json_path),
+                    "pdf_size": pdf_stat.st_size,
+                    "pdf_mtime": pdf_stat.st_mtime,
+                    "pdf_sha256": file_digest(str(pdf_path)),
+                    "json_size": json_stat.st_size,
+                    "json_mtime": json_stat.st_mtime,
+                    "json_sha256": json_sha256,
+                    "set": self.set_name(str(pdf_path)),
+                    "question_types": self._question_types(gt),
+                }
+                changed = True
+            entries.append(entry)
+        entries.sort(key=lambda e: e["pdf_path"])
+        # Compiled forms of ground truths that changed or are gone
+        self.gt_index.discard({e["json_sha256"] for e in previous.values()} - {e["json_sha256"] for e in entries})
+
+        if changed or len(entries) != len(previous):
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({"version": self.MANIFEST_VERSION, "entries": entries}, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        return entries
+
+    def _selected(self, entry: Dict) -> bool:
+        if self.sets is not None and entry["set"] not in self.sets:
+            return False
+        if self.question_types is not None and not self.question_types.intersection(entry["question_types"]):
+            return False
+        return True
+
+    def _index_key(self, json_path: str) -> str:
+        # Content-addressed, so the compiled form survives renames and moves
+        return self._digests.get(str(json_path)) or file_digest(str(json_path))
+
+    def load_ground_truth(self, json_path: str) -> Dict:
+        with self._lock:
+            if json_path in self._cache:
+                self._cache.move_to_end(json_path)
+                return self._cache[json_path]
+        gt = self._read_ground_truth(pathlib.Path(json_path))
+        with self._lock:
+            self._cache[json_path] = gt
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return gt
+
+    def __iter__(self) -> Iterator[LazySample]:
+        for entry in self.entries:
+            yield LazySample(entry["pdf_path"], entry["json_path"], self)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def samples(self) -> List[LazySample]:
+        return list(self)
@@ -1,8 +1,24 @@
+from typing import Optional
+from .gt_index import CompiledGT, MISSING, compile_ground_truth, resolve_path
+from .prefilter import DiffRules
 from .utils import word_diff
 
 class Evaluator:
-    def __init__(self):
-        pass
+    """
+    Args:
+        crossed_out_word_boundary (bool): Count a crossed-out phrase only when it
+            occurs as whole words in the prediction, instead of as any substring.
+        rules (DiffRules, optional): Mark trivial replaced/inserted words (punctuation,
+            quotes, hyphenation, small edits) with the reason under "rule", so
+            refinement resolves them without the model. Counts are unchanged.
+    """
+
+    def __init__(self, crossed_out_word_boundary: bool = False, rules: Optional[DiffRules] = None):
+        self.crossed_out_word_boundary = crossed_out_word_boundary
+        self.rules = rules
+
+    def _word_entry(self, entry, gt_words, pred_words):
+        return entry if self.rules is None else self.rules.annotate(entry, gt_words, pred_words)
 
     def iterate_answers(self, gt_ans, pred_ans, path=""): 
         """Recursively iterate through nested answer structures with path tracking"""
@@ -19,6 +35,8 @@ class Evaluator:
         """
         Calculate various types of hallucinations.
         Adapted from dev.ipynb
+
+        `gt` is the ground-truth dict or its `CompiledGT`.
         """
         
         # Counters
@@ -46,22 +64,22 @@ class Evaluator:
                 }
             question_type_metrics[qtype][field] += count
         
-        # Create lookup dictionaries
-        gt_questions = {q["test_number"]: q for q in gt.get("questions", [])}
+        # The GT is walked once into its answer leaves (or arrives precompiled)
+        compiled = gt if isinstance(gt, CompiledGT) else compile_ground_truth(gt)
         pred_questions = {q["test_number"]: q for q in pred.get("questions", [])}
+        crossed_out = compiled.crossed_out_matcher(self.crossed_out_word_boundary)
         
-        for tnum, gtq in gt_questions.items():
+        for leaf in compiled.leaves:
+            tnum = leaf.test_number
             if tnum not in pred_questions:
                 continue
             
-            predq = pred_questions[tnum]
-            qtype = gtq.get("question_type", "Unknown")
-            
-            gt_ans = gtq.get("student_answers", "")
-            pred_ans = predq.get("student_answers", "")
+            qtype = leaf.question_type
+            pred_ans = pred_questions[tnum].get("student_answers", "")
             
             # -------- Essay level hallucination --------
-            if isinstance(gt_ans, str):
+            if leaf.essay:
+                gt_ans = leaf.answer
                 # Fabricated hallucination: AI reads text where there is none
                 if gt_ans == "" and pred_ans != "":
                     fabricated_hallucinations += 1
@@ -73,19 +91,21 @@ class Evaluator:
                     
                     for tag, gtw, prw in diff:
                         if tag == "replace" and gtw != prw:
-                            replaced_word_pairs.append({
+                            replaced_word_pairs.append(self._word_entry({
                                 "question": tnum,
+                                "question_type": qtype,
                                 "gt_words": gtw,
                                 "pred_words": prw
-                            })
+                            }, gtw, prw))
                             total_hallucinated_words += len(prw)
                             update_qtype_metric(qtype, "hallu_words", len(prw))
                         
                         elif tag == "insert" and prw:
-                            inserted_words.append({
+                            inserted_words.append(self._word_entry({
                                 "question": tnum,
+                                "question_type": qtype,
                                 "words": prw
-                            })
+                            }, [], prw))
                             total_hallucinated_words += len(prw)
                             update_qtype_metric(qtype, "hallu_words", len(prw))
                     
@@ -96,59 +116,65 @@ class Evaluator:
                 continue
             
             # -------- Structured QA hallucination --------
-            for gtqa, predqa, sub_path in self.iterate_answers(gt_ans, pred_ans):
-                
-                # 1. Fabricated hallucination
-                if gtqa["answer"] == "" and predqa.get("answer", "") != "":
-                    fabricated_hallucinations += 1
-                    update_qtype_metric(qtype, "fabricated")
-                
-                # 2. Crossed-out text hallucination
-                # If GT has crossed_out_text, and prediction includes those words
-                if gtqa.get("crossedout_text") and predqa.get("answer", ""):
-                    pred_answer_lower = predqa["answer"].lower()
-                    for crossed_word in gtqa["crossedout_text"]:
-                        if crossed_word.lower() in pred_answer_lower:
-                            crossed_out_hallucinations += 1
-                            update_qtype_metric(qtype, "crossed")
-                
-                # 3. Illegibility hallucination
-                gt_legible = str(gtqa.get("is_legible", "")).lower()
-                pred_legible = str(predqa.get("is_legible", "")).lower()
-                
-                if gt_legible not in ["true"]:
-                    # GT answer is blank/illegible; if AI claims it's legible or provides text, it hallucinated
-                    if pred_legible == "true" or predqa.get("answer", "") != "":
-                        illegibility_hallucinations += 1
-                        update_qtype_metric(qtype, "illegible")
+            # Sub-answers missing from the prediction are skipped
+            predqa = resolve_path(pred_ans, leaf.path)
+            if predqa is MISSING:
+                continue
+            sub_path = leaf.sub_path
+            gt_answer = leaf.answer
+            
+            # 1. Fabricated hallucination
+            if gt_answer == "" and predqa.get("answer", "") != "":
+                fabricated_hallucinations += 1
+                update_qtype_metric(qtype, "fabricated")
+            
+            # 2. Crossed-out text hallucination
+            # If GT has crossed_out_text, and prediction includes those words
+            if leaf.crossedout_text and predqa.get("answer", ""):
+                crossed = crossed_out.count(predqa["answer"], leaf.crossedout_text)
+                if crossed:
+                    crossed_out_hallucinations += crossed
+                    update_qtype_metric(qtype, "crossed", crossed)
+            
+            # 3. Illegibility hallucination
+            gt_legible = str(leaf.is_legible).lower()
+            pred_legible = str(predqa.get("is_legible", "")).lower()
+            
+            if gt_legible not in ["true"]:
+                # GT answer is blank/illegible; if AI claims it's legible or provides text, it hallucinated
+                if pred_legible == "true" or predqa.get("answer", "") != "":
+                    illegibility_hallucinations += 1
+                    update_qtype_metric(qtype, "illegible")
+            
+            # 4. Word-level hallucination (for readable text)
+            if gt_answer != "" and predqa.get("answer", "") != "":
+                diff = word_diff(gt_answer, predqa["answer"])
                 
-                # 4. Word-level hallucination (for readable text)
-                if gtqa["answer"] != "" and predqa.get("answer", "") != "":
-                    diff = word_diff(gtqa["answer"], predqa["answer"])
+                for tag, gtw, prw in diff:
+                    if tag == "replace" and gtw != prw:
+                        replaced_word_pairs.append(self._word_entry({
+                            "question": tnum,
+                            "sub_question": sub_path,
+                            "question_type": qtype,
+                            "gt_words": gtw,
+                            "pred_words": prw
+                        }, gtw, prw))
+                        total_hallucinated_words += len(prw)
+                        update_qtype_metric(qtype, "hallu_words", len(prw))
                     
-                    for tag, gtw, prw in diff:
-                        if tag == "replace" and gtw != prw:
-                            replaced_word_pairs.append({
-                                "question": tnum,
-                                "sub_question": sub_path,
-                                "gt_words": gtw,
-                                "pred_words": prw
-                            })
-                            total_hallucinated_words += len(prw)
-                            update_qtype_metric(qtype, "hallu_words", len(prw))
-                        
-                        elif tag == "insert" and prw:
-                            inserted_words.append({
-                                "question": tnum,
-                                "sub_question": sub_path,
-                                "words": prw
-                            })
-                            total_hallucinated_words += len(prw)
-                            update_qtype_metric(qtype, "hallu_words", len(prw))
-                    
-                    word_count = len(gtqa["answer"].split())
-                    total_gt_words += word_count
-                    update_qtype_metric(qtype, "gt_words", word_count)
+                    elif tag == "insert" and prw:
+                        inserted_words.append(self._word_entry({
+                            "question": tnum,
+                            "sub_question": sub_path,
+                            "question_type": qtype,
+                            "words": prw
+                        }, [], prw))
+                        total_hallucinated_words += len(prw)
+                        update_qtype_metric(qtype, "hallu_words", len(prw))
+                
+                word_count = len(gt_answer.split())
+                total_gt_words += word_count
+                update_qtype_metric(qtype, "gt_words", word_count)
         
         # -------- Calculate rates --------
         hallucination_rate = (
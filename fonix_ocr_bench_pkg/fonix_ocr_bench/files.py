@@ -0,0 +1,157 @@
+import json
+import os
+import pathlib
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+from .cache import file_digest
+from .logger import logger
+
+
+@dataclass
+class RemoteFile:
+    """A file uploaded to the provider, referenced by URI until `expires_at` (epoch seconds)."""
+    uri: str
+    mime_type: str
+    name: str = ""
+    expires_at: float = 0.0
+
+
+class FileUploader(ABC):
+    """Uploads a local file to wherever the model can reference it from."""
+
+    @abstractmethod
+    def upload(self, path: str, mime_type: str) -> RemoteFile:
+        pass
+
+
+class GeminiFileUploader(FileUploader):
+    """
+    Uploads through the Gemini Files API.
+
+    Files are kept by the provider for 48 hours; `ttl` is only used when the
+    response carries no expiration time.
+    """
+
+    def __init__(self, client: Any, ttl: float = 48 * 3600, poll_interval: float = 1.0, timeout: float = 300.0):
+        self.client = client
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def upload(self, path: str, mime_type: str) -> RemoteFile:
+        uploaded = self.client.files.upload(file=path, config={"mime_type": mime_type})
+
+        # Large PDFs are processed asynchronously and can't be referenced until ACTIVE
+        deadline = time.monotonic() + self.timeout
+        while getattr(uploaded.state, "name", uploaded.state) == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Upload of {path} still processing after {self.timeout}s")
+            time.sleep(self.poll_interval)
+            uploaded = self.client.files.get(name=uploaded.name)
+        if getattr(uploaded.state, "name", uploaded.state) == "FAILED":
+            raise RuntimeError(f"Upload of {path} failed: {uploaded.error}")
+
+        expires_at = uploaded.expiration_time.timestamp() if uploaded.expiration_time else time.time() + self.ttl
+        return RemoteFile(uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type, name=uploaded.name or "", expires_at=expires_at)
+
+
+class LocalFileUploader(FileUploader):
+    """Copies files into `storage_dir` and returns file:// references. For tests and dry runs."""
+
+    def __init__(self, storage_dir: str, ttl: float = 48 * 3600):
+        self.storage_dir = pathlib.Path(storage_dir)
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.uploads = 0
+
+    def upload(self, path: str, mime_type: str) -> RemoteFile:
+        target = self.storage_dir / f"{file_digest(path)}{pathlib.Path(path).suffix}"
+        shutil.copyfile(path, target)
+        self.uploads += 1
+        return RemoteFile(uri=target.resolve().as_uri(), mime_type=mime_type, name=target.name, expires_at=time.time() + self.ttl)
+
+
+class FileRegistry:
+    """
+    Persistent map of content hash -> RemoteFile, stored as JSON at `path`.
+
+    References expiring within `safety_margin` seconds are treated as gone,
+    so a long request never starts with a reference about to lapse.
+    """
+
+    def __init__(self, path: str = ".fonix_cache/files.json", safety_margin: float = 600.0):
+        self.path = pathlib.Path(path)
+        self.safety_margin = safety_margin
+        self._lock = threading.Lock()
+        self._entries: Dict[str, RemoteFile] = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding='utf-8') as f:
+                    self._entries = {k: RemoteFile(**v) for k, v in json.load(f).items()}
+            except (json.JSONDecodeError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable file registry {self.path}: {e}")
+
+    def get(self, digest: str) -> Optional[RemoteFile]:
+        with self._lock:
+            ref = self._entries.get(digest)
+        if ref is None or ref.expires_at - self.safety_margin <= time.time():
+            return None
+        return ref
+
+    def put(self, digest: str, ref: RemoteFile):
+        with self._lock:
+            self._entries[digest] = ref
+            # Expired entries are dropped whenever the registry is written
+            now = time.time()
+            self._entries = {k: v for k, v in self._entries.items() if v.expires_at > now}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({k: asdict(v) for k, v in self._entries.items()}, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class FileStore:
+    """
+    Resolves local files to remote references, uploading each distinct file
+    content at most once while its reference is valid.
+
+    Concurrent requests for the same file wait for a single upload.
+    """
+
+    def __init__(self, uploader: FileUploader, registry: Optional[FileRegistry] = None):
+        self.uploader = uploader
+        self.registry = registry if registry is not None else FileRegistry()
+        self.uploads = 0
+        self.reuses = 0
+        self._lock = threading.Lock()
+        self._digest_locks: Dict[str, threading.Lock] = {}
+
+    def resolve(self, path: str, mime_type: str) -> RemoteFile:
+        digest = file_digest(path)
+        with self._lock:
+            digest_lock = self._digest_locks.setdefault(digest, threading.Lock())
+        with digest_lock:
+            ref = self.registry.get(digest)
+            if ref is not None:
+                with self._lock:
+                    self.reuses += 1
+                return ref
+            logger.info(f"Uploading {pathlib.Path(path).name} ({mime_type})")
+            ref = self.uploader.upload(path, mime_type)
+            self.registry.put(digest, ref)
+            with self._lock:
+                self.uploads += 1
+            return ref
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"uploads": self.uploads, "reuses": self.reuses, "registered": len(self.registry)}
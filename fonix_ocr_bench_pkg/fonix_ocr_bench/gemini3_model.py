@@ -1,16 +1,25 @@
 import os
 import pathlib
+from typing import Any, Dict, Optional
 from google import genai
 from google.genai import types
-from .model_interface import ModelInterface, PredictionResult, UsageStats
+from .model_interface import ModelInterface, PredictionResult, UsageStats, run_blocking
+from .files import FileStore, RemoteFile
+from .context_cache import ContextCacheManager
 from .logger import logger
 
 class Gemini3Model(ModelInterface):
-    def __init__(self, api_key: str, model_name: str = "gemini-3-flash-preview", exchange_rate: float = 310.13):
+    def __init__(self, api_key: str, model_name: str = "gemini-3-flash-preview", exchange_rate: float = 310.13,
+                 file_store: Optional[FileStore] = None,
+                 context_cache: Optional[ContextCacheManager] = None):
         self.api_key = api_key
         self.model_name = model_name
         self.exchange_rate = exchange_rate
         self.client = genai.Client(http_options={'api_version': 'v1alpha'}, api_key=self.api_key)
+        # When set, PDFs are uploaded once and referenced by URI instead of inlined on every call
+        self.file_store = file_store
+        # When set, the system instruction and `cached_prefix` are served from provider-side cached content
+        self.context_cache = context_cache
         
         # Default config from dev.ipynb
         self.thinking_level = types.ThinkingLevel.HIGH
@@ -18,14 +27,18 @@ class Gemini3Model(ModelInterface):
         self.top_p = 0.95
         self.media_resolution = types.MediaResolution.MEDIA_RESOLUTION_HIGH
 
-    def call(self, prompt: str, system_instruction: str, image_path: str = None, image_bytes: bytes = None) -> PredictionResult:
-        """
-        Calls Gemini model matching dev.ipynb implementation.
-        """
-        logger.debug(f"Calling Gemini ({self.model_name}) with prompt length: {len(prompt)}")
+    def _build_contents(self, prompt: str, image_path: str = None, image_bytes: bytes = None, mime_type: str = "image/png",
+                        file_ref: Optional[RemoteFile] = None) -> list:
         parts = [types.Part(text=prompt)]
         
-        if image_path is not None:
+        if file_ref is not None:
+            parts.append(
+                types.Part(
+                    file_data=types.FileData(file_uri=file_ref.uri, mime_type=file_ref.mime_type),
+                    media_resolution={"level": self.media_resolution}
+                )
+            )
+        elif image_path is not None:
             filepath = pathlib.Path(image_path)
             parts.append(
                 types.Part(
@@ -40,30 +53,47 @@ class Gemini3Model(ModelInterface):
             parts.append(
                 types.Part(
                     inline_data=types.Blob(
-                        mime_type="image/png",  # Defaulting to PNG for individual pages
+                        mime_type=mime_type,
                         data=image_bytes,
                     ),
                     media_resolution={"level": self.media_resolution}
                 )
             )
-        
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            config=types.GenerateContentConfig(
-                systemInstruction=system_instruction,
+        return [types.Content(parts=parts)]
+
+    def _build_config(self, system_instruction: str, cached_content: Optional[str] = None) -> types.GenerateContentConfig:
+        if cached_content is not None:
+            # The system instruction is part of the cached content and must not be repeated
+            return types.GenerateContentConfig(
+                cached_content=cached_content,
                 thinking_config=types.ThinkingConfig(thinking_level=self.thinking_level),
                 temperature=self.temperature,
                 top_p=self.top_p
-            ),
-            contents=[types.Content(parts=parts)]
+            )
+        return types.GenerateContentConfig(
+            systemInstruction=system_instruction,
+            thinking_config=types.ThinkingConfig(thinking_level=self.thinking_level),
+            temperature=self.temperature,
+            top_p=self.top_p
         )
-        logger.debug("Gemini response received")
-        
+
+    def _acquire_cache(self, prompt: str, system_instruction: str, cached_prefix: Optional[str]):
+        """Returns (prompt to send, cached content name); the prefix is inlined when no cache is available."""
+        cache_name = None
+        # Calls without a shared prefix (e.g. refinement) gain nothing from a cache
+        if self.context_cache is not None and cached_prefix:
+            cache_name = self.context_cache.acquire(self.model_name, system_instruction, cached_prefix)
+        if cache_name is None and cached_prefix:
+            prompt = cached_prefix + prompt
+        return prompt, cache_name
+
+    def _to_prediction(self, response) -> PredictionResult:
         u = response.usage_metadata
         usage = UsageStats(
             prompt_tokens=u.prompt_token_count,
             completion_tokens=u.candidates_token_count,
-            thinking_tokens=u.thoughts_token_count if hasattr(u, 'thoughts_token_count') and u.thoughts_token_count else 0
+            thinking_tokens=u.thoughts_token_count if hasattr(u, 'thoughts_token_count') and u.thoughts_token_count else 0,
+            cached_tokens=getattr(u, 'cached_content_token_count', None) or 0
         )
 
         return PredictionResult(
@@ -72,18 +102,115 @@ class Gemini3Model(ModelInterface):
             raw_response=response
         )
 
+    def call(self, prompt: str, system_instruction: str, image_path: str = None, image_bytes: bytes = None, mime_type: str = "image/png",
+             cached_prefix: Optional[str] = None) -> PredictionResult:
+        """
+        Calls Gemini model matching dev.ipynb implementation.
+
+        `cached_prefix` is text that logically precedes `prompt` and is shared
+        across requests; it is sent through the context cache when one is set.
+        """
+        logger.debug(f"Calling Gemini ({self.model_name}) with prompt length: {len(prompt)}")
+        file_ref = None
+        if self.file_store is not None and image_path is not None:
+            file_ref = self.file_store.resolve(image_path, "application/pdf")
+        prompt, cache_name = self._acquire_cache(prompt, system_instruction, cached_prefix)
+        try:
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                config=self._build_config(system_instruction, cache_name),
+                contents=self._build_contents(prompt, image_path, image_bytes, mime_type, file_ref)
+            )
+        finally:
+            if cache_name is not None:
+                self.context_cache.release(cache_name)
+        logger.debug("Gemini response received")
+        return self._to_prediction(response)
+
+    async def acall(self, prompt: str, system_instruction: str, image_path: str = None, image_bytes: bytes = None, mime_type: str = "image/png",
+                    cached_prefix: Optional[str] = None) -> PredictionResult:
+        """
+        Same as `call`, but uses the async genai client so no thread is held while waiting.
+        """
+        logger.debug(f"Calling Gemini async ({self.model_name}) with prompt length: {len(prompt)}")
+        file_ref = None
+        if self.file_store is not None and image_path is not None:
+            # Hashing and uploading are blocking, keep them off the event loop
+            file_ref = await run_blocking(self.file_store.resolve, image_path, "application/pdf")
+        prompt, cache_name = await run_blocking(self._acquire_cache, prompt, system_instruction, cached_prefix)
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                config=self._build_config(system_instruction, cache_name),
+                contents=self._build_contents(prompt, image_path, image_bytes, mime_type, file_ref)
+            )
+        finally:
+            if cache_name is not None:
+                self.context_cache.release(cache_name)
+        logger.debug("Gemini response received")
+        return self._to_prediction(response)
+
+    def batch_request(self, prompt: str, system_instruction: str, image_path: str = None) -> Dict[str, Any]:
+        """
+        Serializes a request in the Batch API's JSONL request format.
+        """
+        file_ref = None
+        if self.file_store is not None and image_path is not None:
+            file_ref = self.file_store.resolve(image_path, "application/pdf")
+        contents = self._build_contents(prompt, image_path, file_ref=file_ref)
+        return {
+            "contents": [content.model_dump(mode="json", exclude_none=True) for content in contents],
+            "system_instruction": {"parts": [{"text": system_instruction}]},
+            "generation_config": {
+                "temperature": self.temperature,
+                "top_p": self.top_p,
+                "thinking_config": {"thinking_level": getattr(self.thinking_level, "value", self.thinking_level)},
+            },
+        }
+
+    def batch_result(self, response: Dict[str, Any]) -> PredictionResult:
+        """
+        Converts one response of a Batch API results file to a PredictionResult.
+        """
+        return self._to_prediction(types.GenerateContentResponse.model_validate(response))
+
+    def get_config(self) -> Dict[str, Any]:
+        return {
+            "model_class": type(self).__name__,
+            "model_name": self.model_name,
+            "thinking_level": str(self.thinking_level),
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "media_resolution": str(self.media_resolution),
+        }
+
+    def file_stats(self) -> Optional[Dict[str, Any]]:
+        """Upload/reuse counters of the file store, or None when PDFs are inlined."""
+        return self.file_store.stats() if self.file_store is not None else None
+
+    def context_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Create/reuse counters of the context cache, or None when caching is off."""
+        return self.context_cache.stats() if self.context_cache is not None else None
+
     def calculate_cost(self, usage: UsageStats) -> float:
         """
         Calculate cost based on dev.ipynb implementation for gemini-3-flash-preview.
+
+        Prompt tokens served from a context cache are billed at the cached
+        input price; cache storage is billed separately per hour and not included.
         """
         if self.model_name == "gemini-3-flash-preview":
             INPUT_PRICE = 0.5 / 1000000
+            CACHED_INPUT_PRICE = 0.05 / 1000000
             OUTPUT_PRICE = 3 / 1000000
         elif self.model_name == "gemini-3.1-pro-preview":
             INPUT_PRICE = 2 / 1000000
+            CACHED_INPUT_PRICE = 0.2 / 1000000
             OUTPUT_PRICE = 12 / 1000000
         else:
             raise ValueError(f"Unknown model name: {self.model_name}")
 
-        total_cost = usage.prompt_tokens * INPUT_PRICE + (usage.completion_tokens + usage.thinking_tokens) * OUTPUT_PRICE
+        cached_tokens = getattr(usage, "cached_tokens", 0)
+        total_cost = ((usage.prompt_tokens - cached_tokens) * INPUT_PRICE + cached_tokens * CACHED_INPUT_PRICE
+                      + (usage.completion_tokens + usage.thinking_tokens) * OUTPUT_PRICE)
         return total_cost
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, List, Optional
+from .logger import logger
+from .utils import PhraseMatcher
+
+# Marks a prediction path that does not exist
+MISSING = object()
+
+
+@dataclass
+class GTLeaf:
+    """
+    One ground-truth answer slot.
+
+    `path` is the key path below the question's `student_answers` (empty for
+    essays and for answers stored directly in `student_answers`); `sub_path`
+    is the same path as the evaluator reports it ("a.b").
+    """
+    test_number: Any
+    question_type: Any
+    answer: Any
+    path: List[str] = field(default_factory=list)
+    sub_path: str = ""
+    crossedout_text: Any = None
+    is_legible: Any = ""
+    essay: bool = False
+
+
+@dataclass
+class CompiledGT:
+    """A ground truth flattened to its answer leaves, in evaluation order."""
+    leaves: List[GTLeaf]
+    structure_digest: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompiledGT":
+        return cls(leaves=[GTLeaf(**leaf) for leaf in data["leaves"]], structure_digest=data.get("structure_digest", ""))
+
+    def crossed_out_matcher(self, word_boundary: bool = False) -> PhraseMatcher:
+        """
+        One matcher over every crossed-out phrase of the paper. Built on first
+        use and kept with the compiled GT (not persisted), so re-evaluating
+        the sample reuses it.
+        """
+        # Outside the dataclass fields, so `asdict` and the saved index skip it
+        matchers = self.__dict__.setdefault("_matchers", {})
+        if word_boundary not in matchers:
+            phrases = [phrase for leaf in self.leaves if leaf.crossedout_text for phrase in leaf.crossedout_text]
+            matchers[word_boundary] = PhraseMatcher(phrases, word_boundary)
+        return matchers[word_boundary]
+
+
+def _collect_leaves(node: Any, path: List[str], sub_path: str, test_number: Any, question_type: Any, leaves: List[GTLeaf]):
+    if isinstance(node, dict) and "answer" in node:
+        leaves.append(GTLeaf(
+            test_number=test_number,
+            question_type=question_type,
+            answer=node["answer"],
+            path=path,
+            sub_path=sub_path,
+            crossedout_text=node.get("crossedout_text"),
+            is_legible=node.get("is_legible", "")
+        ))
+    elif isinstance(node, dict):
+        for k, v in node.items():
+            _collect_leaves(v, path + [k], f"{sub_path}.{k}" if sub_path else k, test_number, question_type, leaves)
+
+
+def compile_ground_truth(gt: Dict[str, Any]) -> CompiledGT:
+    """
+    Flattens a ground truth into its answer leaves.
+
+    Questions are keyed by test_number as in `Evaluator`, so a repeated
+    test_number keeps its first position and its last content.
+    """
+    leaves: List[GTLeaf] = []
+    for tnum, question in {q["test_number"]: q for q in gt.get("questions", [])}.items():
+        qtype = question.get("question_type", "Unknown")
+        answers = question.get("student_answers", "")
+        if isinstance(answers, str):
+            leaves.append(GTLeaf(test_number=tnum, question_type=qtype, answer=answers, essay=True))
+        else:
+            _collect_leaves(answers, [], "", tnum, qtype, leaves)
+    return CompiledGT(leaves=leaves)
+
+
+def resolve_path(answers: Any, path: List[str]) -> Any:
+    """The prediction node at `path` below `student_answers`, or MISSING."""
+    node = answers
+    for k in path:
+        if not isinstance(node, dict) or k not in node:
+            return MISSING
+        node = node[k]
+    return node
+
+
+def _digest(structure: str) -> str:
+    return hashlib.sha256(structure.encode("utf-8")).hexdigest()
+
+
+def _write_json(path: pathlib.Path, payload: Any):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer, so threads compiling the same paper do not share a temp file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path)
+
+
+class GroundTruthIndex:
+    """
+    Compiled ground truths and structure templates, keyed by GT file hash.
+
+    Papers whose structure serializes identically share one template, so
+    every paper of a set layout gets the same string object. With `path`
+    the index is a directory (next to the dataset manifest) with one file
+    per compiled ground truth under `entries/` and per template under
+    `structures/`. Entries are written when first compiled and read back
+    on demand, so a run only touches the papers it evaluates, and at most
+    `max_entries` of them are held in memory (least recently used first
+    out). Without `path` nothing is persisted. Keys must be usable as file
+    names when `path` is given.
+    """
+
+    VERSION = 2
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = pathlib.Path(path) if path else None
+        self.max_entries = max_entries
+        self.templates: Dict[str, str] = {}
+        self.compiled = 0
+        self.loaded = 0
+        self._entries: "OrderedDict[str, CompiledGT]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str) -> pathlib.Path:
+        return self.path / "entries" / f"{key}.json"
+
+    def _template_path(self, digest: str) -> pathlib.Path:
+        return self.path / "structures" / f"{digest}.json"
+
+    def _remember(self, key: str, compiled: CompiledGT):
+        # Called with the lock held
+        self._entries[key] = compiled
+        self._entries.move_to_end(key)
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def add(self, key: str, gt: Dict[str, Any], structure: str) -> CompiledGT:
+        """Compiles `gt` under `key` (e.g. its file hash) with its serialized structure."""
+        compiled = compile_ground_truth(gt)
+        compiled.structure_digest = _digest(structure)
+        if self.path is not None:
+            if not self._template_path(compiled.structure_digest).exists():
+                _write_json(self._template_path(compiled.structure_digest), structure)
+            _write_json(self._entry_path(key), {"version": self.VERSION, **asdict(compiled)})
+        with self._lock:
+            self.templates.setdefault(compiled.structure_digest, structure)
+            self._remember(key, compiled)
+            self.compiled += 1
+        return compiled
+
+    def get(self, key: str) -> Optional[CompiledGT]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.path is None or not self._entry_path(key).exists():
+            return None
+        try:
+            with open(self._entry_path(key), "r", encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != self.VERSION:
+                return None
+            compiled = CompiledGT.from_dict(data)
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Recompiling unreadable ground-truth index entry {self._entry_path(key)}: {e}")
+            return None
+        with self._lock:
+            self._remember(key, compiled)
+            self.loaded += 1
+        return compiled
+
+    def template(self, digest: str) -> Optional[str]:
+        """The structure template with `digest`; every caller gets the same string object."""
+        with self._lock:
+            if digest in self.templates:
+                return self.templates[digest]
+        if self.path is None or not self._template_path(digest).exists():
+            return None
+        try:
+            with open(self._template_path(digest), "r", encoding='utf-8') as f:
+                structure = json.load(f)
+        except json.JSONDecodeError:
+            return None
+        with self._lock:
+            return self.templates.setdefault(digest, structure)
+
+    def structure(self, key: str) -> Optional[str]:
+        compiled = self.get(key)
+        return self.template(compiled.structure_digest) if compiled is not None else None
+
+    def discard(self, keys: Iterable[str]):
+        """Drops the entries of `keys`, e.g. of ground truths that changed or were removed."""
+        for key in keys:
+            with self._lock:
+                self._entries.pop(key, None)
+            if self.path is not None:
+                try:
+                    self._entry_path(key).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"compiled": self.compiled, "loaded": self.loaded, "in_memory": len(self._entries), "structures": len(self.templates)}
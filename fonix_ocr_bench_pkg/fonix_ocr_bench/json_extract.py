@@ -0,0 +1,183 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, List, Tuple
+
+# Contents of the first fenced block; an unclosed fence (truncated output) runs to the end
+_FENCE_RE = re.compile(r"```(?:json)?[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_VALUE_START_RE = re.compile(r'["{\[\]}\-0-9]|(?:true|false|null)\b')
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+@dataclass
+class ExtractedJSON:
+    """
+    A JSON value recovered from model output.
+
+    `text` is the JSON text that was parsed: the original slice if it was
+    valid as is, otherwise the repaired one. `repairs` names the repairs
+    applied, in the order they were first needed.
+    """
+    value: Any
+    text: str
+    repairs: List[str] = field(default_factory=list)
+
+
+def _skip_whitespace(text: str, i: int) -> int:
+    while i < len(text) and text[i].isspace():
+        i += 1
+    return i
+
+
+def _closes_string(text: str, i: int) -> bool:
+    """Whether the quote at `text[i]` ends the string, rather than being an unescaped quote inside it."""
+    j = _skip_whitespace(text, i + 1)
+    if j == len(text) or text[j] in ":}]":
+        return True
+    if text[j] != ",":
+        return False
+    # A comma ends the string only if a value or closer follows, so "said "no", then" stays one string
+    k = _skip_whitespace(text, j + 1)
+    return k == len(text) or _VALUE_START_RE.match(text, k) is not None
+
+
+def _strip_trailing_comma(out: List[str]) -> bool:
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+        return True
+    return False
+
+
+def _close(out: List[str], stack: List[str]) -> str:
+    """`out` with its last member completed (or dropped) and every open bracket closed."""
+    out = list(out)
+    _strip_trailing_comma(out)
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ":":
+        out.append(" null")
+    return "".join(out) + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def _scan(text: str) -> Tuple[List[str], List[str], str, List[str], List[Tuple[int, List[str]]]]:
+    """
+    One pass over `text`, which starts with "{" or "[", up to where the outermost value closes.
+
+    Escapes raw control characters and unescaped quotes in strings, and drops
+    trailing commas and fixes mismatched closers on the way.
+
+    Returns:
+        (output pieces, brackets still open if the text is truncated, text after the value,
+        repairs, (output length, open brackets) before each member separator).
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    repairs: List[str] = []
+    members: List[Tuple[int, List[str]]] = []
+    in_string = False
+    i = 0
+
+    def repaired(name: str):
+        if name not in repairs:
+            repairs.append(name)
+
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            if c == "\\":
+                if i + 1 < len(text):
+                    out.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == '"':
+                if _closes_string(text, i):
+                    in_string = False
+                    out.append(c)
+                else:
+                    out.append('\\"')
+                    repaired("unescaped_quote")
+            elif c < " ":
+                out.append(json.dumps(c)[1:-1])
+                repaired("control_character")
+            else:
+                out.append(c)
+        elif c == '"':
+            in_string = True
+            out.append(c)
+        elif c in _CLOSERS:
+            stack.append(c)
+            out.append(c)
+        elif c in "}]":
+            if _strip_trailing_comma(out):
+                repaired("trailing_comma")
+            closer = _CLOSERS[stack.pop()]
+            if c != closer:
+                repaired("mismatched_closer")
+            out.append(closer)
+            if not stack:
+                return out, stack, text[i + 1:], repairs, members
+        else:
+            if c == ",":
+                members.append((len(out), list(stack)))
+            out.append(c)
+        i += 1
+
+    if in_string:
+        out.append('"')
+        repaired("truncated_string")
+    return out, stack, "", repairs, members
+
+
+def extract_json(text: str) -> ExtractedJSON:
+    """
+    Finds the outermost JSON object (or array) in model output and parses it, repairing common faults.
+
+    The value is looked for in the first ```json fence if there is one,
+    otherwise anywhere in the text. Text that parses as is comes back
+    without repairs, so well-formed output costs one `json.loads`. Otherwise
+    the value is rescanned once from its first "{" or "[", and the repairs
+    it needed are reported:
+
+    - "surrounding_text": prose before or after the value
+    - "trailing_comma": a comma before "}" or "]"
+    - "unescaped_quote": a quote inside a string that does not end it
+    - "control_character": a raw newline or tab inside a string
+    - "mismatched_closer": "]" closing an object or "}" closing an array
+    - "truncated_string", "truncated_closers": output cut off mid-string or with brackets open
+    - "dropped_partial_value": the last member of truncated output was incomplete and left out
+
+    Raises:
+        json.JSONDecodeError: If no JSON value can be recovered.
+    """
+    fence = _FENCE_RE.search(text)
+    candidate = (fence.group(1) if fence else text).strip()
+    try:
+        return ExtractedJSON(value=json.loads(candidate), text=candidate)
+    except json.JSONDecodeError as e:
+        error = e
+
+    starts = [i for i in (candidate.find("{"), candidate.find("[")) if i >= 0]
+    if not starts:
+        raise json.JSONDecodeError("No JSON object found", candidate, 0)
+    start = min(starts)
+    out, stack, rest, repairs, members = _scan(candidate[start:])
+    if candidate[:start].strip() or rest.strip():
+        repairs.insert(0, "surrounding_text")
+
+    attempts = [(out, stack, None)]
+    if stack:
+        repairs.append("truncated_closers")
+        # If closing as is does not parse, cut back to the last complete members
+        attempts += [(out[:length], opened, "dropped_partial_value") for length, opened in reversed(members[-2:])]
+    for pieces, opened, repair in attempts:
+        repaired_text = _close(pieces, opened) if opened else "".join(pieces)
+        try:
+            value = json.loads(repaired_text)
+        except json.JSONDecodeError:
+            continue
+        return ExtractedJSON(value=value, text=repaired_text, repairs=repairs + ([repair] if repair else []))
+    raise error
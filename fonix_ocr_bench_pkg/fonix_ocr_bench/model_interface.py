@@ -1,19 +1,36 @@
+import asyncio
+import functools
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from concurrent.futures import Executor
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
 from dataclasses import dataclass, field
 
+# Pool for the blocking parts of async model calls; `BenchmarkRunner.arun` sets it to the run's own pool
+blocking_executor: ContextVar[Optional[Executor]] = ContextVar("blocking_executor", default=None)
+
+
+async def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Runs `func` on `blocking_executor`, or the event loop's default executor if it is not set."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor.get(), functools.partial(func, *args, **kwargs))
+
 @dataclass
 class UsageStats:
     """Provider-agnostic usage statistics."""
     prompt_tokens: int = 0
     completion_tokens: int = 0
     thinking_tokens: int = 0
+    cached_tokens: int = 0  # Part of prompt_tokens served from a provider-side context cache
 
 @dataclass
 class PredictionResult:
     text: str
     usage: UsageStats
     raw_response: Any = None
+    retries: int = 0
+    wait_time: float = 0.0
+    cached: bool = False  # Served from the local response cache; `usage` is that of the original call
 
 class ModelInterface(ABC):
     """
@@ -22,7 +39,8 @@ class ModelInterface(ABC):
     """
 
     @abstractmethod
-    def call(self, prompt: str, system_instruction: str, image_path: Optional[str] = None) -> PredictionResult:
+    def call(self, prompt: str, system_instruction: str, image_path: Optional[str] = None,
+             image_bytes: Optional[bytes] = None, mime_type: Optional[str] = None) -> PredictionResult:
         """
         Calls the model with the given prompt and optional image.
 
@@ -30,12 +48,45 @@ class ModelInterface(ABC):
             prompt (str): The prompt to send to the model.
             system_instruction (str): System instructions for the model.
             image_path (str, optional): Path to the image file (PDF/Image).
+            image_bytes (bytes, optional): Encoded page image, used in page-by-page mode.
+            mime_type (str, optional): MIME type of `image_bytes` (e.g. "image/png", "image/jpeg").
 
         Returns:
             PredictionResult: An object containing the generated text and usage statistics.
         """
         pass
 
+    async def acall(self, prompt: str, system_instruction: str, **kwargs) -> PredictionResult:
+        """
+        Async variant of `call`.
+
+        The default implementation adapts the synchronous `call` by running it
+        on `blocking_executor` (under `BenchmarkRunner.arun`, the run's pool of
+        `max_concurrency` threads), so existing model classes work with `arun`
+        unchanged. Override it when the provider SDK offers a native async client.
+
+        Args:
+            prompt (str): The prompt to send to the model.
+            system_instruction (str): System instructions for the model.
+            **kwargs: Forwarded to `call` (e.g. image_path, image_bytes).
+
+        Returns:
+            PredictionResult: An object containing the generated text and usage statistics.
+        """
+        return await run_blocking(self.call, prompt, system_instruction, **kwargs)
+
+    def get_config(self) -> Dict[str, Any]:
+        """
+        Returns the settings that influence the model's output.
+
+        Used to key response caches, so subclasses should include everything
+        that changes the response (model name, sampling parameters, ...).
+
+        Returns:
+            Dict[str, Any]: A JSON-serializable description of the model config.
+        """
+        return {"model_class": type(self).__name__}
+
     @abstractmethod
     def calculate_cost(self, usage: Any) -> float:
         """
@@ -0,0 +1,135 @@
+from typing import Any, Dict, List, Tuple
+
+TIE_BREAKS = ("first", "last", "longest", "concat")
+
+# Higher rank wins when two pages both report an answer for the same field
+LEGIBILITY_RANK = {"true": 2, "false": 1}
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and value.strip() == "") or value == {} or value == []
+
+
+def _legibility(candidate: Any) -> int:
+    if isinstance(candidate, dict):
+        return LEGIBILITY_RANK.get(str(candidate.get("is_legible", "")).lower(), 0)
+    return 0
+
+
+def _answer_text(candidate: Any) -> Any:
+    return candidate.get("answer", "") if isinstance(candidate, dict) else candidate
+
+
+class PageMerger:
+    """
+    Merges per-page predictions of the same document into one prediction.
+
+    The merged object has exactly the shape of the injected structure. For
+    every field the candidates from all pages are compared with this policy:
+
+    1. A non-empty answer wins over an empty one.
+    2. Among answer objects, legibility precedence applies: "true" > "false" > "".
+    3. Remaining ties are broken by `tie_break`:
+       "first" (earliest page), "last" (latest page), "longest" (longest text)
+       or "concat" (join the distinct answers in page order, e.g. essays
+       continuing over several pages).
+
+    The result only depends on the page order, never on completion order.
+    """
+
+    def __init__(self, tie_break: str = "first"):
+        if tie_break not in TIE_BREAKS:
+            raise ValueError(f"Unknown tie_break: {tie_break} (expected one of {TIE_BREAKS})")
+        self.tie_break = tie_break
+        self.conflicts = 0
+
+    def merge(self, structure: Any, page_predictions: List[Any]) -> Any:
+        self.conflicts = 0
+        return self._merge(structure, page_predictions)
+
+    def _merge(self, structure: Any, candidates: List[Any]) -> Any:
+        if isinstance(structure, dict) and "answer" in structure:
+            return self._merge_leaf(structure, [c for c in candidates if isinstance(c, dict)])
+        if isinstance(structure, dict):
+            return {
+                k: self._merge(v, [c.get(k) for c in candidates if isinstance(c, dict) and k in c])
+                for k, v in structure.items()
+            }
+        if isinstance(structure, list):
+            return self._merge_list(structure, candidates)
+        # Scalars (including essay answers given as plain strings)
+        return self._choose(structure, [c for c in candidates if not isinstance(c, (dict, list))])
+
+    def _merge_list(self, structure: List[Any], candidates: List[Any]) -> List[Any]:
+        lists = [c for c in candidates if isinstance(c, list)]
+        merged = []
+        for index, item in enumerate(structure):
+            if isinstance(item, dict) and "test_number" in item:
+                # Questions are matched on test_number, pages may reorder or omit them
+                matches = [
+                    q for lst in lists for q in lst
+                    if isinstance(q, dict) and q.get("test_number") == item["test_number"]
+                ]
+            else:
+                matches = [lst[index] for lst in lists if index < len(lst)]
+            merged.append(self._merge(item, matches))
+        return merged
+
+    def _merge_leaf(self, structure: Dict[str, Any], candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        answered = [c for c in candidates if not _is_empty(c.get("answer"))]
+        if not answered:
+            # Keep any legibility verdict a page gave for an empty answer
+            best = max(candidates, key=_legibility, default=None)
+            merged = dict(structure)
+            if best is not None:
+                merged.update({k: best[k] for k in structure if k in best})
+            return merged
+
+        top_rank = max(_legibility(c) for c in answered)
+        answered = [c for c in answered if _legibility(c) == top_rank]
+        chosen = self._break_tie(answered, key=lambda c: str(c.get("answer", "")))
+        merged = dict(structure)
+        merged.update({k: chosen[k] for k in structure if k in chosen})
+        if self.tie_break == "concat":
+            merged["answer"] = self._concat([c.get("answer", "") for c in answered])
+        return merged
+
+    def _choose(self, default: Any, candidates: List[Any]) -> Any:
+        answered = [c for c in candidates if not _is_empty(c)]
+        if not answered:
+            return default
+        if self.tie_break == "concat" and all(isinstance(c, str) for c in answered):
+            if len(set(answered)) > 1:
+                self.conflicts += 1
+            return self._concat(answered)
+        return self._break_tie(answered, key=lambda c: str(c))
+
+    def _break_tie(self, candidates: List[Any], key) -> Any:
+        if len({key(c) for c in candidates}) > 1:
+            self.conflicts += 1
+        if self.tie_break == "last":
+            return candidates[-1]
+        if self.tie_break == "longest":
+            # max() keeps the earliest page among equally long answers
+            return max(candidates, key=lambda c: len(key(c)))
+        return candidates[0]
+
+    @staticmethod
+    def _concat(answers: List[str]) -> str:
+        distinct = []
+        for answer in answers:
+            if answer not in distinct:
+                distinct.append(answer)
+        return " ".join(distinct)
+
+
+def merge_page_predictions(structure: Any, page_predictions: List[Any], tie_break: str = "first") -> Tuple[Any, int]:
+    """
+    Merges per-page predictions into one prediction shaped like `structure`.
+
+    Returns:
+        Tuple of (merged prediction, number of fields where pages disagreed).
+    """
+    merger = PageMerger(tie_break)
+    merged = merger.merge(structure, page_predictions)
+    return merged, merger.conflicts
@@ -0,0 +1,100 @@
+from typing import Any, Dict, Iterator, List, Tuple
+from .json_extract import extract_json
+
+PATH_SEPARATOR = "/"
+
+
+def iter_answer_slots(prediction: Dict[str, Any]) -> Iterator[Tuple[List[str], Dict[str, Any], Any]]:
+    """
+    Yields (path, question, slot) for every answer slot in a structure/prediction.
+
+    The path is the question's test_number followed by the sub-question keys.
+    `slot` is the answer dict, or the plain string for essays stored directly
+    in `student_answers`.
+    """
+    for question in prediction.get("questions", []):
+        if not isinstance(question, dict) or "test_number" not in question:
+            continue
+        tnum = str(question["test_number"])
+        answers = question.get("student_answers", "")
+        if isinstance(answers, str):
+            yield [tnum], question, answers
+            continue
+        yield from _iter_nested(answers, [tnum], question)
+
+
+def _iter_nested(node: Any, path: List[str], question: Dict[str, Any]):
+    if isinstance(node, dict) and "answer" in node:
+        yield path, question, node
+    elif isinstance(node, dict):
+        for k, v in node.items():
+            yield from _iter_nested(v, path + [str(k)], question)
+
+
+def _slot_answer(slot: Any) -> Any:
+    return slot.get("answer", "") if isinstance(slot, dict) else slot
+
+
+def unanswered_paths(prediction: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Returns (path, question) for every slot whose answer is still empty."""
+    return [
+        (PATH_SEPARATOR.join(path), question)
+        for path, question, slot in iter_answer_slots(prediction)
+        if str(_slot_answer(slot)).strip() == ""
+    ]
+
+
+def format_path_list(paths: List[Tuple[str, Dict[str, Any]]]) -> str:
+    """One line per path with the question type and instruction as context."""
+    lines = []
+    for path, question in paths:
+        qtype = question.get("question_type")
+        context = [f"[{qtype}]"] if qtype else []
+        if question.get("instruction"):
+            context.append(question["instruction"])
+        lines.append(f"{path}  {' '.join(context)}".rstrip())
+    return "\n".join(lines)
+
+
+def parse_patch(text: str) -> List[Dict[str, Any]]:
+    """
+    Parses the model's patch: a JSON list of {"path", "answer", "is_legible"} edits,
+    optionally wrapped in a ```json fence or an {"edits": [...]} object.
+    Malformed JSON is repaired where possible (see `extract_json`).
+    """
+    return edits_from_patch(extract_json(text).value)
+
+
+def edits_from_patch(patch: Any) -> List[Dict[str, Any]]:
+    """The edits of an already parsed patch."""
+    if isinstance(patch, dict):
+        patch = patch.get("edits", [])
+    if not isinstance(patch, list):
+        raise ValueError("Patch must be a JSON list of edits")
+    return [edit for edit in patch if isinstance(edit, dict) and "path" in edit]
+
+
+def apply_patch(prediction: Dict[str, Any], patch: List[Dict[str, Any]]) -> int:
+    """
+    Applies path/value edits to `prediction` in place.
+
+    Edits for paths that do not exist in the structure are ignored, so the
+    model cannot add fields. Returns the number of edits applied.
+    """
+    slots = {PATH_SEPARATOR.join(path): (question, slot) for path, question, slot in iter_answer_slots(prediction)}
+    applied = 0
+    for edit in patch:
+        path = edit["path"]
+        if isinstance(path, list):
+            path = PATH_SEPARATOR.join(str(p) for p in path)
+        if path not in slots:
+            continue
+        question, slot = slots[path]
+        if isinstance(slot, dict):
+            for field in ("answer", "is_legible"):
+                if field in edit:
+                    slot[field] = edit[field]
+        elif "answer" in edit:
+            question["student_answers"] = edit["answer"]
+        applied += 1
+    return applied
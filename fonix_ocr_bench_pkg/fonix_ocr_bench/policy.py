@@ -0,0 +1,288 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from .model_interface import ModelInterface, PredictionResult
+from .logger import logger
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token) used before a response is available."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`.
+
+    `reserve` never blocks: it takes the tokens (possibly going into debt) and
+    returns how long the caller has to wait before proceeding, so the same
+    bucket can be shared by threads and coroutines.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def adjust(self, delta: float):
+        """Corrects a previous reservation once the real amount is known (positive delta consumes more)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - delta)
+
+
+class CircuitBreaker:
+    """
+    Shared breaker that pauses every caller while the provider is degraded.
+
+    After `failure_threshold` consecutive retryable failures the breaker opens
+    for `reset_timeout` seconds. It then lets a single probe request through;
+    a success closes it again, a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, probe_interval: float = 1.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probe_interval = probe_interval
+        self.state = self.CLOSED
+        self.trips = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Returns 0 if a request may be sent now, otherwise the seconds to wait before asking again."""
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    return remaining
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return self.probe_interval
+                self._probing = True
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = self.CLOSED
+
+    def release(self):
+        """Ends a half-open probe without a verdict, so another caller can probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures; pausing for {self.reset_timeout}s")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff keyed on the class of error.
+
+    `backoff` maps an error class to (base_delay, max_retries). Errors that
+    do not classify are not retried.
+    """
+
+    DEFAULT_BACKOFF = {
+        "rate_limit": (5.0, 8),
+        "server_error": (2.0, 5),
+        "network": (1.0, 5),
+    }
+
+    def __init__(self, backoff: Optional[Dict[str, Tuple[float, int]]] = None, max_delay: float = 120.0):
+        self.backoff = dict(self.DEFAULT_BACKOFF)
+        if backoff:
+            self.backoff.update(backoff)
+        self.max_delay = max_delay
+
+    def classify(self, error: Exception) -> Optional[str]:
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if code == 429:
+            return "rate_limit"
+        if code in (500, 502, 503, 504):
+            return "server_error"
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return "network"
+        name = type(error).__name__
+        if "Timeout" in name or "Connect" in name:
+            return "network"
+        return None
+
+    def is_provider_response(self, error: Exception) -> bool:
+        """True if the error carries a 4xx status, i.e. the provider received and answered the request."""
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        return isinstance(code, int) and 400 <= code < 500
+
+    def max_retries(self, error_class: str) -> int:
+        return self.backoff[error_class][1]
+
+    def delay(self, error_class: str, attempt: int) -> float:
+        """Full-jitter delay for the given (zero-based) retry attempt."""
+        base = self.backoff[error_class][0]
+        return random.uniform(0, min(self.max_delay, base * (2 ** attempt)))
+
+
+class ResilientModel(ModelInterface):
+    """
+    Wraps a ModelInterface with rate limiting, retries and a circuit breaker.
+
+    Retry counts and time spent waiting are reported on each returned
+    PredictionResult (`retries`, `wait_time`).
+    """
+
+    def __init__(self,
+                 model: ModelInterface,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.model = model
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.total_retries = 0
+        self.total_wait_time = 0.0
+        self._stats_lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def get_config(self) -> Dict[str, Any]:
+        return self.model.get_config()
+
+    def _rate_delay(self, estimated_tokens: int) -> float:
+        delays = [0.0]
+        if self.request_bucket:
+            delays.append(self.request_bucket.reserve(1))
+        if self.token_bucket:
+            delays.append(self.token_bucket.reserve(estimated_tokens))
+        return max(delays)
+
+    def _on_success(self, result: PredictionResult, estimated_tokens: int, retries: int, waited: float) -> PredictionResult:
+        self.circuit_breaker.record_success()
+        if self.token_bucket:
+            u = result.usage
+            self.token_bucket.adjust(u.prompt_tokens + u.completion_tokens + u.thinking_tokens - estimated_tokens)
+        result.retries += retries
+        result.wait_time += waited
+        with self._stats_lock:
+            self.total_retries += retries
+            self.total_wait_time += waited
+        return result
+
+    def _on_failure(self, error: Exception, attempt: int) -> float:
+        """Returns the backoff delay before the next attempt, or re-raises if the error is final."""
+        error_class = self.retry_policy.classify(error)
+        if error_class is None:
+            if self.retry_policy.is_provider_response(error):
+                # The provider answered (e.g. a 400), so it is not degraded
+                self.circuit_breaker.record_success()
+            else:
+                # A local error says nothing about the provider
+                self.circuit_breaker.release()
+            raise error
+        self.circuit_breaker.record_failure()
+        if attempt >= self.retry_policy.max_retries(error_class):
+            raise error
+        delay = self.retry_policy.delay(error_class, attempt)
+        logger.warning(f"Model call failed ({error_class}: {error}); retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    def call(self, prompt: str, system_instruction: str, **kwargs) -> PredictionResult:
+        estimated_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction)
+        waited = 0.0
+        attempt = 0
+        while True:
+            # Breaker and rate limits are checked before every attempt
+            delay = self.circuit_breaker.acquire()
+            while delay > 0:
+                time.sleep(delay)
+                waited += delay
+                delay = self.circuit_breaker.acquire()
+            delay = self._rate_delay(estimated_tokens)
+            if delay > 0:
+                time.sleep(delay)
+                waited += delay
+            try:
+                result = self.model.call(prompt, system_instruction, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                time.sleep(delay)
+                waited += delay
+                attempt += 1
+                continue
+            return self._on_success(result, estimated_tokens, attempt, waited)
+
+    async def acall(self, prompt: str, system_instruction: str, **kwargs) -> PredictionResult:
+        estimated_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction)
+        waited = 0.0
+        attempt = 0
+        while True:
+            delay = self.circuit_breaker.acquire()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+                delay = self.circuit_breaker.acquire()
+            delay = self._rate_delay(estimated_tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                waited += delay
+            try:
+                result = await self.model.acall(prompt, system_instruction, **kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt)
+                await asyncio.sleep(delay)
+                waited += delay
+                attempt += 1
+                continue
+            return self._on_success(result, estimated_tokens, attempt, waited)
+
+    def calculate_cost(self, usage: Any) -> float:
+        return self.model.calculate_cost(usage)
+
+    def policy_stats(self) -> Dict[str, Any]:
+        """Aggregate retry/wait counters and breaker trips, as written into summary.json."""
+        with self._stats_lock:
+            return {
+                "total_retries": self.total_retries,
+                "total_wait_time": self.total_wait_time,
+                "circuit_breaker_trips": self.circuit_breaker.trips,
+            }
@@ -0,0 +1,126 @@
+import json
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from .utils import bounded_edit_distance
+
+# Typographic quotes, primes and dashes mapped to their ASCII forms
+_TYPOGRAPHY = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "−": "-",
+})
+_PUNCT_RE = re.compile(r"[^\w\s]")
+# Digits that OCR confuses with letters, only where they touch a letter, so "10" vs "lo" stays an error
+_GLYPHS = {"0": "o", "1": "l", "5": "s"}
+_GLYPH_RE = re.compile(r"(?<=[^\W\d_])[015]|[015](?=[^\W\d_])")
+
+
+@dataclass
+class DiffRules:
+    """
+    Deterministic rules that settle trivial word-level errors without the model.
+
+    A replaced word pair (or inserted words, with an empty gt) is trivial if
+    gt and pred are equal after a normalization step, tried in order:
+    Unicode compatibility forms, typographic quotes and dashes ("unicode"),
+    spacing between words ("whitespace"), hyphens ("hyphenation"), all
+    punctuation ("punctuation") and digits misread as the letters they
+    resemble inside a word, e.g. "l0ve" for "love" ("glyph"). Real word
+    swaps such as "then"/"than" or "form"/"from" are never trivial under
+    these rules.
+
+    There is no case rule: `align_words` compares words case-insensitively,
+    so case-only differences are matches and never reach this class. Both
+    sides are case-folded before the rules above.
+
+    Free character edits ("edit_distance:N") are off by default, since
+    they cannot tell a misread glyph from a different word. They can be
+    allowed per question type, and only when both sides have at least
+    `min_length` characters.
+
+    The evaluator records the reason on the pair under "rule"; the refiner
+    treats such pairs as not hallucinated and sends only the others.
+
+    Args:
+        unicode (bool): Apply the Unicode/typography rule.
+        whitespace (bool): Apply the whitespace rule.
+        hyphenation (bool): Apply the hyphenation rule.
+        punctuation (bool): Apply the punctuation rule.
+        glyphs (bool): Apply the digit/letter glyph rule.
+        max_edits (int): Character edits allowed for question types not in `max_edits_by_type` (0 disables).
+        max_edits_by_type (Dict[str, int]): Character edits allowed per question type code, e.g. {"W": 2, "FITB": 0}.
+        min_length (int): Minimum characters on both sides for an edit to be allowed.
+    """
+    unicode: bool = True
+    whitespace: bool = True
+    hyphenation: bool = True
+    punctuation: bool = True
+    glyphs: bool = True
+    max_edits: int = 0
+    max_edits_by_type: Dict[str, int] = field(default_factory=dict)
+    min_length: int = 4
+
+    @classmethod
+    def from_file(cls, path: str) -> "DiffRules":
+        """Loads rules from a JSON object with the field names as keys; missing fields keep their defaults."""
+        with open(path, "r", encoding='utf-8') as f:
+            return cls(**json.load(f))
+
+    def edit_limit(self, qtype: Any) -> int:
+        return self.max_edits_by_type.get(qtype, self.max_edits)
+
+    def classify(self, gt_words: List[str], pred_words: List[str], qtype: Any = None) -> Optional[str]:
+        """The reason the pair is trivial, or None if it is left to refinement."""
+        gt = " ".join(gt_words).casefold()
+        pred = " ".join(pred_words).casefold()
+        if self.unicode:
+            gt = unicodedata.normalize("NFKC", gt).translate(_TYPOGRAPHY)
+            pred = unicodedata.normalize("NFKC", pred).translate(_TYPOGRAPHY)
+            if gt == pred:
+                return "unicode"
+        spaced = (gt, pred)
+        if self.whitespace:
+            gt = "".join(gt.split())
+            pred = "".join(pred.split())
+            if gt == pred:
+                return "whitespace"
+        if self.hyphenation:
+            gt = gt.replace("-", "")
+            pred = pred.replace("-", "")
+            if gt == pred:
+                return "hyphenation"
+        if self.punctuation:
+            gt = _PUNCT_RE.sub("", gt)
+            pred = _PUNCT_RE.sub("", pred)
+            if gt == pred:
+                return "punctuation"
+        if self.glyphs:
+            # Mapped before spaces are dropped, so a digit next to a separate word keeps its value
+            gt_glyphs, pred_glyphs = (self._strip(_GLYPH_RE.sub(lambda m: _GLYPHS[m.group()], text)) for text in spaced)
+            if gt_glyphs == pred_glyphs:
+                return "glyph"
+        limit = self.edit_limit(qtype)
+        if limit > 0 and min(len(gt), len(pred)) >= self.min_length:
+            distance = bounded_edit_distance(gt, pred, limit)
+            if distance <= limit:
+                return f"edit_distance:{distance}"
+        return None
+
+    def _strip(self, text: str) -> str:
+        """`text` with the enabled whitespace, hyphenation and punctuation normalizations applied."""
+        if self.whitespace:
+            text = "".join(text.split())
+        if self.hyphenation:
+            text = text.replace("-", "")
+        if self.punctuation:
+            text = _PUNCT_RE.sub("", text)
+        return text
+
+    def annotate(self, entry: Dict[str, Any], gt_words: List[str], pred_words: List[str]) -> Dict[str, Any]:
+        """Records the reason on a replaced/inserted word entry under "rule", if the pair is trivial."""
+        reason = self.classify(gt_words, pred_words, entry.get("question_type"))
+        if reason is not None:
+            entry["rule"] = reason
+        return entry
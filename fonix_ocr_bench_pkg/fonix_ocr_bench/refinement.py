@@ -1,38 +1,284 @@
 import json
-import re
+import pathlib
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+from .json_extract import extract_json
+from .logger import logger
 from .model_interface import ModelInterface, PredictionResult
 
+
+def _normalize(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def verdict_key(item: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(question type, gt, pred) of a refinement item, case-folded with Unicode and whitespace normalized."""
+    return str(item.get("qtype") or ""), _normalize(item["gt"]), _normalize(item["pred"])
+
+
+class VerdictStore:
+    """
+    Persistent memo of refinement verdicts by `verdict_key`.
+
+    The same word pairs (spelling variants, punctuation, option letters)
+    recur across papers and runs; once judged, they are resolved from here
+    instead of being sent to the model again. New verdicts are appended to
+    the JSONL file at `path`; when loading, the last verdict for a key wins.
+    """
+
+    def __init__(self, path: str = ".fonix_cache/verdicts.jsonl"):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._verdicts: Dict[Tuple[str, str, str], bool] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                        self._verdicts[(record["qtype"], record["gt"], record["pred"])] = bool(record["hallucination"])
+                    except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        logger.warning(f"Skipping unreadable line {line_no} of verdict store {self.path}: {e}")
+
+    def get(self, item: Dict[str, Any]) -> Optional[bool]:
+        with self._lock:
+            return self._verdicts.get(verdict_key(item))
+
+    def put_many(self, judged: List[Tuple[Dict[str, Any], bool]]):
+        """Stores (item, verdict) pairs."""
+        if not judged:
+            return
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding='utf-8') as f:
+                for item, verdict in judged:
+                    qtype, gt, pred = key = verdict_key(item)
+                    self._verdicts[key] = verdict
+                    f.write(json.dumps({"qtype": qtype, "gt": gt, "pred": pred, "hallucination": verdict}, ensure_ascii=False) + "\n")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._verdicts)
+
+
 class Refiner:
-    def __init__(self, model: ModelInterface):
+    """
+    Asks the model which of the programmatic word-level errors are real hallucinations.
+
+    Only the candidate items (replaced word pairs and inserted words) are sent,
+    one compact line each, and the model answers with a verdict per item. The
+    corrected word counts and rates are then recomputed locally, so samples
+    without word-level errors need no call at all. With a `VerdictStore`,
+    items judged before (in any paper or run) are resolved locally and only
+    unseen ones are sent; identical items in one request are sent once.
+    Items the evaluator's `DiffRules` marked as trivial are never sent.
+    """
+
+    def __init__(self, model: ModelInterface, verdicts: Optional[VerdictStore] = None):
         self.model = model
+        self.verdicts = verdicts
         self.system_instruction = "You are very good at detecting hallucinations in student's answers."
+        self.stats = {"samples": 0, "skipped": 0, "calls": 0, "items": 0, "rejected": 0, "failed": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0, "memo_hits": 0, "memo_misses": 0, "rule_resolved": 0, "repaired": 0, "cached_calls": 0}
+        self._lock = threading.Lock()
 
-    def refine(self, evaluation_results: dict) -> dict:
-        """
-        Refines the evaluation results using the model.
-        """
-        prompt = f"""
-Here there is the hallucination report but the word level error is progamatically calculated. So, the some of the predictions which are not semms to be  a hallucination is categorized as word level error, then the word level hallucination rate is got increased. So, I need you to correct the Word-level hallucination rate, DETAILED WORD-LEVEL ERRORS, and the question_type_metrics.
+    @staticmethod
+    def candidate_items(evaluation_results: dict) -> List[Dict[str, Any]]:
+        """The word-level errors to judge; ids are positions in replaced_word_pairs followed by inserted_words."""
+        items = []
+        for pair in evaluation_results.get("replaced_word_pairs", []):
+            items.append({"gt": " ".join(pair["gt_words"]), "pred": " ".join(pair["pred_words"]), "qtype": pair.get("question_type"), "rule": pair.get("rule")})
+        for inserted in evaluation_results.get("inserted_words", []):
+            items.append({"gt": "", "pred": " ".join(inserted["words"]), "qtype": inserted.get("question_type"), "rule": inserted.get("rule")})
+        for i, item in enumerate(items):
+            item["id"] = i
+            for key in ("qtype", "rule"):
+                if item[key] is None:
+                    del item[key]
+        return items
+
+    def _build_prompt(self, items: List[Dict[str, Any]]) -> str:
+        lines = "\n".join(json.dumps({k: item[k] for k in ("id", "qtype", "gt", "pred") if k in item}, ensure_ascii=False) for item in items)
+        return f"""
+A word diff between a student's answers (gt) and their transcription (pred) flagged the items below as word-level hallucinations. Some of them are not hallucinations, e.g. spelling variants, punctuation, casing or equivalent notation. An empty gt means the pred words were inserted.
 
-REPORT:
-```
-{json.dumps(evaluation_results, indent=4)}
-```
+ITEMS:
+{lines}
 
-Output should be same as given REPORT but with corrected word level hallucination rates (both global and in question_type_metrics) and DETAILED WORD-LEVEL ERRORS.
-Only output the corrected report in json format nothing else.
+For every id, answer true if pred is a real hallucination and false if it is not.
+Only output a JSON object mapping each id to true or false, e.g. {{"0": true, "1": false}}.
 """
-        
-        result: PredictionResult = self.model.call(prompt, self.system_instruction)
-        
+
+    def _parse_verdicts(self, result: PredictionResult) -> Optional[Dict[int, bool]]:
         try:
-            match = re.search(r'```json\s*(.*?)\s*```', result.text, re.DOTALL)
-            if match:
-                json_text = match.group(1)
-                return json.loads(json_text)
-            else:
-                # Try simple json load if no code blocks
-                return json.loads(result.text)
+            extracted = extract_json(result.text)
+            if extracted.repairs:
+                logger.warning(f"Repaired refinement result: {', '.join(extracted.repairs)}")
+                self._record(repaired=1)
+            return {int(k): v for k, v in extracted.value.items() if isinstance(v, bool)}
         except Exception as e:
-            print(f"Error parsing refinement result: {e}")
+            logger.warning(f"Error parsing refinement result: {e}")
+            return None
+
+    @staticmethod
+    def apply_verdicts(evaluation_results: dict, verdicts: Dict[int, bool]) -> Tuple[dict, int]:
+        """
+        Drops the items judged not to be hallucinations and recomputes the word counts and rates.
+        Items without a verdict are kept.
+
+        Returns:
+            (refined results, number of items dropped).
+        """
+        refined = dict(evaluation_results)
+        qtype_metrics = {qtype: dict(metrics) for qtype, metrics in evaluation_results.get("question_type_metrics", {}).items()}
+        replaced = evaluation_results.get("replaced_word_pairs", [])
+        entries = [(entry, entry["pred_words"]) for entry in replaced]
+        entries += [(entry, entry["words"]) for entry in evaluation_results.get("inserted_words", [])]
+
+        kept = []
+        removed_words = 0
+        for i, (entry, words) in enumerate(entries):
+            if verdicts.get(i) is not False:
+                kept.append(i)
+                continue
+            removed_words += len(words)
+            if entry.get("question_type") in qtype_metrics:
+                qtype_metrics[entry["question_type"]]["hallu_words"] -= len(words)
+
+        total_gt_words = evaluation_results.get("total_gt_words", 0)
+        total_hallucinated_words = evaluation_results.get("total_hallucinated_words", 0) - removed_words
+        refined["replaced_word_pairs"] = [entries[i][0] for i in kept if i < len(replaced)]
+        refined["inserted_words"] = [entries[i][0] for i in kept if i >= len(replaced)]
+        refined["total_hallucinated_words"] = total_hallucinated_words
+        refined["word_level_hallucination_rate"] = total_hallucinated_words / total_gt_words if total_gt_words > 0 else 0
+        refined["question_type_metrics"] = qtype_metrics
+        return refined, len(entries) - len(kept)
+
+    def _record(self, **counts: int):
+        with self._lock:
+            for key, value in counts.items():
+                self.stats[key] += value
+
+    def count_sample(self, items: List[Dict[str, Any]]):
+        """Records a sample and its candidate items; samples without items are counted as skipped."""
+        self._record(samples=1, items=len(items), skipped=0 if items else 1)
+
+    def split_known(self, items: List[Dict[str, Any]]) -> Tuple[Dict[int, bool], List[Dict[str, Any]]]:
+        """
+        Resolves the items marked trivial by a rule (as not hallucinated) and
+        looks the rest up in the verdict store.
+
+        Returns:
+            (local verdicts by item id, items still to send to the model).
+        """
+        known = {item["id"]: False for item in items if "rule" in item}
+        unknown = [item for item in items if "rule" not in item]
+        if known:
+            self._record(rule_resolved=len(known))
+        if self.verdicts is None:
+            return known, unknown
+        remaining = []
+        for item in unknown:
+            verdict = self.verdicts.get(item)
+            if verdict is None:
+                remaining.append(item)
+            else:
+                known[item["id"]] = verdict
+        self._record(memo_hits=len(unknown) - len(remaining), memo_misses=len(remaining))
+        return known, remaining
+
+    @staticmethod
+    def _deduplicate(items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """The distinct items, renumbered, and the index of each item among them."""
+        positions: Dict[Tuple[str, str, str], int] = {}
+        unique = []
+        index = []
+        for item in items:
+            key = verdict_key(item)
+            if key not in positions:
+                positions[key] = len(unique)
+                unique.append(dict(item, id=len(unique)))
+            index.append(positions[key])
+        return unique, index
+
+    def _judged(self, result: PredictionResult, items: List[Dict[str, Any]],
+                unique: List[Dict[str, Any]], index: List[int]) -> Optional[Dict[int, bool]]:
+        if result.cached:
+            self._record(cached_calls=1)
+        else:
+            self._record(calls=1, prompt_tokens=result.usage.prompt_tokens, completion_tokens=result.usage.completion_tokens)
+        verdicts = self._parse_verdicts(result)
+        if verdicts is None:
+            self._record(failed=1)
+            return None
+        if self.verdicts is not None:
+            self.verdicts.put_many([(item, verdicts[item["id"]]) for item in unique if item["id"] in verdicts])
+        return {item["id"]: verdicts[i] for item, i in zip(items, index) if i in verdicts}
+
+    def judge(self, items: List[Dict[str, Any]]) -> Optional[Dict[int, bool]]:
+        """
+        One model call over `items`, which may come from several samples.
+
+        Returns:
+            The verdicts by item id, or None if the answer could not be parsed.
+        """
+        unique, index = self._deduplicate(items)
+        result: PredictionResult = self.model.call(self._build_prompt(unique), self.system_instruction)
+        return self._judged(result, items, unique, index)
+
+    async def ajudge(self, items: List[Dict[str, Any]]) -> Optional[Dict[int, bool]]:
+        """Async variant of `judge`."""
+        unique, index = self._deduplicate(items)
+        result: PredictionResult = await self.model.acall(self._build_prompt(unique), self.system_instruction)
+        return self._judged(result, items, unique, index)
+
+    def finish(self, evaluation_results: dict, verdicts: Optional[Dict[int, bool]]) -> dict:
+        """The refined results for `verdicts` from `judge`, or the original ones if there are none."""
+        if verdicts is None:
             return evaluation_results # Return original if failure
+        refined, rejected = self.apply_verdicts(evaluation_results, verdicts)
+        self._record(rejected=rejected)
+        return refined
+
+    @staticmethod
+    def _merge(known: Dict[int, bool], judged: Optional[Dict[int, bool]]) -> Optional[Dict[int, bool]]:
+        if judged is None:
+            return known or None
+        return {**known, **judged}
+
+    def refine(self, evaluation_results: dict) -> dict:
+        """
+        Refines the evaluation results using the model.
+        """
+        items = self.candidate_items(evaluation_results)
+        self.count_sample(items)
+        if not items:
+            return evaluation_results
+        known, unknown = self.split_known(items)
+        if not unknown:
+            return self.finish(evaluation_results, known)
+        return self.finish(evaluation_results, self._merge(known, self.judge(unknown)))
+
+    async def arefine(self, evaluation_results: dict) -> dict:
+        """
+        Async variant of `refine`, using the model's `acall`.
+        """
+        items = self.candidate_items(evaluation_results)
+        self.count_sample(items)
+        if not items:
+            return evaluation_results
+        known, unknown = self.split_known(items)
+        if not unknown:
+            return self.finish(evaluation_results, known)
+        return self.finish(evaluation_results, self._merge(known, await self.ajudge(unknown)))
+
+    def refinement_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+        if self.verdicts is not None:
+            lookups = stats["memo_hits"] + stats["memo_misses"]
+            stats["memo_hit_rate"] = stats["memo_hits"] / lookups if lookups > 0 else 0
+            stats["memo_entries"] = len(self.verdicts)
+        return stats
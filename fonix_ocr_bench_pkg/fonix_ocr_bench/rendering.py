@@ -0,0 +1,262 @@
+import hashlib
+import queue
+import threading
+import time
+import fitz  # PyMuPDF
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from .cache import DiskLRUCache, file_digest
+from .logger import logger
+
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+
+@dataclass(frozen=True)
+class RenderOptions:
+    """
+    How PDF pages are rasterized and encoded before being sent to the model.
+
+    Args:
+        scale (float): Zoom factor applied to the page (1.0 = 72 DPI). Ignored if `dpi` is set.
+        dpi (int, optional): Target resolution; overrides `scale`.
+        grayscale (bool): Render a single gray channel instead of RGB.
+        image_format (str): One of "png", "jpeg" or "webp" (webp requires Pillow).
+        quality (int): Encoder quality for jpeg/webp (1-100).
+        binarize_threshold (int, optional): If set, gray levels below the threshold become
+            black and the rest white. Implies grayscale.
+    """
+    scale: float = 2.0  # Scale up for better OCR
+    dpi: Optional[int] = None
+    grayscale: bool = False
+    image_format: str = "png"
+    quality: int = 85
+    binarize_threshold: Optional[int] = None
+
+    def __post_init__(self):
+        if self.image_format not in MIME_TYPES:
+            raise ValueError(f"Unsupported image format: {self.image_format} (expected one of {sorted(MIME_TYPES)})")
+
+    @property
+    def zoom(self) -> float:
+        return self.dpi / 72.0 if self.dpi else self.scale
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.image_format]
+
+    def cache_key_parts(self) -> tuple:
+        colorspace = "gray" if self.grayscale or self.binarize_threshold is not None else "rgb"
+        parts = (f"matrix={self.zoom}x{self.zoom}", f"colorspace={colorspace}", f"format={self.image_format}")
+        if self.image_format != "png":
+            parts += (f"quality={self.quality}",)
+        if self.binarize_threshold is not None:
+            parts += (f"binarize={self.binarize_threshold}",)
+        return parts
+
+
+def rasterize_page(doc: "fitz.Document", page_index: int, options: RenderOptions = RenderOptions()) -> "fitz.Pixmap":
+    """Rasterizes one PDF page to a pixmap according to `options`."""
+    page = doc.load_page(page_index)
+    gray = options.grayscale or options.binarize_threshold is not None
+    colorspace = fitz.csGRAY if gray else fitz.csRGB
+    pix = page.get_pixmap(matrix=fitz.Matrix(options.zoom, options.zoom), colorspace=colorspace, alpha=False)
+    if options.binarize_threshold is not None:
+        threshold = options.binarize_threshold
+        table = bytes(0 if level < threshold else 255 for level in range(256))
+        pix = fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, pix.samples.translate(table), False)
+    return pix
+
+
+def encode_pixmap(pix: "fitz.Pixmap", options: RenderOptions = RenderOptions()) -> bytes:
+    """Encodes a pixmap into the image format selected in `options`."""
+    if options.image_format == "png":
+        return pix.tobytes("png")
+    if options.image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=options.quality)
+    try:
+        return pix.pil_tobytes(format="WEBP", quality=options.quality)
+    except ImportError as e:
+        raise ImportError("WebP encoding requires Pillow. Install it with `pip install pillow`.") from e
+
+
+def render_page(doc: "fitz.Document", page_index: int, options: RenderOptions = RenderOptions()) -> bytes:
+    """Rasterizes one PDF page and encodes it according to `options`."""
+    return encode_pixmap(rasterize_page(doc, page_index, options), options)
+
+
+class PageCache:
+    """
+    Persistent cache of rendered page images.
+
+    Keys are derived from the PDF's content hash, the page index and the
+    render settings, so a page is rasterized once across runs and prompt
+    sweeps. Storage and eviction are handled by `DiskLRUCache`.
+    """
+
+    def __init__(self, cache_dir: str = ".fonix_cache/pages", max_bytes: int = 2 << 30):
+        self.store = DiskLRUCache(cache_dir, max_bytes=max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(pdf_hash: str, page_index: int, options: RenderOptions) -> str:
+        parts = (pdf_hash, f"page={page_index}") + options.cache_key_parts()
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self.store.get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key: str, image_bytes: bytes):
+        self.store.put(key, image_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total > 0 else 0,
+            "entries": len(self.store),
+            "size_bytes": self.store.size_bytes,
+            "max_bytes": self.store.max_bytes,
+        }
+
+
+@dataclass
+class RenderedPage:
+    page_index: int
+    image_bytes: bytes
+    mime_type: str
+    render_time: float
+    encode_time: float = 0.0
+    from_cache: bool = False
+
+
+class PagePrefetcher:
+    """
+    Renders the pages of a PDF on a background thread, up to `prefetch` pages
+    ahead of the consumer, so rasterization overlaps with model calls.
+
+    `render_time` is the total time spent rasterizing and encoding (or reading
+    from `page_cache`); `stall_time` is how long the consumer was blocked
+    waiting for a page. With `prefetch=0` pages are rendered inline in the
+    consumer's thread.
+    """
+
+    _DONE = object()
+
+    def __init__(self,
+                 pdf_path: str,
+                 start_page: int = 0,
+                 prefetch: int = 2,
+                 options: RenderOptions = RenderOptions(),
+                 page_cache: Optional[PageCache] = None):
+        self.pdf_path = pdf_path
+        self.prefetch = prefetch
+        self.options = options
+        self.page_cache = page_cache
+        self.render_time = 0.0
+        self.stall_time = 0.0
+        self._pdf_hash = file_digest(pdf_path) if page_cache is not None else None
+        self._doc = fitz.open(pdf_path)
+        self.page_count = len(self._doc)
+        self._next_page = start_page
+        self._stop = threading.Event()
+        self._thread = None
+        if prefetch > 0:
+            self._queue = queue.Queue(maxsize=prefetch)
+            self._thread = threading.Thread(target=self._produce, name=f"render-{pdf_path}", daemon=True)
+            self._thread.start()
+
+    def _render(self, page_index: int) -> RenderedPage:
+        start_time = time.time()
+        key = None
+        if self.page_cache is not None:
+            key = self.page_cache.key(self._pdf_hash, page_index, self.options)
+            image_bytes = self.page_cache.get(key)
+            if image_bytes is not None:
+                elapsed = time.time() - start_time
+                self.render_time += elapsed
+                return RenderedPage(page_index, image_bytes, self.options.mime_type, elapsed, from_cache=True)
+
+        pix = rasterize_page(self._doc, page_index, self.options)
+        encode_start = time.time()
+        image_bytes = encode_pixmap(pix, self.options)
+        encode_time = time.time() - encode_start
+        if key is not None:
+            self.page_cache.put(key, image_bytes)
+        elapsed = time.time() - start_time
+        self.render_time += elapsed
+        return RenderedPage(page_index, image_bytes, self.options.mime_type, elapsed, encode_time)
+
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self):
+        try:
+            for page_index in range(self._next_page, self.page_count):
+                if not self._put(self._render(page_index)):
+                    return
+            self._put(self._DONE)
+        except Exception as e:
+            logger.error(f"Rendering failed for {self.pdf_path}: {e}")
+            self._put(e)
+
+    def get(self) -> Optional[RenderedPage]:
+        """Returns the next rendered page, or None when the document is exhausted."""
+        if self._thread is None:
+            if self._next_page >= self.page_count:
+                return None
+            start_time = time.time()
+            page = self._render(self._next_page)
+            self.stall_time += time.time() - start_time
+            self._next_page += 1
+            return page
+
+        start_time = time.time()
+        item = self._queue.get()
+        self.stall_time += time.time() - start_time
+        if item is self._DONE:
+            self._queue.put(item)  # Keep returning None on further calls
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def __iter__(self):
+        while True:
+            page = self.get()
+            if page is None:
+                return
+            yield page
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
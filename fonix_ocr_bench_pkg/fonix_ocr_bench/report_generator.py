@@ -2,11 +2,13 @@ import os
 import json
 import datetime
 import pathlib
-from typing import List, Dict, Any
+from typing import Iterable, Dict, Any
 
-def generate_html_report(summary_data: Dict[str, Any], detailed_results: List[Dict[str, Any]], output_dir: pathlib.Path):
+def generate_html_report(summary_data: Dict[str, Any], detailed_results: Iterable[Dict[str, Any]], output_dir: pathlib.Path):
     """
     Generates a professional dashboard HTML report for the benchmark results.
+
+    `detailed_results` is iterated exactly once.
     """
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
@@ -169,12 +171,94 @@ def generate_html_report(summary_data: Dict[str, Any], detailed_results: List[Di
             """
         return rows
 
-    # Prepare data for charts
-    chart_labels = [res.get("pdf_name", "N/A") for res in detailed_results]
-    chart_hallu_data = [res.get("metrics", {}).get("word_level_hallucination_rate", 0) * 100 for res in detailed_results]
-    chart_refined_hallu_data = [res.get("refined_metrics", {}).get("word_level_hallucination_rate", 0) * 100 for res in detailed_results]
-    chart_cost_data = [res.get("cost", 0) for res in detailed_results]
-    chart_time_data = [res.get("recognition_time", 0) for res in detailed_results]
+    # Chart data and sample rows are collected in a single pass, so detailed_results
+    # can be a stream (e.g. a ResultSink read back from disk)
+    chart_labels = []
+    chart_hallu_data = []
+    chart_refined_hallu_data = []
+    chart_cost_data = []
+    chart_time_data = []
+    sample_count = 0
+    rows_html = ""
+
+    for res in detailed_results:
+        metrics = res.get("metrics", {})
+        refined = res.get("refined_metrics", {})
+        pdf_name = res.get("pdf_name", "N/A")
+        sample_count += 1
+
+        chart_labels.append(pdf_name)
+        chart_hallu_data.append(metrics.get("word_level_hallucination_rate", 0) * 100)
+        chart_refined_hallu_data.append(refined.get("word_level_hallucination_rate", 0) * 100)
+        chart_cost_data.append(res.get("cost", 0))
+        chart_time_data.append(res.get("recognition_time", 0))
+        
+        # Prioritize refined rate for status
+        main_rate = refined.get('word_level_hallucination_rate', 0)
+        orig_rate = metrics.get('word_level_hallucination_rate', 0)
+        
+        badge_cls, bar_color = get_status_props(main_rate)
+        
+        # Hallucination details
+        replaced = refined.get("replaced_word_pairs", [])
+        inserted = refined.get("inserted_words", [])
+        
+        hallucination_details = ""
+        if replaced or inserted:
+            hallucination_details = "<details><summary>Review Discrepancies</summary><div class='diff-list'>"
+            if replaced:
+                for pair in replaced:
+                    q = pair.get("question", "")
+                    sub = pair.get("sub_question", "")
+                    label = f"Ref: {q} ({sub})" if sub else f"Ref: {q}"
+                    hallucination_details += f"""
+                    <div class="diff-item">
+                        <div style="font-weight: 600; margin-bottom: 4px;">Word Mismatch</div>
+                        <div class="diff-grid">
+                            <div><div class="diff-label">EXPECTED (GT)</div><div class="diff-val val-gt">{pair.get('gt_words')}</div></div>
+                            <div><div class="diff-label">PREDICTED</div><div class="diff-val val-pred">{pair.get('pred_words')}</div></div>
+                        </div>
+                        <div style="font-size: 0.75rem; color: #64748b; margin-top: 4px;">{label}</div>
+                    </div>"""
+            if inserted:
+                for word in inserted:
+                    hallucination_details += f"""
+                    <div class="diff-item" style="border-left-color: #f59e0b;">
+                        <div style="font-weight: 600; margin-bottom: 4px;">Unexpected Insertion</div>
+                        <div class="diff-val val-pred">{word.get('words')}</div>
+                        <div style="font-size: 0.75rem; color: #64748b; margin-top: 4px;">Ref: {word.get('question')}</div>
+                    </div>"""
+            
+            hallucination_details += "<h4 style='font-size: 0.875rem'>Raw Output</h4><pre><code>" + json.dumps(res.get("prediction"), indent=2) + "</code></pre>"
+            hallucination_details += "</div></details>"
+
+        rows_html += f"""
+        <tr>
+            <td>
+                <div style="font-weight: 600;">{pdf_name}</div>
+                <div style="font-size: 0.75rem; color: #64748b;">Original: {orig_rate*100:.1f}%</div>
+            </td>
+            <td>
+                <div style="display: flex; align-items: center; gap: 0.75rem;">
+                    <span class="badge {badge_cls}">{main_rate*100:.1f}%</span>
+                    <div class="progress-bar-container" style="flex: 1">
+                        <div class="progress-bar" style="width: {min(main_rate*100, 100)}%; background: {bar_color}"></div>
+                    </div>
+                </div>
+                <div style="display: flex; gap: 1rem; margin-top: 0.5rem; font-size: 0.75rem; color: #64748b;">
+                    <span>Fab: {refined.get('fabricated_hallucination_rate', 0)*100:.1f}%</span>
+                    <span>Cross: {refined.get('crossed_out_hallucination_rate', 0)*100:.1f}%</span>
+                    <span>Illeg: {refined.get('illegibility_hallucination_rate', 0)*100:.1f}%</span>
+                </div>
+            </td>
+            <td>
+                <div style="font-weight: 600;">${res.get('cost', 0):.4f}</div>
+                <div style="font-size: 0.75rem; color: #64748b;">{res.get('recognition_time', 0):.2f}s</div>
+            </td>
+            <td>{hallucination_details}</td>
+        </tr>
+        """
+
 
     qtype_summary = summary_data.get('question_type_summary', {})
     refined_qtype_summary = summary_data.get('refined_question_type_summary', {})
@@ -258,7 +342,7 @@ def generate_html_report(summary_data: Dict[str, Any], detailed_results: List[Di
                 <div class="stat-icon green" style="background: #a855f7;">{icons['sample']}</div>
                 <div class="stat-info">
                     <span class="stat-label">Samples Tested</span>
-                    <span class="stat-value">{len(detailed_results)}</span>
+                    <span class="stat-value">{sample_count}</span>
                 </div>
             </div>
         </div>
@@ -335,76 +419,7 @@ def generate_html_report(summary_data: Dict[str, Any], detailed_results: List[Di
                     <tbody>
     """
 
-    for res in detailed_results:
-        metrics = res.get("metrics", {})
-        refined = res.get("refined_metrics", {})
-        pdf_name = res.get("pdf_name", "N/A")
-        
-        # Prioritize refined rate for status
-        main_rate = refined.get('word_level_hallucination_rate', 0)
-        orig_rate = metrics.get('word_level_hallucination_rate', 0)
-        
-        badge_cls, bar_color = get_status_props(main_rate)
-        
-        # Hallucination details
-        replaced = refined.get("replaced_word_pairs", [])
-        inserted = refined.get("inserted_words", [])
-        
-        hallucination_details = ""
-        if replaced or inserted:
-            hallucination_details = "<details><summary>Review Discrepancies</summary><div class='diff-list'>"
-            if replaced:
-                for pair in replaced:
-                    q = pair.get("question", "")
-                    sub = pair.get("sub_question", "")
-                    label = f"Ref: {q} ({sub})" if sub else f"Ref: {q}"
-                    hallucination_details += f"""
-                    <div class="diff-item">
-                        <div style="font-weight: 600; margin-bottom: 4px;">Word Mismatch</div>
-                        <div class="diff-grid">
-                            <div><div class="diff-label">EXPECTED (GT)</div><div class="diff-val val-gt">{pair.get('gt_words')}</div></div>
-                            <div><div class="diff-label">PREDICTED</div><div class="diff-val val-pred">{pair.get('pred_words')}</div></div>
-                        </div>
-                        <div style="font-size: 0.75rem; color: #64748b; margin-top: 4px;">{label}</div>
-                    </div>"""
-            if inserted:
-                for word in inserted:
-                    hallucination_details += f"""
-                    <div class="diff-item" style="border-left-color: #f59e0b;">
-                        <div style="font-weight: 600; margin-bottom: 4px;">Unexpected Insertion</div>
-                        <div class="diff-val val-pred">{word.get('words')}</div>
-                        <div style="font-size: 0.75rem; color: #64748b; margin-top: 4px;">Ref: {word.get('question')}</div>
-                    </div>"""
-            
-            hallucination_details += "<h4 style='font-size: 0.875rem'>Raw Output</h4><pre><code>" + json.dumps(res.get("prediction"), indent=2) + "</code></pre>"
-            hallucination_details += "</div></details>"
-
-        summary_html += f"""
-        <tr>
-            <td>
-                <div style="font-weight: 600;">{pdf_name}</div>
-                <div style="font-size: 0.75rem; color: #64748b;">Original: {orig_rate*100:.1f}%</div>
-            </td>
-            <td>
-                <div style="display: flex; align-items: center; gap: 0.75rem;">
-                    <span class="badge {badge_cls}">{main_rate*100:.1f}%</span>
-                    <div class="progress-bar-container" style="flex: 1">
-                        <div class="progress-bar" style="width: {min(main_rate*100, 100)}%; background: {bar_color}"></div>
-                    </div>
-                </div>
-                <div style="display: flex; gap: 1rem; margin-top: 0.5rem; font-size: 0.75rem; color: #64748b;">
-                    <span>Fab: {refined.get('fabricated_hallucination_rate', 0)*100:.1f}%</span>
-                    <span>Cross: {refined.get('crossed_out_hallucination_rate', 0)*100:.1f}%</span>
-                    <span>Illeg: {refined.get('illegibility_hallucination_rate', 0)*100:.1f}%</span>
-                </div>
-            </td>
-            <td>
-                <div style="font-weight: 600;">${res.get('cost', 0):.4f}</div>
-                <div style="font-size: 0.75rem; color: #64748b;">{res.get('recognition_time', 0):.2f}s</div>
-            </td>
-            <td>{hallucination_details}</td>
-        </tr>
-        """
+    summary_html += rows_html
 
     summary_html += """
                     </tbody>
@@ -443,7 +458,7 @@ def generate_html_report(summary_data: Dict[str, Any], detailed_results: List[Di
                     datasets: [
                         {{
                             label: 'Refined Rate (%)',
-                            data: {json.dumps([res.get("refined_metrics", {}).get("word_level_hallucination_rate", 0) * 100 for res in detailed_results])},
+                            data: {json.dumps(chart_refined_hallu_data)},
                             backgroundColor: '#3b82f6',
                             borderRadius: 6
                         }},
@@ -0,0 +1,233 @@
+import json
+import pathlib
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .logger import logger
+
+QTYPE_FIELDS = ["fabricated", "crossed", "illegible", "gt_words", "hallu_words"]
+
+RATE_FIELDS = {
+    "average_word_level_hallucination_rate": "word_level_hallucination_rate",
+    "average_refined_word_level_hallucination_rate": "refined_word_level_hallucination_rate",
+    "average_fabricated_hallucination_rate": "fabricated_hallucination_rate",
+    "average_crossed_out_hallucination_rate": "crossed_out_hallucination_rate",
+    "average_illegibility_hallucination_rate": "illegibility_hallucination_rate",
+}
+
+
+def summary_entry(result_entry: Dict[str, Any]) -> Dict[str, Any]:
+    """The per-sample line of summary.json, without predictions or diff lists."""
+    eval_metrics = result_entry["metrics"]
+    refined_metrics = result_entry["refined_metrics"]
+    return {
+        "pdf_name": result_entry["pdf_name"],
+        "word_level_hallucination_rate": eval_metrics.get("word_level_hallucination_rate"),
+        "refined_word_level_hallucination_rate": refined_metrics.get("word_level_hallucination_rate"),
+        "fabricated_hallucination_rate": eval_metrics.get("fabricated_hallucination_rate"),
+        "crossed_out_hallucination_rate": eval_metrics.get("crossed_out_hallucination_rate"),
+        "illegibility_hallucination_rate": eval_metrics.get("illegibility_hallucination_rate"),
+        "question_type_metrics": eval_metrics.get("question_type_metrics"),
+        "refined_question_type_metrics": refined_metrics.get("question_type_metrics"),
+        "cost": result_entry["cost"],
+        "recognition_time": result_entry["recognition_time"]
+    }
+
+
+class ResultSink:
+    """
+    Append-only JSONL file of result entries, one line per completed sample.
+
+    Each line is flushed as soon as it is written, so the file always holds
+    every finished sample. Iterating reads the entries back one at a time;
+    a truncated last line from a crash is skipped.
+    """
+
+    def __init__(self, path: str, reset: bool = False):
+        self.path = pathlib.Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.count = 0
+        if reset:
+            self.path.write_text("", encoding='utf-8')
+
+    def append(self, result_entry: Dict[str, Any]):
+        line = json.dumps(result_entry) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+            self.count += 1
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {line_number} of {self.path}")
+
+
+class SummaryAggregator:
+    """
+    Running totals for summary.json, updated one result entry at a time.
+
+    Keeps only counters and the small per-sample summary entries, never the
+    predictions or diff lists.
+
+    Args:
+        question_type_totals (Callable, optional): Sums many samples' question type
+            metrics in one call (e.g. `ColumnarEvaluator.question_type_totals`). If
+            given, the per-type summaries are computed from the per-sample entries
+            when the summary is built, instead of being added up per result.
+    """
+
+    def __init__(self, question_type_totals: Optional[Callable[[Iterable[Optional[Dict[str, Any]]]], Dict[str, Dict[str, Any]]]] = None):
+        self.question_type_totals = question_type_totals
+        self.count = 0
+        self.total_cost = 0.0
+        self.total_saved_cost = 0.0
+        self.total_cached_responses = 0
+        self.total_recognition_time = 0.0
+        self.rate_sums = {key: 0.0 for key in RATE_FIELDS}
+        self.question_type_summary: Dict[str, Dict[str, Any]] = {}
+        self.refined_question_type_summary: Dict[str, Dict[str, Any]] = {}
+        self.total_render_time: Optional[float] = None
+        self.total_render_stall_time = 0.0
+        self.total_delta_tokens_saved = 0
+        self.total_cached_tokens = 0
+        self.results: List[Dict[str, Any]] = []
+
+    @staticmethod
+    def _add_qtypes(summary: Dict[str, Dict[str, Any]], qtype_metrics: Optional[Dict[str, Any]]):
+        for qtype, metrics in (qtype_metrics or {}).items():
+            if qtype not in summary:
+                summary[qtype] = {field: 0 for field in QTYPE_FIELDS}
+            for field in QTYPE_FIELDS:
+                summary[qtype][field] += metrics.get(field, 0)
+
+    def add(self, result_entry: Dict[str, Any]):
+        entry = summary_entry(result_entry)
+        self.results.append(entry)
+        self.count += 1
+        self.total_cost += result_entry["cost"]
+        self.total_saved_cost += result_entry.get("saved_cost", 0.0)
+        self.total_recognition_time += result_entry["recognition_time"]
+        for key, field in RATE_FIELDS.items():
+            self.rate_sums[key] += entry[field]
+        if self.question_type_totals is None:
+            self._add_qtypes(self.question_type_summary, entry["question_type_metrics"])
+            self._add_qtypes(self.refined_question_type_summary, entry["refined_question_type_metrics"])
+
+        if "render_time" in result_entry:
+            self.total_render_time = (self.total_render_time or 0.0) + result_entry["render_time"]
+            self.total_render_stall_time += result_entry.get("render_stall_time", 0)
+        usage = result_entry.get("usage", {})
+        self.total_delta_tokens_saved += usage.get("delta_prompt_tokens_saved", 0) + usage.get("delta_completion_tokens_saved", 0)
+        self.total_cached_tokens += usage.get("cached_tokens", 0)
+        self.total_cached_responses += usage.get("cached_responses", 0)
+
+    @staticmethod
+    def _with_rates(summary: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        rated = {}
+        for qtype, counts in summary.items():
+            metrics = dict(counts)
+            gt_words = metrics["gt_words"]
+            metrics["hallucination_rate"] = metrics["hallu_words"] / gt_words if gt_words > 0 else 0
+            metrics["fabricated_rate"] = metrics["fabricated"] / gt_words if gt_words > 0 else 0
+            metrics["crossed_rate"] = metrics["crossed"] / gt_words if gt_words > 0 else 0
+            metrics["illegible_rate"] = metrics["illegible"] / gt_words if gt_words > 0 else 0
+            rated[qtype] = metrics
+        return rated
+
+    def _question_type_summaries(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        """Per-type counts before and after refinement."""
+        if self.question_type_totals is None:
+            return self.question_type_summary, self.refined_question_type_summary
+        return (self.question_type_totals(entry["question_type_metrics"] for entry in self.results),
+                self.question_type_totals(entry["refined_question_type_metrics"] for entry in self.results))
+
+    def state(self) -> Dict[str, Any]:
+        """The running totals as JSON, so partial aggregates can be written per shard and merged."""
+        question_type_summary, refined_question_type_summary = self._question_type_summaries()
+        return {
+            "count": self.count,
+            "total_cost": self.total_cost,
+            "total_saved_cost": self.total_saved_cost,
+            "total_cached_responses": self.total_cached_responses,
+            "total_recognition_time": self.total_recognition_time,
+            "rate_sums": self.rate_sums,
+            "question_type_summary": question_type_summary,
+            "refined_question_type_summary": refined_question_type_summary,
+            "total_render_time": self.total_render_time,
+            "total_render_stall_time": self.total_render_stall_time,
+            "total_delta_tokens_saved": self.total_delta_tokens_saved,
+            "total_cached_tokens": self.total_cached_tokens,
+            "results": self.results,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "SummaryAggregator":
+        aggregator = cls()
+        for key, value in state.items():
+            setattr(aggregator, key, value)
+        return aggregator
+
+    def merge(self, other: "SummaryAggregator"):
+        """Adds another aggregator's totals to this one."""
+        self.count += other.count
+        self.total_cost += other.total_cost
+        self.total_saved_cost += other.total_saved_cost
+        self.total_cached_responses += other.total_cached_responses
+        self.total_recognition_time += other.total_recognition_time
+        for key in RATE_FIELDS:
+            self.rate_sums[key] += other.rate_sums.get(key, 0.0)
+        if self.question_type_totals is None:
+            # Otherwise the summaries are computed from the merged results
+            other_summaries = other._question_type_summaries()
+            for mine, theirs in zip((self.question_type_summary, self.refined_question_type_summary), other_summaries):
+                self._add_qtypes(mine, theirs)
+        if other.total_render_time is not None:
+            self.total_render_time = (self.total_render_time or 0.0) + other.total_render_time
+            self.total_render_stall_time += other.total_render_stall_time
+        self.total_delta_tokens_saved += other.total_delta_tokens_saved
+        self.total_cached_tokens += other.total_cached_tokens
+        self.results.extend(other.results)
+
+    def summary(self, num_samples: int) -> Dict[str, Any]:
+        """
+        Builds the summary.json payload.
+
+        Args:
+            num_samples (int): Size of the dataset, used for the per-sample cost and time averages.
+        """
+        summary_json = {
+            "total_cost": self.total_cost,
+            "average_cost": self.total_cost / num_samples if num_samples else 0,
+            "total_recognition_time": self.total_recognition_time,
+            "average_recognition_time": self.total_recognition_time / num_samples if num_samples else 0,
+        }
+        for key in RATE_FIELDS:
+            summary_json[key] = self.rate_sums[key] / self.count if self.count else 0
+        question_type_summary, refined_question_type_summary = self._question_type_summaries()
+        summary_json.update({
+            "question_type_summary": self._with_rates(question_type_summary),
+            "refined_question_type_summary": self._with_rates(refined_question_type_summary),
+            # Ordered by name so sharded and single-process runs produce the same file
+            "results": sorted(self.results, key=lambda entry: entry["pdf_name"])
+        })
+        if self.total_render_time is not None:
+            summary_json["total_render_time"] = self.total_render_time
+            summary_json["total_render_stall_time"] = self.total_render_stall_time
+        if self.total_delta_tokens_saved:
+            summary_json["total_delta_tokens_saved"] = self.total_delta_tokens_saved
+        if self.total_cached_tokens:
+            summary_json["total_cached_tokens"] = self.total_cached_tokens
+        if self.total_cached_responses:
+            # Not part of total_cost: these responses came from the local cache
+            summary_json["total_cached_responses"] = self.total_cached_responses
+            summary_json["total_saved_cost"] = self.total_saved_cost
+        return summary_json
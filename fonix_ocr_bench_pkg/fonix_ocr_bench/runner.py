@@ -1,294 +1,1097 @@
+import asyncio
 import json
 import os
 import pathlib
 import datetime
 import time
-import re
-import fitz  # PyMuPDF
+from dataclasses import dataclass, asdict, field
 from typing import Dict, Any, Optional, List, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from contextlib import ExitStack
 from .dataset import BenchmarkDataset
-from .model_interface import ModelInterface
+from .model_interface import ModelInterface, PredictionResult, blocking_executor
 from .evaluation import Evaluator
 from .refinement import Refiner
 from .report_generator import generate_html_report
+from .rendering import MIME_TYPES, PagePrefetcher, PageCache, RenderOptions, RenderedPage
+from .page_merge import merge_page_predictions
+from .batch import BatchRequest, BatchTransport, write_batch_requests
+from .results import ResultSink, SummaryAggregator
+from .sharding import write_aggregate
+from .stages import EvaluationStage, RefinementStage, StageTimer
+from .patching import unanswered_paths, format_path_list, edits_from_patch, apply_patch
+from .json_extract import ExtractedJSON, extract_json
+from .policy import estimate_tokens
 from .logger import logger
 
+@dataclass
+class SampleStats:
+    """Usage, cost and timing accumulated over all model calls for one sample."""
+    prompt_tokens: int = 0
+    candidate_tokens: int = 0
+    thought_tokens: int = 0
+    cost: float = 0.0
+    recognition_time: float = 0.0
+    retries: int = 0
+    wait_time: float = 0.0
+    render_time: float = 0.0
+    render_stall_time: float = 0.0
+    pages: List[Dict[str, Any]] = field(default_factory=list)
+    merge_conflicts: int = 0
+    delta_prompt_tokens_saved: int = 0
+    delta_completion_tokens_saved: int = 0
+    cached_tokens: int = 0
+    cached_responses: int = 0
+    saved_cost: float = 0.0
+    json_repairs: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add(self, prediction_result: PredictionResult, cost: float, elapsed: float):
+        self.recognition_time += elapsed
+        if prediction_result.cached:
+            # Nothing was billed; what the original call cost is reported as saved
+            self.cached_responses += 1
+            self.saved_cost += cost
+            return
+        u = prediction_result.usage
+        self.prompt_tokens += u.prompt_tokens
+        self.candidate_tokens += u.completion_tokens
+        self.thought_tokens += u.thinking_tokens
+        self.cached_tokens += getattr(u, "cached_tokens", 0)
+        self.cost += cost
+        self.retries += prediction_result.retries
+        self.wait_time += prediction_result.wait_time
+
+@dataclass
+class RunOptions:
+    """Per-run settings shared by every sample of a benchmark run."""
+    system_instruction: str
+    prompt_template: str
+    page_by_page: bool
+    page_by_page_prompt_template: Optional[str]
+    structures_dir: pathlib.Path
+    run_dir: pathlib.Path
+    render_prefetch: int = 2
+    render_options: RenderOptions = RenderOptions()
+    page_fanout: bool = False
+    page_merge_tie_break: str = "first"
+    fanout_workers: int = 8
+    page_delta: bool = False
+    page_delta_prompt_template: Optional[str] = None
+    context_cache: bool = False
+
+    def __post_init__(self):
+        if self.page_delta and not self.page_delta_prompt_template:
+            raise ValueError("page_delta requires a page_delta_prompt_template containing {UNANSWERED_PATHS}")
+
 class BenchmarkRunner:
-    def __init__(self, 
-                 dataset: BenchmarkDataset, 
-                 model: ModelInterface, 
-                 output_dir: str = "results"):
+    def __init__(self,
+                 dataset: BenchmarkDataset,
+                 model: ModelInterface,
+                 output_dir: str = "results",
+                 page_cache: Optional[PageCache] = None,
+                 evaluator: Optional[Evaluator] = None,
+                 refiner: Optional[Refiner] = None):
         self.dataset = dataset
         self.model = model
+        self.page_cache = page_cache
         self.output_dir = pathlib.Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        self.evaluator = Evaluator()
-        self.refiner = Refiner(model)
-
-    def _process_sample(self, 
-                        sample: Tuple[str, str, Any], 
-                        system_instruction: str, 
-                        prompt_template: str, 
-                        page_by_page: bool, 
-                        page_by_page_prompt_template: Optional[str],
-                        structures_dir: pathlib.Path,
-                        run_dir: pathlib.Path) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        self.evaluator = evaluator if evaluator is not None else Evaluator()
+        self.refiner = refiner if refiner is not None else Refiner(model)
+
+    def _prepare_run_dir(self, resume_from: Optional[str] = None) -> Tuple[pathlib.Path, pathlib.Path]:
+        if resume_from is not None:
+            run_dir = pathlib.Path(resume_from)
+            if not run_dir.is_dir():
+                raise ValueError(f"Cannot resume: run directory {run_dir} does not exist")
+            logger.info(f"Resuming run in {run_dir}")
+        else:
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            shard = getattr(self.dataset, "shard", None)
+            if shard is not None:
+                # Shards started in the same second must not share a run directory
+                timestamp += f"_shard{shard[0]}of{shard[1]}"
+            run_dir = self.output_dir / timestamp
+            run_dir.mkdir(parents=True, exist_ok=True)
+
+        structures_dir = run_dir / "structures"
+        structures_dir.mkdir(parents=True, exist_ok=True)
+        return run_dir, structures_dir
+
+    def _load_checkpointed_results(self, run_dir: pathlib.Path) -> Tuple[List[Tuple[str, str, Any]], ResultSink, SummaryAggregator]:
+        """
+        Splits the dataset into samples still to process and results already saved in `run_dir`.
+
+        The run's `results.jsonl` sink is rebuilt from the saved per-sample results,
+        which are streamed into it and into the summary aggregator one at a time.
+
+        Returns:
+            Tuple of (pending samples, result sink, summary aggregator).
+        """
+        pending = []
+        sink = ResultSink(run_dir / "results.jsonl", reset=True)
+        # Evaluators with group-by summing (the columnar one) also build the per-type summaries
+        aggregator = SummaryAggregator(getattr(self.evaluator, "question_type_totals", None))
+        for sample in self.dataset:
+            result_path = run_dir / f"{pathlib.Path(sample[0]).stem}_result.json"
+            if not result_path.exists():
+                pending.append(sample)
+                continue
+            try:
+                with open(result_path, "r", encoding='utf-8') as f:
+                    result_entry = json.load(f)
+            except json.JSONDecodeError:
+                logger.warning(f"Ignoring unreadable checkpoint {result_path}")
+                pending.append(sample)
+                continue
+            sink.append(result_entry)
+            aggregator.add(result_entry)
+
+        if sink.count:
+            logger.info(f"Skipping {sink.count} samples with saved results, {len(pending)} remaining")
+        return pending, sink, aggregator
+
+    @staticmethod
+    def _page_checkpoint_path(run_dir: pathlib.Path, pdf_name: str) -> pathlib.Path:
+        return run_dir / "checkpoints" / f"{pathlib.Path(pdf_name).stem}_pages.json"
+
+    def _load_page_checkpoint(self, run_dir: pathlib.Path, pdf_name: str) -> Optional[Tuple[int, str, SampleStats]]:
+        path = self._page_checkpoint_path(run_dir, pdf_name)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            next_page = checkpoint["next_page"]
+            current_json = checkpoint["current_json"]
+            stats = SampleStats(**checkpoint["stats"])
+        except (json.JSONDecodeError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable page checkpoint {path}: {e}")
+            return None
+        logger.info(f"Resuming {pdf_name} at page {next_page + 1}")
+        return next_page, current_json, stats
+
+    def _save_page_checkpoint(self, run_dir: pathlib.Path, pdf_name: str, next_page: int, current_json: str, stats: SampleStats):
+        path = self._page_checkpoint_path(run_dir, pdf_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump({"next_page": next_page, "current_json": current_json, "stats": asdict(stats)}, f)
+        os.replace(tmp_path, path)
+
+    def _prepare_structure(self, json_path: str, gt: Any, pdf_name: str, structures_dir: pathlib.Path) -> str:
+        # Built once per paper and shared between papers with the same layout
+        structure_injected = self.dataset.structure_injected(json_path, gt)
+
+        # Save structure
+        with open(structures_dir / f"{pathlib.Path(pdf_name).stem}_structure.json", "w", encoding='utf-8') as f:
+            f.write(structure_injected)
+        return structure_injected
+
+    @staticmethod
+    def _extract_json(text: str, stats: Optional[SampleStats], label: str) -> ExtractedJSON:
+        """Extracts the JSON of a response, logging and recording in `stats` any repairs it needed."""
+        extracted = extract_json(text)
+        if extracted.repairs:
+            logger.warning(f"Repaired JSON for {label}: {', '.join(extracted.repairs)}")
+            if stats is not None:
+                stats.json_repairs.append({"source": label, "repairs": extracted.repairs})
+        return extracted
+
+    def _parse_prediction(self, text: str, pdf_name: str, stats: Optional[SampleStats] = None) -> Dict[str, Any]:
+        try:
+            return self._extract_json(text, stats, pdf_name).value
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse JSON for {pdf_name}")
+            return {"error": "Failed to parse JSON", "raw": text}
+
+    @staticmethod
+    def _image_kwargs(page: RenderedPage) -> Dict[str, Any]:
+        """
+        The image arguments of a page's model call. `mime_type` is only passed for
+        non-PNG pages, so models written against the older `call` signature without
+        it keep working with the default rendering.
+        """
+        if page.mime_type == MIME_TYPES["png"]:
+            return {"image_bytes": page.image_bytes}
+        return {"image_bytes": page.image_bytes, "mime_type": page.mime_type}
+
+    def _track_page(self, stats: SampleStats, page: RenderedPage, pdf_name: str):
+        payload_bytes = len(page.image_bytes)
+        stats.pages.append({
+            "page": page.page_index + 1,
+            "payload_bytes": payload_bytes,
+            "mime_type": page.mime_type,
+            "render_time": page.render_time,
+            "encode_time": page.encode_time,
+            "from_cache": page.from_cache
+        })
+        logger.debug(f"Page {page.page_index + 1} of {pdf_name}: {payload_bytes} bytes {page.mime_type}, encode {page.encode_time:.3f}s")
+
+    def _track_usage(self, stats: SampleStats, prediction_result: PredictionResult, elapsed: float, label: str):
+        u = prediction_result.usage
+        cost = self.model.calculate_cost(u)
+        stats.add(prediction_result, cost, elapsed)
+        if prediction_result.cached:
+            logger.debug(f"{label} served from the response cache, saved ${cost:.6f}")
+        else:
+            logger.debug(f"{label} cost: ${cost:.6f} (Tokens: P:{u.prompt_tokens}, C:{u.completion_tokens})")
+
+    def _save_result(self,
+                       pdf_name: str,
+                       eval_metrics: Dict[str, Any],
+                       refined_metrics: Dict[str, Any],
+                       stats: SampleStats,
+                       pred_json: Dict[str, Any],
+                       run_dir: pathlib.Path) -> Dict[str, Any]:
+        # Save individual result
+        result_entry = {
+            "pdf_name": pdf_name,
+            "metrics": eval_metrics,
+            "refined_metrics": refined_metrics,
+            "usage": {
+                "prompt_tokens": stats.prompt_tokens,
+                "candidate_tokens": stats.candidate_tokens,
+                "thought_tokens": stats.thought_tokens,
+                "cached_tokens": stats.cached_tokens,
+                "cached_responses": stats.cached_responses,
+                "delta_prompt_tokens_saved": stats.delta_prompt_tokens_saved,
+                "delta_completion_tokens_saved": stats.delta_completion_tokens_saved
+            },
+            "cost": stats.cost,
+            "saved_cost": stats.saved_cost,
+            "recognition_time": stats.recognition_time,
+            "retries": stats.retries,
+            "wait_time": stats.wait_time,
+            "render_time": stats.render_time,
+            "render_stall_time": stats.render_stall_time,
+            "pages": stats.pages,
+            "merge_conflicts": stats.merge_conflicts,
+            "json_repairs": stats.json_repairs,
+            "prediction": pred_json
+        }
+
+        stem = pathlib.Path(pdf_name).stem
+        tmp_path = run_dir / f"{stem}_result.json.tmp"
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(result_entry, f, indent=4)
+        # Atomic so a crash never leaves a half-written result that resume would trust
+        os.replace(tmp_path, run_dir / f"{stem}_result.json")
+
+        # The sample is complete, drop intermediate state from earlier attempts
+        for stale in [self._page_checkpoint_path(run_dir, pdf_name), run_dir / f"{stem}_error.txt"]:
+            if stale.exists():
+                stale.unlink()
+
+        return result_entry
+
+    @staticmethod
+    def _prompt_kwargs(template: str, placeholder: str, value: str, options: RunOptions) -> Dict[str, str]:
+        """
+        Fills `placeholder` in `template`. With context caching, everything up to and
+        including the injected value is passed as `cached_prefix` so the model can serve
+        it from a provider-side cache shared by every paper with the same structure.
+        """
+        if not options.context_cache or placeholder not in template:
+            return {"prompt": template.replace(placeholder, value)}
+        before, after = template.split(placeholder, 1)
+        return {"prompt": after.replace(placeholder, value), "cached_prefix": before + value}
+
+    def _page_prompt(self, current_json: str, options: RunOptions) -> Optional[str]:
+        """
+        Builds the prompt for the next page of a sequential page-by-page run.
+
+        In delta mode only the still-unanswered paths are sent; returns None
+        when every field is already answered and the page can be skipped.
+        """
+        if not options.page_delta:
+            return options.page_by_page_prompt_template.replace("{PREVIOUS_JSON}", current_json)
+        paths = unanswered_paths(json.loads(current_json))
+        if not paths:
+            return None
+        return options.page_delta_prompt_template.replace("{UNANSWERED_PATHS}", format_path_list(paths))
+
+    def _update_page_state(self, current_json: str, prompt: str, prediction_result: PredictionResult,
+                           options: RunOptions, stats: SampleStats, pdf_name: str, page_index: int) -> str:
+        """
+        Returns the accumulated JSON after a page; in delta mode the model's patch is applied locally.
+        A page whose JSON cannot be recovered leaves the state of the previous pages as it was.
+        """
+        label = f"page {page_index + 1} of {pdf_name}"
+        if not options.page_delta:
+            try:
+                return self._extract_json(prediction_result.text, stats, label).text
+            except json.JSONDecodeError as e:
+                logger.warning(f"Failed to parse JSON for {label}, keeping the answers of the previous pages: {e}")
+                return current_json
+
+        current = json.loads(current_json)
+        try:
+            applied = apply_patch(current, edits_from_patch(self._extract_json(prediction_result.text, stats, label).value))
+        except (json.JSONDecodeError, ValueError) as e:
+            logger.warning(f"Failed to parse patch for page {page_index + 1} of {pdf_name}: {e}")
+            applied = 0
+        updated_json = json.dumps(current, indent=4)
+
+        # Savings are estimated against the full-JSON round trip this page would have cost
+        full_prompt = current_json
+        if options.page_by_page_prompt_template:
+            full_prompt = options.page_by_page_prompt_template.replace("{PREVIOUS_JSON}", current_json)
+        prompt_saved = estimate_tokens(full_prompt) - estimate_tokens(prompt)
+        completion_saved = estimate_tokens(updated_json) - estimate_tokens(prediction_result.text)
+        stats.delta_prompt_tokens_saved += prompt_saved
+        stats.delta_completion_tokens_saved += completion_saved
+        if stats.pages:
+            stats.pages[-1].update({"patch_edits": applied, "tokens_saved": prompt_saved + completion_saved})
+        return updated_json
+
+    def _parse_page_prediction(self, text: str, pdf_name: str, page_index: int, stats: Optional[SampleStats] = None) -> Any:
+        try:
+            return self._extract_json(text, stats, f"page {page_index + 1} of {pdf_name}").value
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse JSON for page {page_index + 1} of {pdf_name}, leaving it out of the merge")
+            return {}
+
+    def _merge_pages(self, structure_injected: str, page_predictions: Dict[int, Any], options: RunOptions, stats: SampleStats) -> Dict[str, Any]:
+        ordered = [page_predictions[i] for i in sorted(page_predictions)]
+        pred_json, conflicts = merge_page_predictions(json.loads(structure_injected), ordered, options.page_merge_tie_break)
+        stats.merge_conflicts = conflicts
+        return pred_json
+
+    def _recognize_fanout(self, pdf_path: str, json_path: str, pdf_name: str, gt: Any, options: RunOptions, stats: SampleStats) -> Dict[str, Any]:
+        """Sends every page in parallel against the empty structure and merges the per-page JSONs."""
+        structure_injected = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+        prompt_kwargs = self._prompt_kwargs(options.page_by_page_prompt_template, "{PREVIOUS_JSON}", structure_injected, options)
+        page_predictions = {}
+
+        start_time = time.time()
+        with PagePrefetcher(pdf_path, 0, options.render_prefetch, options.render_options, self.page_cache) as pages, \
+                ThreadPoolExecutor(max_workers=options.fanout_workers) as executor:
+            futures = {}
+            for page in pages:
+                self._track_page(stats, page, pdf_name)
+                future = executor.submit(
+                    self.model.call,
+                    **prompt_kwargs,
+                    system_instruction=options.system_instruction,
+                    **self._image_kwargs(page)
+                )
+                futures[future] = page.page_index
+
+            for future in as_completed(futures):
+                page_index = futures[future]
+                prediction_result = future.result()
+                # Latency is the wall time of the whole fan-out, added below
+                self._track_usage(stats, prediction_result, 0.0, f"Page {page_index + 1}")
+                page_predictions[page_index] = self._parse_page_prediction(prediction_result.text, pdf_name, page_index, stats)
+            stats.render_time += pages.render_time
+            stats.render_stall_time += pages.stall_time
+        stats.recognition_time += time.time() - start_time
+
+        return self._merge_pages(structure_injected, page_predictions, options, stats)
+
+    async def _arecognize_fanout(self, pdf_path: str, json_path: str, pdf_name: str, gt: Any, options: RunOptions, stats: SampleStats,
+                                 semaphore: asyncio.Semaphore, executor: ThreadPoolExecutor) -> Dict[str, Any]:
+        """Async counterpart of `_recognize_fanout`."""
+        loop = asyncio.get_running_loop()
+        structure_injected = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+        prompt_kwargs = self._prompt_kwargs(options.page_by_page_prompt_template, "{PREVIOUS_JSON}", structure_injected, options)
+
+        async def call_page(page: RenderedPage) -> PredictionResult:
+            async with semaphore:
+                return await self.model.acall(
+                    **prompt_kwargs,
+                    system_instruction=options.system_instruction,
+                    **self._image_kwargs(page)
+                )
+
+        start_time = time.time()
+        pages = PagePrefetcher(pdf_path, 0, options.render_prefetch, options.render_options, self.page_cache)
+        try:
+            tasks = {}
+            while True:
+                page = await loop.run_in_executor(executor, pages.get)
+                if page is None:
+                    break
+                self._track_page(stats, page, pdf_name)
+                tasks[page.page_index] = asyncio.ensure_future(call_page(page))
+            results = await asyncio.gather(*tasks.values())
+            stats.render_time += pages.render_time
+            stats.render_stall_time += pages.stall_time
+        finally:
+            await loop.run_in_executor(executor, pages.close)
+        stats.recognition_time += time.time() - start_time
+
+        page_predictions = {}
+        for page_index, prediction_result in zip(tasks, results):
+            self._track_usage(stats, prediction_result, 0.0, f"Page {page_index + 1}")
+            page_predictions[page_index] = self._parse_page_prediction(prediction_result.text, pdf_name, page_index, stats)
+        return self._merge_pages(structure_injected, page_predictions, options, stats)
+
+    def _write_error(self, pdf_name: str, error: Exception, run_dir: pathlib.Path):
+        logger.error(f"Error processing {pdf_name}: {error}")
+        with open(run_dir / f"{pathlib.Path(pdf_name).stem}_error.txt", "w", encoding='utf-8') as f:
+            f.write(str(error))
+
+    def _process_sample(self,
+                        sample: Tuple[str, str, Any],
+                        options: RunOptions) -> Optional[Dict[str, Any]]:
+        recognized = self._recognize_sample(sample, options)
+        if recognized is None:
+            return None
+        pdf_name, gt, pred_json, stats = recognized
+        try:
+            return self._evaluate_and_save(pdf_name, gt, pred_json, stats, options.run_dir)
+        except Exception as e:
+            self._write_error(pdf_name, e, options.run_dir)
+            return None
+
+    def _recognize_sample(self,
+                          sample: Tuple[str, str, Any],
+                          options: RunOptions) -> Optional[Tuple[str, Any, Dict[str, Any], SampleStats]]:
+        """
+        Runs the model on one sample.
+
+        Returns:
+            (pdf_name, compiled ground truth, prediction, stats), or None if the sample failed.
+        """
         pdf_path, json_path, gt = sample
         pdf_name = pathlib.Path(pdf_path).name
-        sample_prompt_tokens = 0
-        sample_candidate_tokens = 0
-        sample_thought_tokens = 0
-        sample_cost = 0.0
-        sample_recognition_time = 0.0
-        
-        logger.info(f"Processing {pdf_name} (Page-by-Page: {page_by_page})...")
-        
+        run_dir = options.run_dir
+        stats = SampleStats()
+
+        logger.info(f"Processing {pdf_name} (Page-by-Page: {options.page_by_page})...")
+
         try:
-            if page_by_page:
+            if options.page_by_page and options.page_fanout:
+                pred_json = self._recognize_fanout(pdf_path, json_path, pdf_name, gt, options, stats)
+            elif options.page_by_page:
                 # Page-by-Page Prediction
-                doc = fitz.open(pdf_path)
-                structure_injected = self.dataset.create_structure_injected(gt)
-                current_json = structure_injected
-                
-                # Save structure
-                with open(structures_dir / f"{pathlib.Path(pdf_name).stem}_structure.json", "w", encoding='utf-8') as f:
-                    f.write(structure_injected)
-                
-                for page_index in range(len(doc)):
-                    logger.info(f"Processing page {page_index + 1}/{len(doc)} of {pdf_name}...")
-                    
-                    # Render page to image bytes
-                    page = doc.load_page(page_index)
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Scale up for better OCR
-                    image_bytes = pix.tobytes("png")
-                    
-                    prompt = page_by_page_prompt_template.replace("{PREVIOUS_JSON}", current_json)
-                    
-                    start_time = time.time()
-                    prediction_result = self.model.call(
-                        prompt=prompt,
-                        system_instruction=system_instruction,
-                        image_bytes=image_bytes
-                    )
-                    sample_recognition_time += time.time() - start_time
-                    
-                    # Parse and update current_json
-                    match = re.search(r'```json\s*(.*?)\s*```', prediction_result.text, re.DOTALL)
-                    if match:
-                        json_text = match.group(1)
-                        current_json = json_text 
-                    else:
-                        current_json = prediction_result.text
-
-                    # Track usage
-                    u = prediction_result.usage
-                    sample_prompt_tokens += u.prompt_tokens
-                    sample_candidate_tokens += u.completion_tokens
-                    sample_thought_tokens += u.thinking_tokens
-                    
-                    cost = self.model.calculate_cost(u)
-                    sample_cost += cost
-                    logger.debug(f"Page {page_index + 1} cost: ${cost:.6f} (Tokens: P:{u.prompt_tokens}, C:{u.completion_tokens})")
-                
-                doc.close()
+                current_json = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+                start_page = 0
+                checkpoint = self._load_page_checkpoint(run_dir, pdf_name)
+                if checkpoint:
+                    start_page, current_json, stats = checkpoint
+
+                # Pages are rendered ahead on a background thread while the model works
+                with PagePrefetcher(pdf_path, start_page, options.render_prefetch, options.render_options, self.page_cache) as pages:
+                    for page in pages:
+                        page_index = page.page_index
+                        logger.info(f"Processing page {page_index + 1}/{pages.page_count} of {pdf_name}...")
+                        self._track_page(stats, page, pdf_name)
+
+                        prompt = self._page_prompt(current_json, options)
+                        if prompt is None:
+                            logger.info(f"All fields of {pdf_name} answered, skipping page {page_index + 1}")
+                            self._save_page_checkpoint(run_dir, pdf_name, page_index + 1, current_json, stats)
+                            continue
+
+                        start_time = time.time()
+                        prediction_result = self.model.call(
+                            prompt=prompt,
+                            system_instruction=options.system_instruction,
+                            **self._image_kwargs(page)
+                        )
+                        elapsed = time.time() - start_time
+
+                        # Parse and update current_json
+                        current_json = self._update_page_state(current_json, prompt, prediction_result, options, stats, pdf_name, page_index)
+
+                        # Track usage
+                        self._track_usage(stats, prediction_result, elapsed, f"Page {page_index + 1}")
+                        self._save_page_checkpoint(run_dir, pdf_name, page_index + 1, current_json, stats)
+                    stats.render_time += pages.render_time
+                    stats.render_stall_time += pages.stall_time
+
                 pred_json = json.loads(current_json)
             else:
                 # Full Paper Prediction (Original Logic)
                 logger.info(f"Injecting JSON structure for {pdf_name} without values...")
-                structure_injected = self.dataset.create_structure_injected(gt)
-                
-                # Save structure
-                with open(structures_dir / f"{pathlib.Path(pdf_name).stem}_structure.json", "w", encoding='utf-8') as f:
-                    f.write(structure_injected)
-
-                prompt = prompt_template.replace("{STRUCTURE_INJECTED}", structure_injected)
-                
+                structure_injected = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+                prompt_kwargs = self._prompt_kwargs(options.prompt_template, "{STRUCTURE_INJECTED}", structure_injected, options)
+
                 logger.info(f"Recognizing text using model...")
                 start_time = time.time()
                 prediction_result = self.model.call(
-                    prompt=prompt,
-                    system_instruction=system_instruction,
+                    **prompt_kwargs,
+                    system_instruction=options.system_instruction,
                     image_path=pdf_path
                 )
-                sample_recognition_time = time.time() - start_time
-                
+                elapsed = time.time() - start_time
+
                 # Parse Prediction
-                match = re.search(r'```json\s*(.*?)\s*```', prediction_result.text, re.DOTALL)
-                if match:
-                    json_text = match.group(1)
-                    pred_json = json.loads(json_text)
-                else:
-                    try:
-                        pred_json = json.loads(prediction_result.text)
-                    except:
-                        logger.warning(f"Failed to parse JSON for {pdf_name}")
-                        pred_json = {"error": "Failed to parse JSON", "raw": prediction_result.text}
-                
-                u = prediction_result.usage
-                sample_prompt_tokens = u.prompt_tokens
-                sample_candidate_tokens = u.completion_tokens
-                sample_thought_tokens = u.thinking_tokens
-                sample_cost = self.model.calculate_cost(u)
-                logger.debug(f"Sample cost: ${sample_cost:.6f} (Tokens: P:{u.prompt_tokens}, C:{u.completion_tokens})")
-            
-            # Evaluation
+                pred_json = self._parse_prediction(prediction_result.text, pdf_name, stats)
+                self._track_usage(stats, prediction_result, elapsed, "Sample")
+
+            return pdf_name, self.dataset.compiled_ground_truth(json_path, gt), pred_json, stats
+
+        except Exception as e:
+            self._write_error(pdf_name, e, run_dir)
+            return None
+
+    def _evaluate_and_save(self, pdf_name: str, gt: Any, pred_json: Dict[str, Any], stats: SampleStats,
+                           run_dir: pathlib.Path) -> Dict[str, Any]:
+        # Evaluation
+        logger.info(f"Evaluating results against ground truth for {pdf_name}...")
+        eval_metrics = self.evaluator.calculate_hallucinations(gt, pred_json)
+
+        # Refinement
+        logger.info(f"Refining results with LLM for {pdf_name}...")
+        refined_metrics = self.refiner.refine(eval_metrics)
+
+        return self._save_result(pdf_name, eval_metrics, refined_metrics, stats, pred_json, run_dir)
+
+    async def _aprocess_sample(self,
+                               sample: Tuple[str, str, Any],
+                               options: RunOptions,
+                               semaphore: asyncio.Semaphore,
+                               executor: ThreadPoolExecutor,
+                               evaluation: Optional[EvaluationStage] = None,
+                               refinement: Optional[RefinementStage] = None) -> Optional[Dict[str, Any]]:
+        """Async counterpart of `_process_sample`; model calls are bounded by `semaphore`, blocking work runs on `executor`."""
+        pdf_path, json_path, gt = sample
+        pdf_name = pathlib.Path(pdf_path).name
+        run_dir = options.run_dir
+        stats = SampleStats()
+        loop = asyncio.get_running_loop()
+
+        logger.info(f"Processing {pdf_name} (Page-by-Page: {options.page_by_page})...")
+
+        try:
+            if options.page_by_page and options.page_fanout:
+                pred_json = await self._arecognize_fanout(pdf_path, json_path, pdf_name, gt, options, stats, semaphore, executor)
+            elif options.page_by_page:
+                current_json = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+                start_page = 0
+                checkpoint = self._load_page_checkpoint(run_dir, pdf_name)
+                if checkpoint:
+                    start_page, current_json, stats = checkpoint
+
+                pages = PagePrefetcher(pdf_path, start_page, options.render_prefetch, options.render_options, self.page_cache)
+                try:
+                    while True:
+                        # Waiting on the render queue blocks, keep it off the event loop
+                        page = await loop.run_in_executor(executor, pages.get)
+                        if page is None:
+                            break
+                        page_index = page.page_index
+                        self._track_page(stats, page, pdf_name)
+                        prompt = self._page_prompt(current_json, options)
+                        if prompt is None:
+                            logger.info(f"All fields of {pdf_name} answered, skipping page {page_index + 1}")
+                            self._save_page_checkpoint(run_dir, pdf_name, page_index + 1, current_json, stats)
+                            continue
+
+                        async with semaphore:
+                            start_time = time.time()
+                            prediction_result = await self.model.acall(
+                                prompt=prompt,
+                                system_instruction=options.system_instruction,
+                                **self._image_kwargs(page)
+                            )
+                            elapsed = time.time() - start_time
+
+                        current_json = self._update_page_state(current_json, prompt, prediction_result, options, stats, pdf_name, page_index)
+                        self._track_usage(stats, prediction_result, elapsed, f"Page {page_index + 1}")
+                        self._save_page_checkpoint(run_dir, pdf_name, page_index + 1, current_json, stats)
+                    stats.render_time += pages.render_time
+                    stats.render_stall_time += pages.stall_time
+                finally:
+                    await loop.run_in_executor(executor, pages.close)
+
+                pred_json = json.loads(current_json)
+            else:
+                structure_injected = self._prepare_structure(json_path, gt, pdf_name, options.structures_dir)
+                prompt_kwargs = self._prompt_kwargs(options.prompt_template, "{STRUCTURE_INJECTED}", structure_injected, options)
+
+                async with semaphore:
+                    start_time = time.time()
+                    prediction_result = await self.model.acall(
+                        **prompt_kwargs,
+                        system_instruction=options.system_instruction,
+                        image_path=pdf_path
+                    )
+                    elapsed = time.time() - start_time
+
+                pred_json = self._parse_prediction(prediction_result.text, pdf_name, stats)
+                self._track_usage(stats, prediction_result, elapsed, "Sample")
+
             logger.info(f"Evaluating results against ground truth for {pdf_name}...")
-            eval_metrics = self.evaluator.calculate_hallucinations(gt, pred_json)
-            
-            # Refinement
+            evaluate = evaluation.evaluate if evaluation is not None else self.evaluator.calculate_hallucinations
+            compiled_gt = self.dataset.compiled_ground_truth(json_path, gt)
+            eval_metrics = await loop.run_in_executor(executor, evaluate, compiled_gt, pred_json)
+
             logger.info(f"Refining results with LLM for {pdf_name}...")
-            refined_metrics = self.refiner.refine(eval_metrics)
-            
-            # Save individual result
-            result_entry = {
-                "pdf_name": pdf_name,
-                "metrics": eval_metrics,
-                "refined_metrics": refined_metrics,
-                "usage": {
-                    "prompt_tokens": sample_prompt_tokens,
-                    "candidate_tokens": sample_candidate_tokens,
-                    "thought_tokens": sample_thought_tokens
-                },
-                "cost": sample_cost,
-                "recognition_time": sample_recognition_time,
-                "prediction": pred_json
-            }
-            
-            with open(run_dir / f"{pathlib.Path(pdf_name).stem}_result.json", "w", encoding='utf-8') as f:
-                json.dump(result_entry, f, indent=4)
-            
-            summary_entry = {
-                "pdf_name": pdf_name,
-                "word_level_hallucination_rate": eval_metrics.get("word_level_hallucination_rate"),
-                "refined_word_level_hallucination_rate": refined_metrics.get("word_level_hallucination_rate"),
-                "fabricated_hallucination_rate": eval_metrics.get("fabricated_hallucination_rate"),
-                "crossed_out_hallucination_rate": eval_metrics.get("crossed_out_hallucination_rate"),
-                "illegibility_hallucination_rate": eval_metrics.get("illegibility_hallucination_rate"),
-                "question_type_metrics": eval_metrics.get("question_type_metrics"),
-                "refined_question_type_metrics": refined_metrics.get("question_type_metrics"),
-                "cost": sample_cost,
-                "recognition_time": sample_recognition_time
-            }
-            
-            return result_entry, summary_entry
+            if refinement is not None:
+                # Waits without a request slot, so recognition of other papers goes on
+                refined_metrics = await asyncio.wrap_future(refinement.submit(eval_metrics))
+            else:
+                async with semaphore:
+                    refined_metrics = await self.refiner.arefine(eval_metrics)
+
+            return self._save_result(pdf_name, eval_metrics, refined_metrics, stats, pred_json, run_dir)
 
         except Exception as e:
-            logger.error(f"Error processing {pdf_name}: {e}")
-            with open(run_dir / f"{pathlib.Path(pdf_name).stem}_error.txt", "w", encoding='utf-8') as f:
-                f.write(str(e))
+            self._write_error(pdf_name, e, run_dir)
             return None
 
-    def run(self, 
-            system_instruction: str, 
-            prompt_template: str, 
-            page_by_page: bool = False, 
+    def _finalize_run(self,
+                      run_dir: pathlib.Path,
+                      sink: ResultSink,
+                      aggregator: SummaryAggregator,
+                      stages: Optional[Dict[str, Any]] = None):
+        # Save Summary
+        logger.info(f"Saving summary to {run_dir}/summary.json")
+        summary_json = aggregator.summary(len(self.dataset))
+        extras = {}
+        cache_stats = getattr(self.model, "cache_stats", None)
+        if callable(cache_stats):
+            extras["response_cache"] = cache_stats()
+        if self.page_cache is not None:
+            extras["page_cache"] = self.page_cache.stats()
+        context_cache_stats = getattr(self.model, "context_cache_stats", None)
+        if callable(context_cache_stats) and context_cache_stats() is not None:
+            extras["context_cache"] = context_cache_stats()
+        file_stats = getattr(self.model, "file_stats", None)
+        if callable(file_stats) and file_stats() is not None:
+            extras["file_references"] = file_stats()
+        policy_stats = getattr(self.model, "policy_stats", None)
+        if callable(policy_stats):
+            extras["resilience"] = policy_stats()
+        extras["refinement"] = self.refiner.refinement_stats()
+        summary_json.update(extras)
+        if stages:
+            # Utilization is specific to one process, so it is not part of the mergeable extras
+            summary_json["stages"] = stages
+            for name, stage_stats in stages.items():
+                logger.info(f"Stage {name}: {stage_stats['tasks']} tasks, {stage_stats['utilization']:.0%} utilization")
+        with open(run_dir / "summary.json", "w", encoding='utf-8') as f:
+            json.dump(summary_json, f, indent=4)
+        write_aggregate(run_dir, aggregator, len(self.dataset), extras, shard=getattr(self.dataset, "shard", None))
+
+        # Generate HTML Report in one pass over the sink
+        logger.info(f"Generating HTML report...")
+        report_path = generate_html_report(summary_json, sink, run_dir)
+        logger.info(f"HTML report saved to {report_path}")
+
+        logger.info(f"Benchmark completed. Results saved to {run_dir}")
+        logger.info(f"Total Cost: ${summary_json['total_cost']:.4f}")
+
+    def run(self,
+            system_instruction: str,
+            prompt_template: str,
+            page_by_page: bool = False,
             page_by_page_prompt_template: Optional[str] = None,
-            max_workers: int = 4):
+            max_workers: int = 4,
+            resume_from: Optional[str] = None,
+            render_prefetch: int = 2,
+            render_options: Optional[RenderOptions] = None,
+            page_fanout: bool = False,
+            page_merge_tie_break: str = "first",
+            fanout_workers: int = 8,
+            page_delta: bool = False,
+            page_delta_prompt_template: Optional[str] = None,
+            context_cache: bool = False,
+            eval_workers: int = 0,
+            eval_queue_size: Optional[int] = None,
+            refine_batch_items: int = 0,
+            refine_concurrency: int = 2):
         """
         Runs the benchmark.
-        
+
         Args:
             system_instruction (str): The system instruction for the model.
             prompt_template (str): The prompt template containing {STRUCTURE_INJECTED}.
             page_by_page (bool): Whether to process the PDF page by page.
             page_by_page_prompt_template (str): The prompt template for page-by-page processing.
             max_workers (int): Maximum number of concurrent workers.
+            resume_from (str, optional): Existing run directory to continue. Samples with a
+                saved `_result.json` are skipped and page-by-page samples restart at their
+                last checkpointed page; the summary and report cover all results.
+            render_prefetch (int): In page-by-page mode, how many pages to render ahead of
+                the model on a background thread (0 renders inline).
+            render_options (RenderOptions, optional): Page scale/DPI, grayscale, image format,
+                quality and binarization for page-by-page mode. Defaults to 2x RGB PNG.
+            page_fanout (bool): With page_by_page, send all pages in parallel against the empty
+                structure and merge the per-page JSONs instead of chaining {PREVIOUS_JSON}.
+            page_merge_tie_break (str): Tie-break for the fan-out merge when pages give different
+                answers of equal legibility: "first", "last", "longest" or "concat".
+            fanout_workers (int): Maximum concurrent page calls per sample in fan-out mode.
+            page_delta (bool): With sequential page_by_page, send only the still-unanswered
+                paths and apply the returned patch locally instead of round-tripping the
+                full JSON. Estimated savings are reported in each result's usage block.
+            page_delta_prompt_template (str, optional): Prompt for delta mode, containing
+                {UNANSWERED_PATHS}.
+            context_cache (bool): Pass the prompt up to and including the injected structure
+                as `cached_prefix`, for models that serve it from a provider-side context
+                cache (e.g. Gemini3Model with a ContextCacheManager). The model must accept
+                the `cached_prefix` keyword.
+            eval_workers (int): Evaluate on a process pool of this many workers (None for the
+                CPU count), pipelined with recognition and refinement on the worker threads.
+                0 evaluates on the recognition thread. Stage utilization is written to the
+                summary under `stages`.
+            eval_queue_size (int, optional): Maximum evaluations queued or running before
+                recognition waits (default: 2 per evaluation worker).
+            refine_batch_items (int): Refine in a separate stage that sends the error items
+                of many samples together, up to this many per request. The worker threads
+                hand samples over and move on to the next paper. 0 refines each sample
+                on its worker thread.
+            refine_concurrency (int): Maximum refinement requests in flight with
+                `refine_batch_items`.
         """
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        run_dir = self.output_dir / timestamp
-        run_dir.mkdir(parents=True, exist_ok=True)
-        
-        structures_dir = run_dir / "structures"
-        structures_dir.mkdir(parents=True, exist_ok=True)
-        
-        summary_results = []
-        detailed_results = []
-        total_benchmark_cost = 0.0
-        total_recognition_time = 0.0
+        run_dir, structures_dir = self._prepare_run_dir(resume_from)
+        pending, sink, aggregator = self._load_checkpointed_results(run_dir)
+        options = RunOptions(
+            system_instruction=system_instruction,
+            prompt_template=prompt_template,
+            page_by_page=page_by_page,
+            page_by_page_prompt_template=page_by_page_prompt_template,
+            structures_dir=structures_dir,
+            run_dir=run_dir,
+            render_prefetch=render_prefetch,
+            render_options=render_options or RenderOptions(),
+            page_fanout=page_fanout,
+            page_merge_tie_break=page_merge_tie_break,
+            fanout_workers=fanout_workers,
+            page_delta=page_delta,
+            page_delta_prompt_template=page_delta_prompt_template,
+            context_cache=context_cache
+        )
 
         logger.info(f"Starting concurrent benchmark with {max_workers} workers...")
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [
-                executor.submit(
-                    self._process_sample, 
-                    sample, 
-                    system_instruction, 
-                    prompt_template, 
-                    page_by_page, 
-                    page_by_page_prompt_template, 
-                    structures_dir, 
-                    run_dir
-                ) for sample in self.dataset.samples
-            ]
-            
-            for future in as_completed(futures):
-                result = future.result()
-                if result:
-                    result_entry, summary_entry = result
-                    detailed_results.append(result_entry)
-                    summary_results.append(summary_entry)
-                    total_benchmark_cost += result_entry["cost"]
-                    total_recognition_time += result_entry["recognition_time"]
-
-        # Aggregate question type metrics
-        question_type_summary = {}
-        refined_question_type_summary = {}
-        
-        for result in summary_results:
-            # Original
-            qtype_metrics = result.get("question_type_metrics", {})
-            for qtype, metrics in qtype_metrics.items():
-                if qtype not in question_type_summary:
-                    question_type_summary[qtype] = {
-                        "fabricated": 0, "crossed": 0, "illegible": 0, "gt_words": 0, "hallu_words": 0
-                    }
-                for field in ["fabricated", "crossed", "illegible", "gt_words", "hallu_words"]:
-                    question_type_summary[qtype][field] += metrics.get(field, 0)
-            
-            # Refined
-            ref_qtype_metrics = result.get("refined_question_type_metrics", {})
-            for qtype, metrics in ref_qtype_metrics.items():
-                if qtype not in refined_question_type_summary:
-                    refined_question_type_summary[qtype] = {
-                        "fabricated": 0, "crossed": 0, "illegible": 0, "gt_words": 0, "hallu_words": 0
-                    }
-                for field in ["fabricated", "crossed", "illegible", "gt_words", "hallu_words"]:
-                    refined_question_type_summary[qtype][field] += metrics.get(field, 0)
-        
-        # Calculate rates for each summary
-        for summary in [question_type_summary, refined_question_type_summary]:
-            for qtype, metrics in summary.items():
-                gt_words = metrics["gt_words"]
-                metrics["hallucination_rate"] = metrics["hallu_words"] / gt_words if gt_words > 0 else 0
-                metrics["fabricated_rate"] = metrics["fabricated"] / gt_words if gt_words > 0 else 0
-                metrics["crossed_rate"] = metrics["crossed"] / gt_words if gt_words > 0 else 0
-                metrics["illegible_rate"] = metrics["illegible"] / gt_words if gt_words > 0 else 0
 
-        # Save Summary
-        logger.info(f"Saving summary to {run_dir}/summary.json")
-        summary_json = {
-            "total_cost": total_benchmark_cost,
-            "average_cost": total_benchmark_cost / len(self.dataset.samples) if self.dataset.samples else 0,
-            "total_recognition_time": total_recognition_time,
-            "average_recognition_time": total_recognition_time / len(self.dataset.samples) if self.dataset.samples else 0,
-            "average_word_level_hallucination_rate": sum(r["word_level_hallucination_rate"] for r in summary_results) / len(summary_results) if summary_results else 0,
-            "average_refined_word_level_hallucination_rate": sum(r["refined_word_level_hallucination_rate"] for r in summary_results) / len(summary_results) if summary_results else 0,
-            "average_fabricated_hallucination_rate": sum(r["fabricated_hallucination_rate"] for r in summary_results) / len(summary_results) if summary_results else 0,
-            "average_crossed_out_hallucination_rate": sum(r["crossed_out_hallucination_rate"] for r in summary_results) / len(summary_results) if summary_results else 0,
-            "average_illegibility_hallucination_rate": sum(r["illegibility_hallucination_rate"] for r in summary_results) / len(summary_results) if summary_results else 0,
-            "question_type_summary": question_type_summary,
-            "refined_question_type_summary": refined_question_type_summary,
-            "results": summary_results
-        }
-        with open(run_dir / "summary.json", "w", encoding='utf-8') as f:
-            json.dump(summary_json, f, indent=4)
-            
-        # Generate HTML Report
-        logger.info(f"Generating HTML report...")
-        report_path = generate_html_report(summary_json, detailed_results, run_dir)
-        logger.info(f"HTML report saved to {report_path}")
-            
-        logger.info(f"Benchmark completed. Results saved to {run_dir}")
-        logger.info(f"Total Cost: ${total_benchmark_cost:.4f}")
+        stages = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, ExitStack() as stack:
+            evaluation = None
+            refinement = None
+            if eval_workers != 0:
+                evaluation = stack.enter_context(EvaluationStage(self.evaluator, eval_workers, eval_queue_size))
+            if refine_batch_items:
+                refinement = stack.enter_context(RefinementStage(self.refiner, refine_batch_items, refine_concurrency))
+
+            if evaluation is None and refinement is None:
+                futures = [executor.submit(self._process_sample, sample, options) for sample in pending]
+
+                for future in as_completed(futures):
+                    result_entry = future.result()
+                    if result_entry:
+                        sink.append(result_entry)
+                        aggregator.add(result_entry)
+            else:
+                stages = self._run_pipeline(executor, max_workers, evaluation, refinement, pending, options, sink, aggregator)
+
+        self._finalize_run(run_dir, sink, aggregator, stages)
+
+    def _run_pipeline(self,
+                      executor: ThreadPoolExecutor,
+                      max_workers: int,
+                      evaluation: Optional[EvaluationStage],
+                      refinement: Optional[RefinementStage],
+                      pending: List[Tuple[str, str, Any]],
+                      options: RunOptions,
+                      sink: ResultSink,
+                      aggregator: SummaryAggregator) -> Dict[str, Any]:
+        """
+        Recognition on the threads, evaluation on the process pool (or on the
+        recognition thread without one), refinement on the threads or batched
+        in the refinement stage.
+
+        At most `max_workers` recognitions are in flight and a new one only
+        starts once the previous prediction got an evaluation slot, so a full
+        evaluation queue holds back recognition. Results of the refinement
+        stage are saved as they come back; the threads never wait for them.
+
+        Returns:
+            Per-stage utilization stats.
+        """
+        recognition = StageTimer(max_workers)
+        refine_timer = StageTimer(max_workers)
+
+        def recognize(sample):
+            with recognition.track():
+                recognized = self._recognize_sample(sample, options)
+            if recognized is None or evaluation is not None:
+                return recognized, None
+            pdf_name, gt, pred_json, stats = recognized
+            logger.info(f"Evaluating results against ground truth for {pdf_name}...")
+            try:
+                return recognized, self.evaluator.calculate_hallucinations(gt, pred_json)
+            except Exception as e:
+                self._write_error(pdf_name, e, options.run_dir)
+                return None, None
+
+        def refine_and_save(pdf_name, eval_metrics, stats, pred_json):
+            with refine_timer.track():
+                logger.info(f"Refining results with LLM for {pdf_name}...")
+                refined_metrics = self.refiner.refine(eval_metrics)
+            return self._save_result(pdf_name, eval_metrics, refined_metrics, stats, pred_json, options.run_dir)
+
+        samples = iter(pending)
+        in_flight = {}
+
+        def evaluated(pdf_name, eval_metrics, stats, pred_json):
+            if refinement is not None:
+                logger.info(f"Queueing {pdf_name} for refinement...")
+                in_flight[refinement.submit(eval_metrics)] = ("refinement", (pdf_name, eval_metrics, stats, pred_json))
+            else:
+                in_flight[executor.submit(refine_and_save, pdf_name, eval_metrics, stats, pred_json)] = ("saved", pdf_name)
+
+        for sample in samples:
+            in_flight[executor.submit(recognize, sample)] = ("recognition", None)
+            if len(in_flight) >= max_workers:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                step, context = in_flight.pop(future)
+                if step == "recognition":
+                    recognized, eval_metrics = future.result()
+                    if recognized is not None:
+                        pdf_name, gt, pred_json, stats = recognized
+                        if evaluation is not None:
+                            logger.info(f"Evaluating results against ground truth for {pdf_name}...")
+                            in_flight[evaluation.submit(gt, pred_json)] = ("evaluation", (pdf_name, pred_json, stats))
+                        else:
+                            evaluated(pdf_name, eval_metrics, stats, pred_json)
+                    sample = next(samples, None)
+                    if sample is not None:
+                        in_flight[executor.submit(recognize, sample)] = ("recognition", None)
+                elif step == "evaluation":
+                    pdf_name, pred_json, stats = context
+                    try:
+                        eval_metrics = future.result()
+                    except Exception as e:
+                        self._write_error(pdf_name, e, options.run_dir)
+                        continue
+                    evaluated(pdf_name, eval_metrics, stats, pred_json)
+                elif step == "refinement":
+                    pdf_name, eval_metrics, stats, pred_json = context
+                    try:
+                        result_entry = self._save_result(pdf_name, eval_metrics, future.result(), stats, pred_json, options.run_dir)
+                    except Exception as e:
+                        self._write_error(pdf_name, e, options.run_dir)
+                        continue
+                    sink.append(result_entry)
+                    aggregator.add(result_entry)
+                else:
+                    try:
+                        result_entry = future.result()
+                    except Exception as e:
+                        self._write_error(context, e, options.run_dir)
+                        continue
+                    sink.append(result_entry)
+                    aggregator.add(result_entry)
+
+        stages = {"recognition": recognition.stats()}
+        if evaluation is not None:
+            stages["evaluation"] = evaluation.stats()
+        stages["refinement"] = refinement.stats() if refinement is not None else refine_timer.stats()
+        return stages
+
+    def run_batch(self,
+                  system_instruction: str,
+                  prompt_template: str,
+                  transport: BatchTransport,
+                  poll_interval: float = 30.0,
+                  timeout: Optional[float] = None,
+                  resume_from: Optional[str] = None,
+                  refine_batch_items: int = 0,
+                  refine_concurrency: int = 2):
+        """
+        Runs the benchmark as a single batch job (whole-paper mode only).
+
+        Every pending sample's request is written to `batch_requests.jsonl` in the
+        run directory and submitted through `transport`, which is polled until the
+        job finishes. The results then go through the usual evaluation, refinement
+        and report. The job id is saved in `batch_job.json`, so resuming an
+        interrupted run polls the same job instead of submitting a new one.
+
+        Args:
+            system_instruction (str): The system instruction for the model.
+            prompt_template (str): The prompt template containing {STRUCTURE_INJECTED}.
+            transport (BatchTransport): Submits and polls the batch job.
+            poll_interval (float): Seconds between status checks.
+            timeout (float, optional): Give up waiting after this many seconds.
+            resume_from (str, optional): Existing run directory to continue (see `run`).
+            refine_batch_items (int): Batch the refinement items of all papers (see `run`).
+            refine_concurrency (int): Maximum refinement requests in flight (see `run`).
+        """
+        run_dir, structures_dir = self._prepare_run_dir(resume_from)
+        pending, sink, aggregator = self._load_checkpointed_results(run_dir)
+        samples = {pathlib.Path(sample[0]).name: sample for sample in pending}
+
+        job_path = run_dir / "batch_job.json"
+        job = None
+        if job_path.exists():
+            with open(job_path, "r", encoding='utf-8') as f:
+                job = json.load(f)
+            # A finished job also covers samples whose results were not saved before an interruption
+            if not set(samples) <= set(job["keys"]):
+                logger.warning(f"Pending samples differ from batch job {job['job_id']}, submitting a new job")
+                job = None
+
+        if job is None and samples:
+            requests = []
+            for pdf_name, (pdf_path, json_path, gt) in samples.items():
+                structure_injected = self._prepare_structure(json_path, gt, pdf_name, structures_dir)
+                requests.append(BatchRequest(
+                    key=pdf_name,
+                    prompt=prompt_template.replace("{STRUCTURE_INJECTED}", structure_injected),
+                    system_instruction=system_instruction,
+                    image_path=pdf_path
+                ))
+            requests_path = run_dir / "batch_requests.jsonl"
+            write_batch_requests(requests, requests_path)
+            logger.info(f"Submitting batch of {len(requests)} requests...")
+            job = {"job_id": transport.submit(str(requests_path)), "keys": sorted(samples), "submitted_at": time.time()}
+            with open(job_path, "w", encoding='utf-8') as f:
+                json.dump(job, f, indent=4)
+
+        stages = None
+        refinement = None
+        if job is not None:
+            results = transport.wait(job["job_id"], poll_interval=poll_interval, timeout=timeout)
+            logger.info(f"Batch job {job['job_id']} finished after {time.time() - job['submitted_at']:.0f}s")
+            parsed = []
+            for pdf_name, (pdf_path, json_path, gt) in samples.items():
+                try:
+                    prediction_result = results.get(pdf_name, RuntimeError("Missing from batch results"))
+                    if isinstance(prediction_result, Exception):
+                        raise prediction_result
+                    stats = SampleStats()
+                    # Batch latency is per job, not per sample
+                    stats.add(prediction_result, self.model.calculate_cost(prediction_result.usage) * transport.cost_factor, 0.0)
+                    compiled_gt = self.dataset.compiled_ground_truth(json_path, gt)
+                    parsed.append((pdf_name, compiled_gt, self._parse_prediction(prediction_result.text, pdf_name, stats), stats))
+                except Exception as e:
+                    self._write_error(pdf_name, e, run_dir)
+
+            # All predictions are in, so evaluators with `evaluate_many` get the whole batch at once
+            logger.info(f"Evaluating {len(parsed)} results against ground truth...")
+            evaluate_many = getattr(self.evaluator, "evaluate_many", None)
+            if callable(evaluate_many):
+                all_metrics = evaluate_many([(gt, pred_json) for _, gt, pred_json, _ in parsed])
+            else:
+                all_metrics = [self.evaluator.calculate_hallucinations(gt, pred_json) for _, gt, pred_json, _ in parsed]
+
+            with ExitStack() as stack:
+                if refine_batch_items:
+                    refinement = stack.enter_context(RefinementStage(self.refiner, refine_batch_items, refine_concurrency))
+                if refinement is not None:
+                    logger.info(f"Refining {len(parsed)} results in batches of up to {refine_batch_items} items...")
+                    refined_futures = [refinement.submit(eval_metrics) for eval_metrics in all_metrics]
+                for i, ((pdf_name, gt, pred_json, stats), eval_metrics) in enumerate(zip(parsed, all_metrics)):
+                    try:
+                        if refinement is not None:
+                            refined_metrics = refined_futures[i].result()
+                        else:
+                            logger.info(f"Refining results with LLM for {pdf_name}...")
+                            refined_metrics = self.refiner.refine(eval_metrics)
+                        result_entry = self._save_result(pdf_name, eval_metrics, refined_metrics, stats, pred_json, run_dir)
+                        sink.append(result_entry)
+                        aggregator.add(result_entry)
+                    except Exception as e:
+                        self._write_error(pdf_name, e, run_dir)
+                if refinement is not None:
+                    stages = {"refinement": refinement.stats()}
+
+        self._finalize_run(run_dir, sink, aggregator, stages)
+
+    async def arun(self,
+                   system_instruction: str,
+                   prompt_template: str,
+                   page_by_page: bool = False,
+                   page_by_page_prompt_template: Optional[str] = None,
+                   max_concurrency: int = 100,
+                   resume_from: Optional[str] = None,
+                   render_prefetch: int = 2,
+                   render_options: Optional[RenderOptions] = None,
+                   page_fanout: bool = False,
+                   page_merge_tie_break: str = "first",
+                   page_delta: bool = False,
+                   page_delta_prompt_template: Optional[str] = None,
+                   context_cache: bool = False,
+                   eval_workers: int = 0,
+                   eval_queue_size: Optional[int] = None,
+                   refine_batch_items: int = 0,
+                   refine_concurrency: int = 2):
+        """
+        Runs the benchmark on asyncio, keeping up to `max_concurrency` model requests in flight.
+
+        Blocking work of the run, including models that only implement `call`
+        (adapted through `ModelInterface.acall`), runs on a thread pool of
+        `max_concurrency` threads that belongs to the run; it is exposed to
+        models as `blocking_executor` and shut down when the run ends.
+
+        Args:
+            system_instruction (str): The system instruction for the model.
+            prompt_template (str): The prompt template containing {STRUCTURE_INJECTED}.
+            page_by_page (bool): Whether to process the PDF page by page.
+            page_by_page_prompt_template (str): The prompt template for page-by-page processing.
+            max_concurrency (int): Maximum number of concurrent model requests.
+            resume_from (str, optional): Existing run directory to continue (see `run`).
+            render_prefetch (int): Pages to render ahead in page-by-page mode (see `run`).
+            render_options (RenderOptions, optional): Page encoding settings (see `run`).
+            page_fanout (bool): Parallel page fan-out with merge (see `run`). Page calls share
+                the `max_concurrency` limit.
+            page_merge_tie_break (str): Tie-break for the fan-out merge (see `run`).
+            page_delta (bool): Delta-only page prompts (see `run`).
+            page_delta_prompt_template (str, optional): Prompt for delta mode (see `run`).
+            context_cache (bool): Send the shared prompt prefix as `cached_prefix` (see `run`).
+            eval_workers (int): Evaluate on a process pool (see `run`).
+            eval_queue_size (int, optional): Evaluation queue bound (see `run`).
+            refine_batch_items (int): Batched refinement stage (see `run`). Its requests do
+                not count against `max_concurrency`.
+            refine_concurrency (int): Maximum refinement requests in flight (see `run`).
+        """
+        run_dir, structures_dir = self._prepare_run_dir(resume_from)
+        pending, sink, aggregator = self._load_checkpointed_results(run_dir)
+        options = RunOptions(
+            system_instruction=system_instruction,
+            prompt_template=prompt_template,
+            page_by_page=page_by_page,
+            page_by_page_prompt_template=page_by_page_prompt_template,
+            structures_dir=structures_dir,
+            run_dir=run_dir,
+            render_prefetch=render_prefetch,
+            render_options=render_options or RenderOptions(),
+            page_fanout=page_fanout,
+            page_merge_tie_break=page_merge_tie_break,
+            page_delta=page_delta,
+            page_delta_prompt_template=page_delta_prompt_template,
+            context_cache=context_cache
+        )
+
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        logger.info(f"Starting async benchmark with up to {max_concurrency} requests in flight...")
+
+        evaluation = EvaluationStage(self.evaluator, eval_workers, eval_queue_size) if eval_workers != 0 else None
+        refinement = RefinementStage(self.refiner, refine_batch_items, refine_concurrency) if refine_batch_items else None
+        # Blocking work of this run goes to its own pool; the caller's loop keeps its default executor
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            # Tasks copy the context when created, so every model call of the run sees the pool
+            token = blocking_executor.set(executor)
+            try:
+                tasks = [self._aprocess_sample(sample, options, semaphore, executor, evaluation, refinement) for sample in pending]
+
+                for coro in asyncio.as_completed(tasks):
+                    result_entry = await coro
+                    if result_entry:
+                        sink.append(result_entry)
+                        aggregator.add(result_entry)
+            finally:
+                blocking_executor.reset(token)
+                if evaluation is not None:
+                    await loop.run_in_executor(executor, evaluation.close)
+                if refinement is not None:
+                    await loop.run_in_executor(executor, refinement.close)
+
+            stages = {}
+            if evaluation is not None:
+                stages["evaluation"] = evaluation.stats()
+            if refinement is not None:
+                stages["refinement"] = refinement.stats()
+            await loop.run_in_executor(executor, self._finalize_run, run_dir, sink, aggregator, stages)
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import pathlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .report_generator import generate_html_report
+from .results import ResultSink, SummaryAggregator
+from .logger import logger
+
+AGGREGATE_FILE = "aggregate.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parses "i/N" (0-based shard index i of N shards)."""
+    try:
+        index, num_shards = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}, expected i/N (e.g. 0/4)")
+    if num_shards < 1 or not 0 <= index < num_shards:
+        raise ValueError(f"Invalid shard {spec!r}, need 0 <= i < N")
+    return index, num_shards
+
+
+def shard_of(pdf_name: str, num_shards: int) -> int:
+    """
+    Stable shard assignment from a hash of the sample name.
+
+    Independent of directory listing order, host and Python hash seed, so
+    every process computes the same split.
+    """
+    digest = hashlib.sha256(pdf_name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+class ShardedDataset:
+    """
+    The samples of `dataset` assigned to shard `index` of `num_shards`.
+
+    Everything else (e.g. `create_structure_injected`) is forwarded to the
+    wrapped dataset.
+    """
+
+    def __init__(self, dataset: Any, index: int, num_shards: int):
+        self.dataset = dataset
+        self.shard = (index, num_shards)
+        self.samples = [
+            sample for sample in dataset
+            if shard_of(pathlib.Path(sample[0]).stem, num_shards) == index
+        ]
+        logger.info(f"Shard {index}/{num_shards}: {len(self.samples)} of {len(dataset)} samples")
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.samples)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+
+def write_aggregate(run_dir: pathlib.Path, aggregator: SummaryAggregator, num_samples: int,
+                    extras: Dict[str, Any], shard: Optional[Tuple[int, int]] = None):
+    """Writes the run's partial aggregate next to its summary.json for `merge_runs`."""
+    payload = {
+        "shard": list(shard) if shard is not None else None,
+        "num_samples": num_samples,
+        "aggregate": aggregator.state(),
+        "extras": extras,
+    }
+    with open(run_dir / AGGREGATE_FILE, "w", encoding='utf-8') as f:
+        json.dump(payload, f, indent=4)
+
+
+# Stat block values that are not counters. Settings are the same in every
+# shard; snapshots describe storage (cache directory, registry) the shards
+# may share, so the largest is kept; rates are recomputed from their counters.
+_SETTINGS = {"max_bytes"}
+_SNAPSHOTS = {"entries", "size_bytes", "active", "registered", "memo_entries"}
+_RATES = {"hit_rate": ("hits", "misses"), "memo_hit_rate": ("memo_hits", "memo_misses")}
+
+
+def _merge_extras(merged: Dict[str, Any], extras: Dict[str, Any]):
+    """
+    Merges one shard's cache/policy/refinement stat blocks into `merged`.
+
+    Counters are summed and rates recomputed from the summed counters, so
+    the result matches a single-process run. Settings and non-numeric
+    values keep the first shard's, snapshots the largest.
+    """
+    for key, value in extras.items():
+        if isinstance(value, dict):
+            _merge_extras(merged.setdefault(key, {}), value)
+        elif key not in merged or key in _SETTINGS or key in _RATES:
+            merged.setdefault(key, value)
+        elif not isinstance(value, (int, float)) or isinstance(value, bool) or not isinstance(merged[key], (int, float)):
+            continue
+        elif key in _SNAPSHOTS:
+            merged[key] = max(merged[key], value)
+        else:
+            merged[key] += value
+    for rate, (hits, misses) in _RATES.items():
+        if rate in merged and isinstance(merged.get(hits), (int, float)) and isinstance(merged.get(misses), (int, float)):
+            total = merged[hits] + merged[misses]
+            merged[rate] = merged[hits] / total if total > 0 else 0
+
+
+def merge_runs(run_dirs: List[str], output_dir: str) -> pathlib.Path:
+    """
+    Combines shard run directories into one summary.json, results.jsonl and report.html.
+
+    Args:
+        run_dirs (List[str]): Run directories of the shards, each with an `aggregate.json`.
+        output_dir (str): Directory for the merged outputs.
+
+    Returns:
+        Path of the merged summary.json.
+    """
+    out_dir = pathlib.Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    aggregator = SummaryAggregator()
+    extras: Dict[str, Any] = {}
+    num_samples = 0
+    shards = set()
+    num_shards = None
+    sink = ResultSink(out_dir / "results.jsonl", reset=True)
+    for run_dir in run_dirs:
+        run_dir = pathlib.Path(run_dir)
+        aggregate_path = run_dir / AGGREGATE_FILE
+        if not aggregate_path.exists():
+            raise ValueError(f"{run_dir} has no {AGGREGATE_FILE}; was the run finished?")
+        with open(aggregate_path, "r", encoding='utf-8') as f:
+            payload = json.load(f)
+
+        if payload["shard"] is not None:
+            index, count = payload["shard"]
+            if num_shards is not None and count != num_shards:
+                raise ValueError(f"{run_dir} is shard {index}/{count}, expected N={num_shards}")
+            if index in shards:
+                raise ValueError(f"Shard {index}/{count} given twice")
+            num_shards = count
+            shards.add(index)
+
+        aggregator.merge(SummaryAggregator.from_state(payload["aggregate"]))
+        _merge_extras(extras, payload["extras"])
+        num_samples += payload["num_samples"]
+        for result_entry in ResultSink(run_dir / "results.jsonl"):
+            sink.append(result_entry)
+
+    if num_shards is not None and len(shards) != num_shards:
+        missing = sorted(set(range(num_shards)) - shards)
+        logger.warning(f"Merging without shards {missing} of {num_shards}")
+
+    summary_json = aggregator.summary(num_samples)
+    summary_json.update(extras)
+    summary_path = out_dir / "summary.json"
+    with open(summary_path, "w", encoding='utf-8') as f:
+        json.dump(summary_json, f, indent=4)
+
+    report_path = generate_html_report(summary_json, sink, out_dir)
+    logger.info(f"Merged {len(run_dirs)} runs ({sink.count} results) into {out_dir}, report at {report_path}")
+    return summary_path
@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from .evaluation import Evaluator
+from .refinement import Refiner
+from .logger import logger
+
+# Set in each evaluation worker process by `_init_worker`
+_worker_evaluator: Optional[Evaluator] = None
+
+
+def _init_worker(evaluator: Evaluator):
+    global _worker_evaluator
+    _worker_evaluator = evaluator
+
+
+def _timed_evaluate(gt: Any, pred: Any) -> Tuple[Dict[str, Any], float]:
+    start_time = time.perf_counter()
+    metrics = _worker_evaluator.calculate_hallucinations(gt, pred)
+    return metrics, time.perf_counter() - start_time
+
+
+class StageTimer:
+    """
+    Busy time of one pipeline stage.
+
+    Utilization is busy time over the wall time since the timer started
+    times the number of slots (threads or processes) the stage has.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.tasks = 0
+        self.busy_time = 0.0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, busy_time: float):
+        with self._lock:
+            self.tasks += 1
+            self.busy_time += busy_time
+
+    @contextmanager
+    def track(self):
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(time.monotonic() - start_time)
+
+    def stats(self) -> Dict[str, Any]:
+        wall_time = time.monotonic() - self.started_at
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "tasks": self.tasks,
+                "busy_time": self.busy_time,
+                "utilization": self.busy_time / (wall_time * self.slots) if wall_time > 0 else 0.0,
+            }
+
+
+class EvaluationStage:
+    """
+    Runs `Evaluator.calculate_hallucinations` on a process pool.
+
+    The word diffs are CPU bound; in worker processes they no longer hold
+    the GIL the recognition threads need. At most `queue_size` evaluations
+    are queued or running; `submit` blocks beyond that, so a slow evaluation
+    stage holds back recognition instead of piling up predictions in memory.
+
+    Args:
+        evaluator (Evaluator): Copied into every worker process.
+        workers (int, optional): Worker processes (default: CPU count).
+        queue_size (int, optional): Maximum queued plus running evaluations (default: 2 per worker).
+    """
+
+    def __init__(self, evaluator: Evaluator, workers: Optional[int] = None, queue_size: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or 2 * self.workers
+        self.timer = StageTimer(self.workers)
+        self.backpressure_time = 0.0
+        self.max_queue_depth = 0
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(evaluator,))
+        logger.info(f"Evaluation stage: {self.workers} processes, queue of {self.queue_size}")
+
+    def submit(self, gt: Any, pred: Any) -> "Future[Dict[str, Any]]":
+        """Queues an evaluation, waiting for a free slot if the queue is full."""
+        start_time = time.monotonic()
+        self._slots.acquire()
+        with self._lock:
+            self.backpressure_time += time.monotonic() - start_time
+            self._depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self._depth)
+
+        result: "Future[Dict[str, Any]]" = Future()
+
+        def on_done(future: Future):
+            with self._lock:
+                self._depth -= 1
+            self._slots.release()
+            try:
+                metrics, busy_time = future.result()
+            except BaseException as e:
+                result.set_exception(e)
+                return
+            self.timer.add(busy_time)
+            result.set_result(metrics)
+
+        try:
+            self._executor.submit(_timed_evaluate, gt, pred).add_done_callback(on_done)
+        except BaseException:
+            with self._lock:
+                self._depth -= 1
+            self._slots.release()
+            raise
+        return result
+
+    def evaluate(self, gt: Any, pred: Any) -> Dict[str, Any]:
+        return self.submit(gt, pred).result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.timer.stats()
+        with self._lock:
+            stats.update({
+                "queue_size": self.queue_size,
+                "max_queue_depth": self.max_queue_depth,
+                "backpressure_time": self.backpressure_time,
+            })
+        return stats
+
+
+class _RefinementTicket:
+    """The verdicts still outstanding for one submitted sample."""
+
+    def __init__(self, evaluation_results: Dict[str, Any], remaining: int):
+        self.evaluation_results = evaluation_results
+        self.remaining = remaining
+        self.verdicts: Dict[int, bool] = {}
+        self.parsed = False
+        self.error: Optional[BaseException] = None
+        self.future: "Future[Dict[str, Any]]" = Future()
+
+
+class RefinementStage:
+    """
+    Batches the refinement items of many samples into shared model calls.
+
+    `submit` returns right away with a future for the refined metrics, so
+    the caller never waits on a refinement round trip. Items are queued and
+    sent up to `batch_items` per request, at most `concurrency` requests at
+    a time; a request goes out once it is full or its oldest item has waited
+    `max_wait` seconds. A sample's future resolves once verdicts for all of
+    its items are in, which may take several requests for large samples.
+    Samples without items resolve immediately.
+
+    Args:
+        refiner (Refiner): Builds the prompts and applies the verdicts.
+        batch_items (int): Maximum items per request.
+        concurrency (int): Maximum requests in flight.
+        max_wait (float): Seconds a partial batch waits for more items.
+    """
+
+    def __init__(self, refiner: Refiner, batch_items: int = 50, concurrency: int = 2, max_wait: float = 0.5):
+        self.refiner = refiner
+        self.batch_items = batch_items
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.timer = StageTimer(concurrency)
+        self.batches = 0
+        self.batched_items = 0
+        self._queue: List[Tuple[_RefinementTicket, int, Dict[str, Any]]] = []
+        self._oldest: Optional[float] = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        logger.info(f"Refinement stage: up to {batch_items} items per request, {concurrency} requests in flight")
+
+    def submit(self, evaluation_results: Dict[str, Any]) -> "Future[Dict[str, Any]]":
+        """Queues a sample's refinement items; the future gets its refined metrics."""
+        items = self.refiner.candidate_items(evaluation_results)
+        self.refiner.count_sample(items)
+        known, unknown = self.refiner.split_known(items)
+        ticket = _RefinementTicket(evaluation_results, len(unknown))
+        if not items:
+            ticket.future.set_result(evaluation_results)
+            return ticket.future
+        # Stored verdicts apply even if every request for the rest fails
+        ticket.verdicts.update(known)
+        ticket.parsed = bool(known)
+        if not unknown:
+            ticket.future.set_result(self.refiner.finish(evaluation_results, ticket.verdicts))
+            return ticket.future
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Refinement stage is closed")
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.extend((ticket, item["id"], item) for item in unknown)
+            self._cond.notify()
+        return ticket.future
+
+    def _next_batch(self) -> Optional[List[Tuple[_RefinementTicket, int, Dict[str, Any]]]]:
+        with self._cond:
+            while True:
+                if self._queue:
+                    waited = time.monotonic() - self._oldest
+                    if len(self._queue) >= self.batch_items or self._closed or waited >= self.max_wait:
+                        break
+                    self._cond.wait(self.max_wait - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            batch = self._queue[:self.batch_items]
+            del self._queue[:self.batch_items]
+            if not self._queue:
+                self._oldest = None
+            self.batches += 1
+            self.batched_items += len(batch)
+            return batch
+
+    def _dispatch(self):
+        while True:
+            # While every request slot is busy, items keep piling up into fuller batches
+            self._slots.acquire()
+            batch = self._next_batch()
+            if batch is None:
+                self._slots.release()
+                return
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: List[Tuple[_RefinementTicket, int, Dict[str, Any]]]):
+        verdicts = None
+        error = None
+        try:
+            with self.timer.track():
+                verdicts = self.refiner.judge([dict(item, id=i) for i, (_, _, item) in enumerate(batch)])
+        except Exception as e:
+            error = e
+        finally:
+            self._slots.release()
+
+        finished = []
+        with self._lock:
+            for i, (ticket, item_id, _) in enumerate(batch):
+                if verdicts is not None:
+                    ticket.parsed = True
+                    if i in verdicts:
+                        ticket.verdicts[item_id] = verdicts[i]
+                if error is not None:
+                    ticket.error = error
+                ticket.remaining -= 1
+                if ticket.remaining == 0:
+                    finished.append(ticket)
+        for ticket in finished:
+            if ticket.error is not None:
+                ticket.future.set_exception(ticket.error)
+                continue
+            try:
+                ticket.future.set_result(self.refiner.finish(ticket.evaluation_results, ticket.verdicts if ticket.parsed else None))
+            except Exception as e:
+                ticket.future.set_exception(e)
+
+    def close(self):
+        """Sends what is still queued and waits for every request to finish."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.timer.stats()
+        with self._cond:
+            stats.update({
+                "batches": self.batches,
+                "items": self.batched_items,
+                "batch_items": self.batch_items,
+            })
+        return stats
@@ -1,16 +1,315 @@
-from difflib import SequenceMatcher
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+def _middle_snake(a: Sequence[int], a_lo: int, a_hi: int,
+                  b: Sequence[int], b_lo: int, b_hi: int) -> Tuple[int, int, int, int]:
+    """
+    Finds the middle snake of an optimal edit path (Myers 1986, section 4b).
+
+    Searches forward from the start and backward from the end until the two
+    frontiers overlap. Returns the snake as absolute (x, y, u, v): it runs
+    diagonally from a[x]/b[y] to a[u]/b[v].
+    """
+    fa = a[a_lo:a_hi]
+    fb = b[b_lo:b_hi]
+    ra = fa[::-1]
+    rb = fb[::-1]
+    n = len(fa)
+    m = len(fb)
+    delta = n - m
+    odd = delta & 1
+    max_d = (n + m + 1) // 2
+    offset = max_d + 1
+    # vf[offset + k]: furthest x on forward diagonal k; vb: the same for the reversed sequences
+    vf = [0] * (2 * offset + 1)
+    vb = [0] * (2 * offset + 1)
+
+    for d in range(max_d + 1):
+        for i in range(offset - d, offset + d + 1, 2):
+            if i == offset - d or (i != offset + d and vf[i - 1] < vf[i + 1]):
+                x = vf[i + 1]
+            else:
+                x = vf[i - 1] + 1
+            y = x - (i - offset)
+            x_start = x
+            while x < n and y < m and fa[x] == fb[y]:
+                x += 1
+                y += 1
+            vf[i] = x
+            # Backward diagonal delta - k, as an index into vb
+            j = 2 * offset + delta - i
+            if odd and abs(j - offset) <= d - 1 and x + vb[j] >= n:
+                k = i - offset
+                return a_lo + x_start, b_lo + x_start - k, a_lo + x, b_lo + y
+
+        for i in range(offset - d, offset + d + 1, 2):
+            if i == offset - d or (i != offset + d and vb[i - 1] < vb[i + 1]):
+                x = vb[i + 1]
+            else:
+                x = vb[i - 1] + 1
+            y = x - (i - offset)
+            x_start = x
+            while x < n and y < m and ra[x] == rb[y]:
+                x += 1
+                y += 1
+            vb[i] = x
+            j = 2 * offset + delta - i
+            if not odd and abs(j - offset) <= d and x + vf[j] >= n:
+                k = i - offset
+                return a_hi - x, b_hi - y, a_hi - x_start, b_hi - (x_start - k)
+
+    raise AssertionError("Middle snake not found")
+
+
+def _matches(a: Sequence[int], a_lo: int, a_hi: int,
+             b: Sequence[int], b_lo: int, b_hi: int,
+             out: List[Tuple[int, int]]):
+    """Appends the (i, j) index pairs of a longest common subsequence, in order, to `out`."""
+    while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+        out.append((a_lo, b_lo))
+        a_lo += 1
+        b_lo += 1
+    suffix_start = len(out)
+    while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+        a_hi -= 1
+        b_hi -= 1
+        out.append((a_hi, b_hi))
+    suffix = out[suffix_start:]
+    del out[suffix_start:]
+
+    # With the common ends trimmed and both sides non-empty the edit distance
+    # is at least 2, so both halves around the middle snake are strictly smaller
+    if a_lo < a_hi and b_lo < b_hi:
+        x, y, u, v = _middle_snake(a, a_lo, a_hi, b, b_lo, b_hi)
+        _matches(a, a_lo, x, b, b_lo, y, out)
+        out.extend((x + i, y + i) for i in range(u - x))
+        _matches(a, u, a_hi, b, v, b_hi, out)
+    out.extend(reversed(suffix))
+
+
+def align_words(gt_words: Sequence[str], pred_words: Sequence[str]) -> List[Tuple[str, int, int, int, int]]:
+    """
+    Case-insensitive minimal word alignment in `SequenceMatcher.get_opcodes` format.
+
+    Uses Myers' O(ND) algorithm with the linear-space middle-snake
+    refinement, so the result is always a longest common subsequence: no
+    junk heuristics, and time grows with the number of differences rather
+    than the product of the lengths.
+    """
+    ids: Dict[str, int] = {}
+    a_all = [ids.setdefault(w.lower(), len(ids)) for w in gt_words]
+    b_all = [ids.setdefault(w.lower(), len(ids)) for w in pred_words]
+
+    # Words found on one side only can never match; dropping them leaves the
+    # LCS unchanged and shrinks D, e.g. to 0 for two unrelated answers
+    common = set(a_all).intersection(b_all)
+    a_index = [i for i, w in enumerate(a_all) if w in common]
+    b_index = [j for j, w in enumerate(b_all) if w in common]
+    a = [a_all[i] for i in a_index]
+    b = [b_all[j] for j in b_index]
+
+    matches: List[Tuple[int, int]] = []
+    _matches(a, 0, len(a), b, 0, len(b), matches)
+    matches = [(a_index[i], b_index[j]) for i, j in matches]
+    a, b = a_all, b_all
+    matches.append((len(a), len(b)))
+
+    opcodes = []
+    i = j = 0
+    for mi, mj in matches:
+        if i < mi and j < mj:
+            opcodes.append(("replace", i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(("delete", i, mi, j, j))
+        elif j < mj:
+            opcodes.append(("insert", i, i, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == "equal" and opcodes[-1][2] == mi:
+                _, i1, _, j1, _ = opcodes[-1]
+                opcodes[-1] = ("equal", i1, mi + 1, j1, mj + 1)
+            else:
+                opcodes.append(("equal", mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
 
 def word_diff(gt, pred):
     gt_words = gt.split()
     pred_words = pred.split()
-    
-    gt_words_lower = [w.lower() for w in gt_words]
-    pred_words_lower = [w.lower() for w in pred_words]
-    
-    matcher = SequenceMatcher(None, gt_words_lower, pred_words_lower)
+
     diffs = []
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    for tag, i1, i2, j1, j2 in align_words(gt_words, pred_words):
         # tag can be: 'replace', 'delete', 'insert', 'equal'
         if tag != 'equal':
             diffs.append((tag, gt_words[i1:i2], pred_words[j1:j2]))
     return diffs
+
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _trie_pattern(node: Dict[Any, Any]) -> str:
+    """
+    Regex for the strings stored below a trie node (a dict of char -> child,
+    with a None key where a string ends).
+
+    Children of a node start with distinct characters, so at most one branch
+    can match, and where a string ends an empty alternative comes after the
+    longer continuations: the regex matches the longest stored string that fits.
+    """
+    branches = []
+    for ch, child in node.items():
+        if ch is None:
+            continue
+        chain = [ch]
+        # Runs without branches or endings become one literal
+        while len(child) == 1 and None not in child:
+            (ch, child), = child.items()
+            chain.append(ch)
+        branches.append(re.escape("".join(chain)) + _trie_pattern(child))
+    if not branches:
+        return ""
+    if None in node:
+        branches.append("")
+    return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+
+class _SubstringScanner:
+    """
+    Finds which of a set of lowercased phrases occur in a text as substrings, in one scan.
+
+    The phrases are compiled into one trie-shaped regex, which finds the
+    longest phrase starting at a position of the text; every phrase that is
+    a prefix of it starts there too. The search resumes one character after
+    each match start, so overlapping phrases are found as well, and
+    stretches without any phrase are skipped inside the regex engine.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        # Repeats of a phrase are counted as often as they were given
+        self.weights = Counter(phrases)
+        distinct = set(self.weights)
+        # The empty phrase is in every text
+        self.always = {""} & distinct
+        root: Dict[Any, Any] = {}
+        for phrase in distinct - self.always:
+            node = root
+            for ch in phrase:
+                node = node.setdefault(ch, {})
+            node[None] = True
+        self.prefixes = {phrase: [phrase[:n] for n in range(1, len(phrase) + 1) if phrase[:n] in distinct]
+                         for phrase in distinct - self.always}
+        self.regex = re.compile(_trie_pattern(root), re.DOTALL) if root else None
+
+    def find(self, text: str) -> Set[str]:
+        """The phrases occurring in `text`, which must already be lowercased."""
+        found = set(self.always)
+        if self.regex is None:
+            return found
+        search = self.regex.search
+        match = search(text)
+        while match is not None:
+            found.update(self.prefixes[match.group()])
+            match = search(text, match.start() + 1)
+        return found
+
+    def count(self, text: str) -> int:
+        """How many of the phrases, with repeats, occur in `text`, which must already be lowercased."""
+        return sum(self.weights[phrase] for phrase in self.find(text))
+
+
+class PhraseMatcher:
+    """
+    Case-insensitive matcher for a fixed set of phrases, built once and reused.
+
+    Either way a text is scanned once, however many phrases are checked. By
+    default a phrase matches anywhere in the text, as a substring: the
+    phrases are compiled into a trie-shaped regex (see `_SubstringScanner`).
+    `count` compiles one for each phrase list it is given, on first use, so
+    an answer is only scanned for its own phrases. With `word_boundary`
+    phrases are compared as word sequences instead: the text is split into
+    words once and the phrases starting at each word are looked up by hash,
+    so punctuation and spacing between words do not matter, and "cat" no
+    longer matches inside "category".
+
+    Args:
+        phrases (Iterable[str]): Phrases to look for; duplicates (ignoring case) share an id.
+        word_boundary (bool): Only match whole words/phrases.
+    """
+
+    def __init__(self, phrases: Iterable[str], word_boundary: bool = False):
+        self.word_boundary = word_boundary
+        self.ids: Dict[str, int] = {}
+        self._lowered: Dict[str, str] = {}
+        # Word tuple -> ids of the phrases with those words; first word -> phrase lengths in words
+        self._ngrams: Dict[Tuple[str, ...], List[int]] = {}
+        self._starts: Dict[str, Set[int]] = {}
+        # Substring scanners by phrase list; None holds the one over all phrases
+        self._scanners: Dict[Any, _SubstringScanner] = {}
+        for phrase in phrases:
+            lowered = self._lowered[phrase] = phrase.lower()
+            if lowered in self.ids:
+                continue
+            pid = self.ids[lowered] = len(self.ids)
+            words = tuple(_WORD_RE.findall(lowered))
+            if words:
+                self._ngrams.setdefault(words, []).append(pid)
+                self._starts.setdefault(words[0], set()).add(len(words))
+
+    def _scanner(self, phrases: Optional[Tuple[str, ...]] = None) -> _SubstringScanner:
+        scanner = self._scanners.get(phrases)
+        if scanner is None:
+            lowered = self.ids if phrases is None else (self._lowered[phrase] for phrase in phrases)
+            # Built at most once per list in practice; a race only builds an identical scanner twice
+            scanner = self._scanners[phrases] = _SubstringScanner(lowered)
+        return scanner
+
+    def find(self, text: str) -> Set[int]:
+        """Ids of the phrases occurring in `text`."""
+        text = text.lower()
+        if not self.word_boundary:
+            return {self.ids[phrase] for phrase in self._scanner().find(text)}
+        words = _WORD_RE.findall(text)
+        found = set()
+        for i, word in enumerate(words):
+            for n in self._starts.get(word, ()):
+                found.update(self._ngrams.get(tuple(words[i:i + n]), ()))
+        return found
+
+    def count(self, text: str, phrases: Iterable[str]) -> int:
+        """How many of `phrases`, which must be among the matcher's, occur in `text` (counted with repeats)."""
+        phrases = tuple(phrases)
+        if not self.word_boundary:
+            return self._scanner(phrases).count(text.lower())
+        found_ids = self.find(text)
+        return sum(1 for phrase in phrases if self.ids[self._lowered[phrase]] in found_ids)
+
+
+def bounded_edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between `a` and `b`, or `limit + 1` once it is known to exceed `limit`.
+
+    Only the diagonal band of width `2 * limit + 1` is filled in, and the
+    scan stops as soon as a whole row is over the limit, so checking a small
+    limit costs O(limit * len) instead of O(len(a) * len(b)).
+    """
+    over = limit + 1
+    if abs(len(a) - len(b)) > limit:
+        return over
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [over] * (len(b) + 1)
+        if i <= limit:
+            cur[0] = i
+        best = cur[0]
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost, over)
+            best = min(best, cur[j])
+        if best > limit:
+            return over
+        prev = cur
+    return prev[len(b)]
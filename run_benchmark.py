@@ -1,9 +1,11 @@
 import os
 import argparse
+import asyncio
 import sys
 import dotenv
 from google.genai import types
-from fonix_ocr_bench import Gemini3Model, BenchmarkDataset, BenchmarkRunner, logger
+from fonix_ocr_bench.sharding import parse_shard
+from fonix_ocr_bench import Gemini3Model, GeminiBatchTransport, CachedModel, ResilientModel, ContextCacheManager, FileStore, FileRegistry, GeminiFileUploader, PageCache, RenderOptions, BenchmarkDataset, LazyBenchmarkDataset, ShardedDataset, BenchmarkRunner, Evaluator, DiffRules, Refiner, VerdictStore, ColumnarEvaluator, merge_runs, logger
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -37,20 +39,85 @@ Previously completed JSON:
 Output must be only the updated JSON object.
 """
 
+PAGE_DELTA_PROMPT_TEMPLATE = """
+1. You are provided with a single page from a student's exam paper and a list of answer fields that are still empty.
+2. Each field is identified by its path: the question's test_number followed by its sub-question keys, separated by "/".
+3. For every listed field whose answer appears on this page, return an edit. Ignore fields that are not on this page.
+4. For is_legible: set "true" if the answer is present and readable, "false" if present but not readable (illegible).
+
+Fields still unanswered:
+```
+{UNANSWERED_PATHS}
+```
+
+Output must be only a JSON list of edits, e.g. [{"path": "01/2", "answer": "...", "is_legible": "true"}], or [] if none of the fields are on this page.
+"""
+
 def main():
     parser = argparse.ArgumentParser(description="Run OCR Benchmark")
     parser.add_argument("--data_dir", type=str, default="./data/all_together", help="Path to data directory")
+    parser.add_argument("--lazy_dataset", action="store_true", help="Index the data directory in a manifest and load ground truths on demand")
+    parser.add_argument("--sets", type=str, nargs="+", default=None, help="With --lazy_dataset, only run these sets (e.g. set_1 set_2)")
+    parser.add_argument("--question_types", type=str, nargs="+", default=None, help="With --lazy_dataset, only run papers containing these question types (e.g. FITB W)")
     parser.add_argument("--output_dir", type=str, default="./results", help="Path to output directory")
     parser.add_argument("--api_key", type=str, default=os.getenv("GOOGLE_API_KEY"), help="Google API Key")
     parser.add_argument("--model", type=str, default="gemini-3-flash-preview", help="Gemini Model Name")
     parser.add_argument("--page_by_page", action="store_true", help="Process PDF page by page")
+    parser.add_argument("--page_fanout", action="store_true", help="With --page_by_page, send all pages in parallel and merge the per-page JSONs")
+    parser.add_argument("--page_delta", action="store_true", help="With --page_by_page, send only the unanswered fields and apply the returned patch locally")
+    parser.add_argument("--page_merge_tie_break", type=str, default="first", choices=["first", "last", "longest", "concat"], help="How --page_fanout resolves pages giving different answers of equal legibility")
     parser.add_argument("--workers", type=int, default=4, help="Number of concurrent workers for processing samples")
+    parser.add_argument("--crossed_out_word_boundary", action="store_true", help="Count crossed-out phrases in predictions only as whole words, not as substrings")
+    parser.add_argument("--columnar_eval", action="store_true", help="Evaluate --batch jobs through a columnar answer table with NumPy group-bys (requires numpy)")
+    parser.add_argument("--eval_workers", type=int, default=0, help="Evaluate on a pool of this many processes, -1 for one per CPU (default: 0, evaluate on the recognition threads)")
+    parser.add_argument("--eval_queue_size", type=int, default=None, help="Maximum evaluations queued before recognition waits (default: 2 per evaluation process)")
+    parser.add_argument("--refine_batch_items", type=int, default=0, help="Refine in a separate stage batching up to this many error items from many papers per request (default: 0, refine each paper inline)")
+    parser.add_argument("--prefilter", action="store_true", help="Resolve trivial word-level errors (punctuation, quotes, hyphenation, digit/letter glyphs) locally instead of sending them to refinement")
+    parser.add_argument("--prefilter_rules", type=str, default=None, metavar="JSON", help="With --prefilter, JSON file overriding the rule settings, e.g. {\"max_edits_by_type\": {\"W\": 2}}")
+    parser.add_argument("--verdict_store", type=str, default=None, help="JSONL file memoizing refinement verdicts per normalized word pair across papers and runs (disabled if not set)")
+    parser.add_argument("--refine_concurrency", type=int, default=2, help="Maximum refinement requests in flight with --refine_batch_items (default: 2)")
+    parser.add_argument("--render_prefetch", type=int, default=2, help="Pages to render ahead of the model in page-by-page mode (0 renders inline)")
+    parser.add_argument("--dpi", type=int, default=None, help="Render pages at this DPI in page-by-page mode (default: 2x scale, i.e. 144 DPI)")
+    parser.add_argument("--grayscale", action="store_true", help="Render pages in grayscale in page-by-page mode")
+    parser.add_argument("--image_format", type=str, default="png", choices=["png", "jpeg", "webp"], help="Page image encoding in page-by-page mode (webp requires Pillow)")
+    parser.add_argument("--image_quality", type=int, default=85, help="JPEG/WebP quality (1-100)")
+    parser.add_argument("--binarize", type=int, default=None, metavar="THRESHOLD", help="Binarize pages at this gray level (0-255) in page-by-page mode")
+    parser.add_argument("--shard", type=str, default=None, metavar="I/N", help="Only run shard I of N (0-based); samples are assigned by a stable hash of their name")
+    parser.add_argument("--merge", type=str, nargs="+", default=None, metavar="RUN_DIR", help="Merge finished shard run directories into one summary and report in --output_dir, then exit")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN_DIR", help="Continue an interrupted run in RUN_DIR, skipping samples that already have results")
+    parser.add_argument("--batch", action="store_true", help="Submit all samples as one Batch API job and poll for the results (whole-paper mode only)")
+    parser.add_argument("--batch_poll_interval", type=float, default=60, help="Seconds between batch job status checks")
+    parser.add_argument("--use_async", action="store_true", help="Use the asyncio execution engine instead of worker threads")
+    parser.add_argument("--max_concurrency", type=int, default=100, help="Maximum number of in-flight model requests with --use_async")
+    parser.add_argument("--rpm", type=float, default=None, help="Client-side limit on model requests per minute")
+    parser.add_argument("--tpm", type=float, default=None, help="Client-side limit on model tokens per minute")
+    parser.add_argument("--cache_dir", type=str, default=None, help="Directory for the on-disk model response cache (disabled if not set)")
+    parser.add_argument("--cache_max_mb", type=int, default=1024, help="Maximum size of the response cache in MB")
+    parser.add_argument("--page_cache_dir", type=str, default=None, help="Directory for the rendered page image cache used in page-by-page mode (disabled if not set)")
+    parser.add_argument("--context_cache", action="store_true", help="Serve the system instruction and injected structure from provider-side cached content")
+    parser.add_argument("--context_cache_ttl", type=int, default=3600, help="TTL in seconds of context caches (extended while in use)")
+    parser.add_argument("--file_registry", type=str, default=None, help="Upload each PDF once via the Files API and keep the references in this JSON registry (PDFs are inlined if not set)")
+    parser.add_argument("--page_cache_max_mb", type=int, default=2048, help="Maximum size of the page image cache in MB")
     
     args = parser.parse_args()
+
+    if args.merge:
+        summary_path = merge_runs(args.merge, args.output_dir)
+        logger.info(f"Merged summary saved to {summary_path}")
+        return
     
     if not args.api_key:
         logger.error("Error: API Key is required. Set GOOGLE_API_KEY env var or pass --api_key")
         return
+    if args.batch and args.page_by_page:
+        logger.error("Error: --batch supports whole-paper mode only")
+        return
+    if args.columnar_eval and not args.batch:
+        logger.error("Error: --columnar_eval requires --batch")
+        return
+    if (args.sets or args.question_types) and not args.lazy_dataset:
+        logger.error("Error: --sets and --question_types require --lazy_dataset")
+        return
 
     # Initialize Components
     # Note: You can replace GeminiModel with your own custom model class here.
@@ -63,23 +130,117 @@ def main():
     model.temperature = 1
     model.top_p = 0.95
     model.media_resolution = types.MediaResolution.MEDIA_RESOLUTION_HIGH
+
+    if args.file_registry:
+        model.file_store = FileStore(GeminiFileUploader(model.client), FileRegistry(args.file_registry))
+
+    context_cache = None
+    if args.context_cache:
+        context_cache = ContextCacheManager(model.client, ttl_seconds=args.context_cache_ttl)
+        model.context_cache = context_cache
+
+    batch_transport = GeminiBatchTransport(model) if args.batch else None
+
+    # Retries, rate limits and the circuit breaker sit below the cache so cache hits are never throttled
+    model = ResilientModel(model, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    if args.cache_dir:
+        model = CachedModel(model, cache_dir=args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024)
     
-    dataset = BenchmarkDataset(data_dir=args.data_dir)
+    if args.lazy_dataset:
+        dataset = LazyBenchmarkDataset(data_dir=args.data_dir, sets=args.sets, question_types=args.question_types)
+    else:
+        dataset = BenchmarkDataset(data_dir=args.data_dir)
+    if args.shard:
+        dataset = ShardedDataset(dataset, *parse_shard(args.shard))
+    render_options = RenderOptions(
+        dpi=args.dpi,
+        grayscale=args.grayscale,
+        image_format=args.image_format,
+        quality=args.image_quality,
+        binarize_threshold=args.binarize
+    )
+
+    page_cache = None
+    if args.page_cache_dir:
+        page_cache = PageCache(cache_dir=args.page_cache_dir, max_bytes=args.page_cache_max_mb * 1024 * 1024)
+
+    evaluator_class = ColumnarEvaluator if args.columnar_eval else Evaluator
+    rules = None
+    if args.prefilter or args.prefilter_rules:
+        rules = DiffRules.from_file(args.prefilter_rules) if args.prefilter_rules else DiffRules()
+    evaluator = evaluator_class(crossed_out_word_boundary=args.crossed_out_word_boundary, rules=rules)
     runner = BenchmarkRunner(
         dataset=dataset, 
         model=model, 
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        page_cache=page_cache,
+        evaluator=evaluator,
+        refiner=Refiner(model, VerdictStore(args.verdict_store)) if args.verdict_store else None
     )
     
     # Run Benchmark
-    logger.info(f"Starting Benchmark with model: {args.model} (Page-by-Page: {args.page_by_page}, Workers: {args.workers})")
-    runner.run(
-        system_instruction=SYSTEM_INSTRUCTION,
-        prompt_template=PROMPT_TEMPLATE,
-        page_by_page_prompt_template=PAGE_BY_PAGE_PROMPT_TEMPLATE,
-        page_by_page=args.page_by_page,
-        max_workers=args.workers
-    )
+    try:
+        if batch_transport is not None:
+            logger.info(f"Starting Batch Benchmark with model: {args.model}")
+            runner.run_batch(
+                system_instruction=SYSTEM_INSTRUCTION,
+                prompt_template=PROMPT_TEMPLATE,
+                transport=batch_transport,
+                poll_interval=args.batch_poll_interval,
+                resume_from=args.resume,
+                refine_batch_items=args.refine_batch_items,
+                refine_concurrency=args.refine_concurrency
+            )
+            return
+
+        if args.use_async:
+            logger.info(f"Starting Benchmark with model: {args.model} (Page-by-Page: {args.page_by_page}, Max Concurrency: {args.max_concurrency})")
+            asyncio.run(runner.arun(
+                system_instruction=SYSTEM_INSTRUCTION,
+                prompt_template=PROMPT_TEMPLATE,
+                page_by_page_prompt_template=PAGE_BY_PAGE_PROMPT_TEMPLATE,
+                page_by_page=args.page_by_page,
+                max_concurrency=args.max_concurrency,
+                resume_from=args.resume,
+                render_prefetch=args.render_prefetch,
+                render_options=render_options,
+                page_fanout=args.page_fanout,
+                page_merge_tie_break=args.page_merge_tie_break,
+                page_delta=args.page_delta,
+                page_delta_prompt_template=PAGE_DELTA_PROMPT_TEMPLATE,
+                context_cache=args.context_cache,
+                eval_workers=None if args.eval_workers < 0 else args.eval_workers,
+                eval_queue_size=args.eval_queue_size,
+                refine_batch_items=args.refine_batch_items,
+                refine_concurrency=args.refine_concurrency
+            ))
+            return
+
+        logger.info(f"Starting Benchmark with model: {args.model} (Page-by-Page: {args.page_by_page}, Workers: {args.workers})")
+        runner.run(
+            system_instruction=SYSTEM_INSTRUCTION,
+            prompt_template=PROMPT_TEMPLATE,
+            page_by_page_prompt_template=PAGE_BY_PAGE_PROMPT_TEMPLATE,
+            page_by_page=args.page_by_page,
+            max_workers=args.workers,
+            resume_from=args.resume,
+            render_prefetch=args.render_prefetch,
+            render_options=render_options,
+            page_fanout=args.page_fanout,
+            page_merge_tie_break=args.page_merge_tie_break,
+            page_delta=args.page_delta,
+            page_delta_prompt_template=PAGE_DELTA_PROMPT_TEMPLATE,
+            context_cache=args.context_cache,
+            eval_workers=None if args.eval_workers < 0 else args.eval_workers,
+            eval_queue_size=args.eval_queue_size,
+            refine_batch_items=args.refine_batch_items,
+            refine_concurrency=args.refine_concurrency
+        )
+    finally:
+        # Cached content is billed for storage until it expires, drop it once the run is over
+        if context_cache is not None:
+            context_cache.close()
 
 if __name__ == "__main__":
     main()
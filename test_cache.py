@@ -0,0 +1,90 @@
+import asyncio
+import pathlib
+import tempfile
+import threading
+from fonix_ocr_bench.cache import CachedModel, DiskLRUCache
+from fonix_ocr_bench.model_interface import ModelInterface, PredictionResult, UsageStats
+
+
+class EchoModel(ModelInterface):
+    def __init__(self):
+        self.calls = 0
+        self.temperature = 1
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None):
+        self.calls += 1
+        return PredictionResult(text=f"echo:{prompt}", usage=UsageStats(prompt_tokens=10, completion_tokens=5))
+
+    def get_config(self):
+        return {"model_class": "EchoModel", "temperature": self.temperature}
+
+    def calculate_cost(self, usage):
+        return usage.prompt_tokens * 0.001
+
+
+def test_cached_model_hits_and_misses():
+    with tempfile.TemporaryDirectory() as tmp:
+        inner = EchoModel()
+        model = CachedModel(inner, cache_dir=tmp)
+
+        first = model.call("hello", "sys", image_bytes=b"page-1")
+        second = model.call("hello", "sys", image_bytes=b"page-1")
+        model.call("hello", "sys", image_bytes=b"page-2")
+
+        assert inner.calls == 2
+        assert second.text == first.text
+        assert second.usage == first.usage
+        assert not first.cached and second.cached
+        stats = model.cache_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+
+        # Changing a sampling parameter must invalidate the key
+        inner.temperature = 0
+        model.call("hello", "sys", image_bytes=b"page-1")
+        assert inner.calls == 3
+
+        # Entries persist across instances
+        reopened = CachedModel(EchoModel(), cache_dir=tmp)
+        reopened.call("hello", "sys", image_bytes=b"page-1")
+        assert reopened.cache_stats()["hits"] == 1
+
+
+def test_cached_model_acall_keeps_disk_io_off_the_event_loop():
+    with tempfile.TemporaryDirectory() as tmp:
+        model = CachedModel(EchoModel(), cache_dir=tmp)
+        threads = []
+        get, put = model.cache.get, model.cache.put
+        model.cache.get = lambda key: threads.append(threading.current_thread()) or get(key)
+        model.cache.put = lambda key, data: threads.append(threading.current_thread()) or put(key, data)
+
+        async def main():
+            first = await model.acall("hello", "sys", image_bytes=b"page-1")
+            second = await model.acall("hello", "sys", image_bytes=b"page-1")
+            return first, second
+
+        first, second = asyncio.run(main())
+        assert not first.cached and second.cached
+        # Two lookups and one store, none of them on the event loop's thread
+        assert len(threads) == 3 and threading.main_thread() not in threads
+
+
+def test_disk_cache_evicts_least_recently_used():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskLRUCache(tmp, max_bytes=25)
+        cache.put("a" * 64, b"0123456789")
+        cache.put("b" * 64, b"0123456789")
+        cache.get("a" * 64)
+        cache.put("c" * 64, b"0123456789")
+
+        assert ("a" * 64) in cache
+        assert ("b" * 64) not in cache
+        assert ("c" * 64) in cache
+        assert cache.size_bytes == 20
+        assert not (pathlib.Path(tmp) / "bb" / ("b" * 64)).exists()
+
+
+if __name__ == "__main__":
+    test_cached_model_hits_and_misses()
+    test_cached_model_acall_keeps_disk_io_off_the_event_loop()
+    test_disk_cache_evicts_least_recently_used()
+    print("SUCCESS: cache tests passed.")
@@ -0,0 +1,84 @@
+import copy
+import pytest
+from fonix_ocr_bench import Evaluator, SummaryAggregator
+
+pytest.importorskip("numpy")
+from fonix_ocr_bench import ColumnarEvaluator
+
+GT = {
+    "questions": [
+        {
+            "test_number": "01",
+            "question_type": "FITB",
+            "student_answers": {
+                "1": {"answer": "apple pie", "crossedout_text": ["pear"], "is_legible": "true"},
+                "2": {"answer": "", "crossedout_text": [], "is_legible": ""},
+                "3": {"answer": "blue", "crossedout_text": [], "is_legible": "false"}
+            }
+        },
+        {"test_number": "02", "question_type": "W", "student_answers": "the quick brown fox jumps"},
+        {"test_number": "03", "question_type": "W", "student_answers": ""},
+        {
+            "test_number": "04",
+            "question_type": "QA",
+            "student_answers": {"a": {"b": {"answer": "ten", "is_legible": "true"}}}
+        },
+        {"test_number": "05", "question_type": "UL", "student_answers": {"answer": "b", "is_legible": "true"}}
+    ]
+}
+
+
+def prediction(fill_blank="", essay="the quick brown fox jumps", extra_essay="", qa="ten"):
+    pred = copy.deepcopy(GT)
+    answers = pred["questions"][0]["student_answers"]
+    answers["1"]["answer"] = "apple pear pie"
+    answers["2"]["answer"] = fill_blank
+    answers["3"]["is_legible"] = "true"
+    pred["questions"][1]["student_answers"] = essay
+    pred["questions"][2]["student_answers"] = extra_essay
+    pred["questions"][3]["student_answers"]["a"]["b"]["answer"] = qa
+    # Question 05 is missing from the prediction
+    del pred["questions"][4]
+    return pred
+
+
+PAIRS = [
+    (GT, copy.deepcopy(GT)),
+    (GT, prediction()),
+    (GT, prediction(fill_blank="x", essay="the quick brown dog jumps high", extra_essay="made up", qa="Ten")),
+    ({"questions": []}, {"questions": []}),
+]
+
+
+def test_columnar_metrics_match_evaluator():
+    evaluator = Evaluator()
+    expected = [evaluator.calculate_hallucinations(gt, pred) for gt, pred in PAIRS]
+    assert ColumnarEvaluator().evaluate_many(PAIRS) == expected
+    assert ColumnarEvaluator().calculate_hallucinations(*PAIRS[2]) == expected[2]
+    # Single samples skip the table
+    assert ColumnarEvaluator.calculate_hallucinations is Evaluator.calculate_hallucinations
+
+
+def test_question_type_totals_match_aggregator():
+    def entry(metrics):
+        return {"pdf_name": "paper.pdf", "metrics": metrics, "refined_metrics": metrics, "cost": 0.0, "recognition_time": 0.0}
+
+    metrics = ColumnarEvaluator().evaluate_many(PAIRS)
+    looped = SummaryAggregator()
+    grouped = SummaryAggregator(ColumnarEvaluator.question_type_totals)
+    for sample_metrics in metrics:
+        looped.add(entry(sample_metrics))
+        grouped.add(entry(sample_metrics))
+    assert grouped.summary(len(PAIRS)) == looped.summary(len(PAIRS))
+    assert grouped.state()["question_type_summary"] == looped.state()["question_type_summary"]
+
+    # Merging keeps the per-type counts whichever way they were summed
+    grouped.merge(SummaryAggregator.from_state(looped.state()))
+    looped.merge(SummaryAggregator.from_state(looped.state()))
+    assert grouped.summary(len(PAIRS))["refined_question_type_summary"] == looped.summary(len(PAIRS))["refined_question_type_summary"]
+
+
+if __name__ == "__main__":
+    test_columnar_metrics_match_evaluator()
+    test_question_type_totals_match_aggregator()
+    print("SUCCESS: columnar evaluation tests passed.")
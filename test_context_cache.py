@@ -0,0 +1,99 @@
+import time
+from types import SimpleNamespace
+from fonix_ocr_bench import Gemini3Model, ContextCacheManager, UsageStats
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeCaches:
+    def __init__(self, min_chars=0, outages=0):
+        self.min_chars = min_chars
+        self.outages = outages
+        self.created = []
+        self.updated = []
+        self.deleted = []
+
+    def create(self, model, config):
+        text = config.contents[0].parts[0].text if config.contents else ""
+        if self.outages:
+            self.outages -= 1
+            raise FakeAPIError(503, "UNAVAILABLE")
+        if len(text) < self.min_chars:
+            raise FakeAPIError(400, "INVALID_ARGUMENT: Cached content is too small")
+        self.created.append(config)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def update(self, name, config):
+        self.updated.append(name)
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+def test_cache_is_shared_refreshed_and_closed():
+    caches = FakeCaches()
+    manager = ContextCacheManager(SimpleNamespace(caches=caches), ttl_seconds=600, refresh_margin=60)
+
+    first = manager.acquire("gemini-3-flash-preview", "sys", "structure A")
+    second = manager.acquire("gemini-3-flash-preview", "sys", "structure A")
+    other = manager.acquire("gemini-3-flash-preview", "sys", "structure B")
+    assert first == second != other
+    assert len(caches.created) == 2
+
+    # Close to expiry the TTL is extended instead of creating a new cache
+    entry = next(e for e in manager._entries.values() if e.name == first)
+    entry.expires_at = time.time() + 30
+    assert manager.acquire("gemini-3-flash-preview", "sys", "structure A") == first
+    assert caches.updated == [first]
+
+    # Only caches with no request in flight are deleted
+    for name in (first, first, first, other):
+        manager.release(name)
+    manager.acquire("gemini-3-flash-preview", "sys", "structure B")
+    manager.close()
+    assert caches.deleted == [first]
+    assert manager.stats()["active"] == 1
+
+
+def test_uncacheable_prefix_is_sent_inline():
+    caches = FakeCaches(min_chars=100)
+    model = Gemini3Model(api_key="test", context_cache=ContextCacheManager(SimpleNamespace(caches=caches)))
+
+    prompt, cache_name = model._acquire_cache(" rest", "sys", "short prefix")
+    assert (prompt, cache_name) == ("short prefix rest", None)
+    model._acquire_cache(" rest", "sys", "short prefix")
+    assert model.context_cache_stats()["failed"] == 1
+
+
+def test_transient_failure_only_affects_one_request():
+    caches = FakeCaches(outages=1)
+    model = Gemini3Model(api_key="test", context_cache=ContextCacheManager(SimpleNamespace(caches=caches)))
+
+    assert model._acquire_cache(" rest", "sys", "structure A") == ("structure A rest", None)
+    prompt, cache_name = model._acquire_cache(" rest", "sys", "structure A")
+    assert prompt == " rest" and cache_name is not None
+    assert model.context_cache_stats()["failed"] == 1
+
+    # Calls without a shared prefix never create a cache
+    assert model._acquire_cache("refine this", "sys", None) == ("refine this", None)
+    assert len(caches.created) == 1
+
+
+def test_cached_tokens_are_billed_at_cached_price():
+    model = Gemini3Model(api_key="test")
+    full = model.calculate_cost(UsageStats(prompt_tokens=1000000, completion_tokens=0))
+    cached = model.calculate_cost(UsageStats(prompt_tokens=1000000, completion_tokens=0, cached_tokens=800000))
+    assert abs(full - 0.5) < 1e-9
+    assert abs(cached - (0.2 * 0.5 + 0.8 * 0.05)) < 1e-9
+
+
+if __name__ == "__main__":
+    test_cache_is_shared_refreshed_and_closed()
+    test_uncacheable_prefix_is_sent_inline()
+    test_transient_failure_only_affects_one_request()
+    test_cached_tokens_are_billed_at_cached_price()
+    print("SUCCESS: context cache tests passed.")
@@ -0,0 +1,43 @@
+import random
+from fonix_ocr_bench import Evaluator, PhraseMatcher
+
+
+def substring_count(text, phrases):
+    """The previous crossed-out loop, kept as the reference implementation."""
+    text = text.lower()
+    return sum(1 for phrase in phrases if phrase.lower() in text)
+
+
+def test_matcher_matches_substring_loop():
+    rng = random.Random(0)
+    vocab = ["cat", "Category", "dog", "do", "the", "ca", "t c", "", "DOG."]
+    phrases = vocab + ["cat", "the cat"]
+    matcher = PhraseMatcher(phrases)
+    for _ in range(200):
+        text = " ".join(rng.choices(vocab, k=rng.randint(0, 8)))
+        subset = rng.sample(phrases, rng.randint(1, len(phrases)))
+        assert matcher.count(text, subset) == substring_count(text, subset)
+
+    # Overlapping phrases and phrases that are prefixes of others are all found in one scan
+    matcher = PhraseMatcher(["cat", "CATEGORY", "ate", "gory", "tego", "x", "cat"])
+    assert matcher.count("a Category", ["cat", "CATEGORY", "ate", "gory", "tego", "x", "cat"]) == 6
+    assert matcher.find("categ") == {matcher.ids["cat"], matcher.ids["ate"]}
+
+
+def test_word_boundary_matching():
+    matcher = PhraseMatcher(["cat", "the cat", "CAT", "dog", "", "sat down"], word_boundary=True)
+    assert matcher.count("The category sat, down", ["cat", "the cat", "sat down", ""]) == 1
+    assert matcher.count("the  Cat sat", ["cat", "CAT", "the cat", "dog"]) == 3
+
+    gt = {"questions": [{"test_number": "01", "question_type": "FITB", "student_answers": {
+        "1": {"answer": "a", "crossedout_text": ["cat", "dog"], "is_legible": "true"}}}]}
+    pred = {"questions": [{"test_number": "01", "student_answers": {
+        "1": {"answer": "category dog", "is_legible": "true"}}}]}
+    assert Evaluator().calculate_hallucinations(gt, pred)["crossed_out_hallucinations"] == 2
+    assert Evaluator(crossed_out_word_boundary=True).calculate_hallucinations(gt, pred)["crossed_out_hallucinations"] == 1
+
+
+if __name__ == "__main__":
+    test_matcher_matches_substring_loop()
+    test_word_boundary_matching()
+    print("SUCCESS: crossed-out matching tests passed.")
@@ -0,0 +1,112 @@
+import json
+import os
+import pathlib
+import tempfile
+from fonix_ocr_bench import BenchmarkDataset, Evaluator, GroundTruthIndex, LazyBenchmarkDataset
+
+
+def _write_pair(data_dir: pathlib.Path, stem: str, question_type: str):
+    gt = {
+        "paper_title": stem,
+        "questions": [{"test_number": "01", "question_type": question_type, "student_answers": "text"}]
+    }
+    (data_dir / f"{stem}.json").write_text(json.dumps(gt), encoding="utf-8")
+    (data_dir / f"{stem}.pdf").write_bytes(b"%PDF-1.4 fake")
+
+
+def test_lazy_dataset_matches_eager_dataset():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = pathlib.Path(tmp)
+        _write_pair(data_dir, "set_1_1", "FITB")
+        _write_pair(data_dir, "set_2_1", "W")
+
+        eager = BenchmarkDataset(str(data_dir))
+        lazy = LazyBenchmarkDataset(str(data_dir), cache_size=1)
+        assert len(lazy) == len(eager) == 2
+        for (pdf_path, json_path, gt), sample in zip(sorted(eager.samples, key=lambda s: s[0]), lazy):
+            assert sample[0] == pdf_path and sample[1] == json_path
+            lazy_pdf, lazy_json, lazy_gt = sample
+            assert lazy_gt == gt
+        assert len(lazy._cache) == 1
+
+
+def test_manifest_filters_and_incremental_rebuild():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = pathlib.Path(tmp)
+        _write_pair(data_dir, "set_1_1", "FITB")
+        _write_pair(data_dir, "set_1_2", "W")
+        _write_pair(data_dir, "set_2_1", "W")
+
+        LazyBenchmarkDataset(str(data_dir))
+        manifest = json.loads((data_dir / ".fonix_manifest.json").read_text(encoding="utf-8"))
+        assert len(manifest["entries"]) == 3
+        assert all(len(e["json_sha256"]) == 64 for e in manifest["entries"])
+
+        # Filtering comes from the manifest: unrelated JSONs are never parsed
+        (data_dir / "set_2_1.json").write_text("{not json", encoding="utf-8")
+        entry = next(e for e in manifest["entries"] if e["json_path"].endswith("set_2_1.json"))
+        os.utime(data_dir / "set_2_1.json", (entry["json_mtime"], entry["json_mtime"]))
+        entry["json_size"] = (data_dir / "set_2_1.json").stat().st_size
+        (data_dir / ".fonix_manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+
+        by_set = LazyBenchmarkDataset(str(data_dir), sets=["set_1"])
+        assert [pathlib.Path(s[0]).stem for s in by_set] == ["set_1_1", "set_1_2"]
+        by_type = LazyBenchmarkDataset(str(data_dir), sets=["set_1"], question_types=["W"])
+        assert [pathlib.Path(s[0]).stem for s in by_type] == ["set_1_2"]
+
+
+def test_ground_truth_index_shares_structures_and_matches_evaluator():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = pathlib.Path(tmp)
+        for stem, answer in (("set_1_1", "the cat sat"), ("set_1_2", "a dog ran")):
+            gt = {"paper_title": "Set 1", "questions": [
+                {"test_number": "01", "question_type": "FITB", "student_answers": {
+                    "1": {"answer": answer, "crossedout_text": ["dog"], "is_legible": "true"},
+                    "2": {"1": {"answer": "", "crossedout_text": [], "is_legible": "false"}}}},
+                {"test_number": "02", "question_type": "W", "student_answers": {
+                    "answer": "an essay " + answer, "crossedout_text": [], "is_legible": "true"}}
+            ]}
+            (data_dir / f"{stem}.json").write_text(json.dumps(gt), encoding="utf-8")
+            (data_dir / f"{stem}.pdf").write_bytes(b"%PDF-1.4 fake")
+
+        dataset = BenchmarkDataset(str(data_dir))
+        (pdf_1, json_1, gt_1), (pdf_2, json_2, gt_2) = sorted(dataset.samples)
+        assert dataset.structure_injected(json_1, gt_1) is dataset.structure_injected(json_2, gt_2)
+        assert dataset.structure_injected(json_1, gt_1) == dataset.create_structure_injected(gt_1)
+
+        pred = json.loads(dataset.create_structure_injected(gt_2))
+        pred["questions"][0]["student_answers"]["1"].update(answer="a dog sat down", is_legible="true")
+        pred["questions"][0]["student_answers"]["2"]["1"].update(answer="x", is_legible="false")
+        pred["questions"][1]["student_answers"]["answer"] = "an essay a cat ran"
+        evaluator = Evaluator()
+        assert evaluator.calculate_hallucinations(dataset.compiled_ground_truth(json_2, gt_2), pred) == \
+            evaluator.calculate_hallucinations(gt_2, pred)
+
+        # Nothing is compiled up front; the first access compiles and persists
+        lazy = LazyBenchmarkDataset(str(data_dir), cache_size=1)
+        index_dir = data_dir / ".fonix_manifest.gt_index"
+        assert not index_dir.exists()
+        samples = [(json_path, gt) for _, json_path, gt in lazy]
+        structures = [lazy.structure_injected(json_path, gt) for json_path, gt in samples]
+        assert structures[0] is structures[1]
+        assert len(list((index_dir / "entries").iterdir())) == 2
+        assert len(list((index_dir / "structures").iterdir())) == 1
+        assert lazy.gt_index.stats() == {"compiled": 2, "loaded": 0, "in_memory": 1, "structures": 1}
+
+        # A later run reads the compiled entries back instead of compiling again
+        rerun = LazyBenchmarkDataset(str(data_dir), cache_size=1)
+        assert rerun.compiled_ground_truth(*samples[1]) == lazy.compiled_ground_truth(*samples[1])
+        assert rerun.gt_index.stats()["compiled"] == 0
+
+        # The entry of a ground truth that changed is dropped
+        (data_dir / "set_1_1.json").write_text(json.dumps({"questions": []}), encoding="utf-8")
+        LazyBenchmarkDataset(str(data_dir))
+        assert len(list((index_dir / "entries").iterdir())) == 1
+        assert isinstance(GroundTruthIndex(str(index_dir)).structure(lazy._digests[samples[1][0]]), str)
+
+
+if __name__ == "__main__":
+    test_lazy_dataset_matches_eager_dataset()
+    test_manifest_filters_and_incremental_rebuild()
+    test_ground_truth_index_shares_structures_and_matches_evaluator()
+    print("SUCCESS: dataset tests passed.")
@@ -0,0 +1,62 @@
+import pathlib
+import tempfile
+import time
+from fonix_ocr_bench import Gemini3Model
+from fonix_ocr_bench.files import FileRegistry, FileStore, LocalFileUploader
+
+
+def test_file_store_uploads_once_across_runs():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        pdf = tmp / "paper.pdf"
+        pdf.write_bytes(b"%PDF-1.4 fake")
+        copy = tmp / "copy.pdf"
+        copy.write_bytes(b"%PDF-1.4 fake")
+        uploader = LocalFileUploader(str(tmp / "remote"))
+
+        store = FileStore(uploader, FileRegistry(str(tmp / "files.json")))
+        first = store.resolve(str(pdf), "application/pdf")
+        # Same content under another name is the same remote file
+        assert store.resolve(str(copy), "application/pdf") == first
+
+        # A new run reads the persisted registry
+        store = FileStore(uploader, FileRegistry(str(tmp / "files.json")))
+        assert store.resolve(str(pdf), "application/pdf").uri == first.uri
+        assert uploader.uploads == 1
+        assert store.stats() == {"uploads": 0, "reuses": 1, "registered": 1}
+
+
+def test_expiring_reference_is_reuploaded():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        pdf = tmp / "paper.pdf"
+        pdf.write_bytes(b"%PDF-1.4 fake")
+        uploader = LocalFileUploader(str(tmp / "remote"), ttl=60)
+        store = FileStore(uploader, FileRegistry(str(tmp / "files.json"), safety_margin=120))
+
+        store.resolve(str(pdf), "application/pdf")
+        ref = store.resolve(str(pdf), "application/pdf")
+        assert uploader.uploads == 2
+        assert ref.expires_at > time.time()
+
+
+def test_gemini_contents_reference_uploaded_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        pdf = tmp / "paper.pdf"
+        pdf.write_bytes(b"%PDF-1.4 fake")
+        store = FileStore(LocalFileUploader(str(tmp / "remote")), FileRegistry(str(tmp / "files.json")))
+        model = Gemini3Model(api_key="test", file_store=store)
+
+        ref = store.resolve(str(pdf), "application/pdf")
+        contents = model._build_contents("prompt", image_path=str(pdf), file_ref=ref)
+        part = contents[0].parts[1]
+        assert part.inline_data is None
+        assert part.file_data.file_uri == ref.uri
+
+
+if __name__ == "__main__":
+    test_file_store_uploads_once_across_runs()
+    test_expiring_reference_is_reuploaded()
+    test_gemini_contents_reference_uploaded_file()
+    print("SUCCESS: file reference tests passed.")
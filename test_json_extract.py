@@ -0,0 +1,50 @@
+import json
+from fonix_ocr_bench import extract_json
+from fonix_ocr_bench.patching import parse_patch
+
+
+def test_valid_json_needs_no_repairs():
+    extracted = extract_json('```json\n{"a": [1, 2]}\n```')
+    assert extracted.value == {"a": [1, 2]}
+    assert extracted.repairs == []
+
+
+def test_repairs_are_reported():
+    extracted = extract_json('Here is the JSON:\n{"a": [1, 2,], "b": "He said "stop" now",}\nDone.')
+    assert extracted.value == {"a": [1, 2], "b": 'He said "stop" now'}
+    assert extracted.repairs == ["surrounding_text", "trailing_comma", "unescaped_quote"]
+    assert json.loads(extracted.text) == extracted.value
+
+
+def test_truncated_output_is_closed():
+    extracted = extract_json('```json\n{"questions": [{"test_number": "01", "student_answers": "the quick')
+    assert extracted.value == {"questions": [{"test_number": "01", "student_answers": "the quick"}]}
+    assert extracted.repairs == ["truncated_string", "truncated_closers"]
+
+    extracted = extract_json('{"0": true, "1": false, "2": tr')
+    assert extracted.value == {"0": True, "1": False}
+    assert extracted.repairs == ["truncated_closers", "dropped_partial_value"]
+
+
+def test_unrecoverable_text_raises():
+    for text in ["no json here", '{"a": tru']:
+        try:
+            extract_json(text)
+        except json.JSONDecodeError:
+            continue
+        raise AssertionError(f"Expected a JSONDecodeError for {text!r}")
+
+
+def test_parse_patch_repairs_json():
+    assert parse_patch('[{"path": "01/1", "answer": "pear", "is_legible": "true"},]') == [
+        {"path": "01/1", "answer": "pear", "is_legible": "true"}
+    ]
+
+
+if __name__ == "__main__":
+    test_valid_json_needs_no_repairs()
+    test_repairs_are_reported()
+    test_truncated_output_is_closed()
+    test_unrecoverable_text_raises()
+    test_parse_patch_repairs_json()
+    print("SUCCESS: JSON extraction tests passed.")
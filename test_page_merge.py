@@ -0,0 +1,76 @@
+from fonix_ocr_bench.page_merge import merge_page_predictions
+
+STRUCTURE = {
+    "paper_title": "",
+    "questions": [
+        {
+            "test_number": "01",
+            "question_type": "FITB",
+            "student_answers": {
+                "1": {"answer": "", "is_legible": ""},
+                "2": {"answer": "", "is_legible": ""}
+            }
+        },
+        {
+            "test_number": "02",
+            "question_type": "W",
+            "student_answers": {"answer": "", "is_legible": ""}
+        }
+    ]
+}
+
+
+def page(q1=None, q2=None, essay=None, title=""):
+    questions = []
+    if q1 is not None or q2 is not None:
+        answers = {}
+        if q1 is not None:
+            answers["1"] = {"answer": q1[0], "is_legible": q1[1]}
+        if q2 is not None:
+            answers["2"] = {"answer": q2[0], "is_legible": q2[1]}
+        questions.append({"test_number": "01", "student_answers": answers})
+    if essay is not None:
+        questions.append({"test_number": "02", "student_answers": {"answer": essay, "is_legible": "true"}})
+    return {"paper_title": title, "questions": questions}
+
+
+def answers(merged, tnum):
+    return next(q for q in merged["questions"] if q["test_number"] == tnum)["student_answers"]
+
+
+def test_non_empty_answers_win_over_empty_pages():
+    pages = [page(q1=("apple", "true")), page(q1=("", ""), q2=("pear", "true"), title="Term 1")]
+    merged, conflicts = merge_page_predictions(STRUCTURE, pages)
+    assert answers(merged, "01")["1"] == {"answer": "apple", "is_legible": "true"}
+    assert answers(merged, "01")["2"] == {"answer": "pear", "is_legible": "true"}
+    assert merged["paper_title"] == "Term 1"
+    assert answers(merged, "02") == {"answer": "", "is_legible": ""}
+    assert conflicts == 0
+
+
+def test_legibility_precedence_then_tie_break():
+    pages = [page(q1=("aple", "false")), page(q1=("apple", "true")), page(q1=("apples", "true"))]
+    merged, conflicts = merge_page_predictions(STRUCTURE, pages, tie_break="first")
+    assert answers(merged, "01")["1"]["answer"] == "apple"
+    assert conflicts == 1
+
+    merged, _ = merge_page_predictions(STRUCTURE, pages, tie_break="last")
+    assert answers(merged, "01")["1"]["answer"] == "apples"
+
+    merged, _ = merge_page_predictions(STRUCTURE, pages, tie_break="longest")
+    assert answers(merged, "01")["1"]["answer"] == "apples"
+
+
+def test_concat_joins_essays_in_page_order_and_ignores_extra_keys():
+    pages = [page(essay="My father is kind."), page(essay="He works hard.")]
+    pages[1]["unexpected"] = "ignored"
+    merged, _ = merge_page_predictions(STRUCTURE, pages, tie_break="concat")
+    assert answers(merged, "02")["answer"] == "My father is kind. He works hard."
+    assert "unexpected" not in merged
+
+
+if __name__ == "__main__":
+    test_non_empty_answers_win_over_empty_pages()
+    test_legibility_precedence_then_tie_break()
+    test_concat_joins_essays_in_page_order_and_ignores_extra_keys()
+    print("SUCCESS: page merge tests passed.")
@@ -0,0 +1,48 @@
+from fonix_ocr_bench.patching import unanswered_paths, format_path_list, parse_patch, apply_patch
+
+STRUCTURE = {
+    "paper_title": "",
+    "questions": [
+        {
+            "test_number": "01",
+            "question_type": "FITB",
+            "instruction": "Fill in the blanks",
+            "student_answers": {
+                "1": {"answer": "apple", "is_legible": "true"},
+                "2": {"a": {"answer": "", "is_legible": ""}}
+            }
+        },
+        {
+            "test_number": "02",
+            "question_type": "W",
+            "student_answers": ""
+        }
+    ]
+}
+
+
+def test_unanswered_paths_lists_empty_slots():
+    paths = unanswered_paths(STRUCTURE)
+    assert [p for p, _ in paths] == ["01/2/a", "02"]
+    listing = format_path_list(paths)
+    assert listing.splitlines()[0] == "01/2/a  [FITB] Fill in the blanks"
+    assert listing.splitlines()[1] == "02  [W]"
+
+
+def test_apply_patch_ignores_unknown_paths():
+    import copy
+    prediction = copy.deepcopy(STRUCTURE)
+    patch = parse_patch('```json\n[{"path": "01/2/a", "answer": "pear", "is_legible": "true"},'
+                        ' {"path": ["02"], "answer": "an essay"},'
+                        ' {"path": "09/1", "answer": "made up"}]\n```')
+    assert apply_patch(prediction, patch) == 2
+    assert prediction["questions"][0]["student_answers"]["2"]["a"] == {"answer": "pear", "is_legible": "true"}
+    assert prediction["questions"][1]["student_answers"] == "an essay"
+    assert unanswered_paths(prediction) == []
+    assert parse_patch('{"edits": []}') == []
+
+
+if __name__ == "__main__":
+    test_unanswered_paths_lists_empty_slots()
+    test_apply_patch_ignores_unknown_paths()
+    print("SUCCESS: patching tests passed.")
@@ -0,0 +1,114 @@
+from fonix_ocr_bench.policy import CircuitBreaker, ResilientModel, RetryPolicy, TokenBucket
+from fonix_ocr_bench.model_interface import ModelInterface, PredictionResult, UsageStats
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FlakyModel(ModelInterface):
+    def __init__(self, failures, code=503):
+        self.failures = failures
+        self.code = code
+        self.calls = 0
+
+    def call(self, prompt, system_instruction, image_path=None):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ProviderError(self.code)
+        return PredictionResult(text="ok", usage=UsageStats(prompt_tokens=10, completion_tokens=2))
+
+    def calculate_cost(self, usage):
+        return 0.0
+
+
+FAST_RETRIES = RetryPolicy(backoff={"server_error": (0.001, 3), "rate_limit": (0.001, 3)})
+
+
+def test_retries_are_recorded_on_the_result():
+    model = ResilientModel(FlakyModel(failures=2), retry_policy=FAST_RETRIES)
+    result = model.call("prompt", "sys")
+    assert result.text == "ok"
+    assert result.retries == 2
+    assert model.policy_stats()["total_retries"] == 2
+
+
+def test_non_retryable_errors_are_raised():
+    model = ResilientModel(FlakyModel(failures=1, code=400), retry_policy=FAST_RETRIES)
+    try:
+        model.call("prompt", "sys")
+    except ProviderError as e:
+        assert e.code == 400
+    else:
+        raise AssertionError("expected ProviderError")
+
+
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01, probe_interval=0.001)
+    model = ResilientModel(FlakyModel(failures=3), retry_policy=FAST_RETRIES, circuit_breaker=breaker)
+    result = model.call("prompt", "sys")
+    assert result.retries == 3
+    assert breaker.trips >= 1
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+class BrokenModel(ModelInterface):
+    def __init__(self, error):
+        self.error = error
+
+    def call(self, prompt, system_instruction, image_path=None):
+        raise self.error
+
+    def calculate_cost(self, usage):
+        return 0.0
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_local_errors_release_the_probe_without_closing_the_breaker():
+    breaker = half_open_breaker()
+    model = ResilientModel(BrokenModel(FileNotFoundError("page.png")), retry_policy=FAST_RETRIES, circuit_breaker=breaker)
+    try:
+        model.call("prompt", "sys")
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError("expected FileNotFoundError")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # The next caller gets to probe instead of waiting
+    assert breaker.acquire() == 0.0
+
+
+def test_client_errors_close_a_half_open_breaker():
+    breaker = half_open_breaker()
+    model = ResilientModel(BrokenModel(ProviderError(400)), retry_policy=FAST_RETRIES, circuit_breaker=breaker)
+    try:
+        model.call("prompt", "sys")
+    except ProviderError:
+        pass
+    else:
+        raise AssertionError("expected ProviderError")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_token_bucket_reports_wait_when_exhausted():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.reserve(2) == 0.0
+    assert 0.9 < bucket.reserve(1) <= 1.0
+
+
+if __name__ == "__main__":
+    test_retries_are_recorded_on_the_result()
+    test_non_retryable_errors_are_raised()
+    test_circuit_breaker_opens_and_recovers()
+    test_local_errors_release_the_probe_without_closing_the_breaker()
+    test_client_errors_close_a_half_open_breaker()
+    test_token_bucket_reports_wait_when_exhausted()
+    print("SUCCESS: policy tests passed.")
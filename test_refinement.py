@@ -0,0 +1,175 @@
+import json
+import pathlib
+import tempfile
+from fonix_ocr_bench import ColumnarEvaluator, DiffRules, Evaluator, Refiner, RefinementStage, VerdictStore
+from fonix_ocr_bench.model_interface import ModelInterface, PredictionResult, UsageStats
+
+GT = {"questions": [
+    {"test_number": "01", "question_type": "FITB", "student_answers": {
+        "1": {"answer": "colour", "crossedout_text": [], "is_legible": "true"}}},
+    {"test_number": "02", "question_type": "W", "student_answers": "the quick brown fox"}
+]}
+
+
+class VerdictModel(ModelInterface):
+    """Judges the "colour" -> "color" spelling variant as no hallucination and everything else as one."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        self.prompts.append(prompt)
+        items = [json.loads(line) for line in prompt.split("ITEMS:\n")[1].split("\n\n")[0].splitlines()]
+        verdicts = {str(item["id"]): item["pred"] != "color" for item in items}
+        return PredictionResult(text=f"```json\n{json.dumps(verdicts)}\n```", usage=UsageStats(prompt_tokens=10, completion_tokens=5))
+
+    def calculate_cost(self, usage):
+        return 0.0
+
+
+def test_refine_sends_only_items_and_recomputes_rates():
+    pred = {"questions": [
+        {"test_number": "01", "student_answers": {"1": {"answer": "color", "is_legible": "true"}}},
+        {"test_number": "02", "student_answers": "the quick brown dog jumps"}
+    ]}
+    metrics = Evaluator().calculate_hallucinations(GT, pred)
+    assert metrics["total_hallucinated_words"] == 3
+
+    model = VerdictModel()
+    refiner = Refiner(model)
+    refined = refiner.refine(metrics)
+    assert len(model.prompts) == 1
+    assert "question_type_metrics" not in model.prompts[0]
+    assert [p["pred_words"] for p in refined["replaced_word_pairs"]] == [["dog", "jumps"]]
+    assert refined["inserted_words"] == metrics["inserted_words"]
+    assert refined["total_hallucinated_words"] == 2
+    assert refined["word_level_hallucination_rate"] == 2 / 5
+    assert refined["question_type_metrics"]["FITB"]["hallu_words"] == 0
+    assert refined["question_type_metrics"]["W"]["hallu_words"] == 2
+    # The evaluator's metrics are left as they were
+    assert metrics["question_type_metrics"]["FITB"]["hallu_words"] == 1
+
+    clean = Evaluator().calculate_hallucinations(GT, GT)
+    assert refiner.refine(clean) == clean
+    assert len(model.prompts) == 1
+    assert refiner.refinement_stats()["skipped"] == 1
+    assert refiner.refinement_stats()["rejected"] == 1
+
+
+def test_refinement_stage_splits_and_merges_verdicts():
+    pred = {"questions": [
+        {"test_number": "01", "student_answers": {"1": {"answer": "color", "is_legible": "true"}}},
+        {"test_number": "02", "student_answers": "a quick brown dog jumps"}
+    ]}
+    metrics = Evaluator().calculate_hallucinations(GT, pred)
+    assert len(Refiner.candidate_items(metrics)) == 3
+
+    model = VerdictModel()
+    refiner = Refiner(model)
+    with RefinementStage(refiner, batch_items=2, concurrency=1, max_wait=0.01) as stage:
+        refined = stage.submit(metrics).result(timeout=10)
+        clean = Evaluator().calculate_hallucinations(GT, GT)
+        assert stage.submit(clean).result() is clean
+    assert len(model.prompts) == 2
+    assert refined == refiner.apply_verdicts(metrics, {0: False, 1: True, 2: True})[0]
+    assert stage.stats()["batches"] == 2
+
+
+def test_verdict_store_resolves_seen_pairs_across_runs():
+    pred = {"questions": [
+        {"test_number": "01", "student_answers": {"1": {"answer": "color", "is_legible": "true"}}},
+        {"test_number": "02", "student_answers": "the quick brown dog"}
+    ]}
+    metrics = Evaluator().calculate_hallucinations(GT, pred)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(pathlib.Path(tmp) / "verdicts.jsonl")
+        model = VerdictModel()
+        first = Refiner(model, VerdictStore(path)).refine(metrics)
+        assert len(model.prompts) == 1
+        assert first["total_hallucinated_words"] == 1
+
+        # A new run with the pair spelled differently only needs the unseen pair judged
+        pred["questions"][0]["student_answers"]["1"]["answer"] = "Color"
+        pred["questions"][1]["student_answers"] = "the quick brown cat"
+        refiner = Refiner(model, VerdictStore(path))
+        second = refiner.refine(Evaluator().calculate_hallucinations(GT, pred))
+        assert len(model.prompts) == 2
+        assert '"pred": "cat"' in model.prompts[1] and "olor" not in model.prompts[1]
+        assert second["total_hallucinated_words"] == 1
+        stats = refiner.refinement_stats()
+        assert (stats["memo_hits"], stats["memo_misses"], stats["memo_hit_rate"]) == (1, 1, 0.5)
+        assert stats["memo_entries"] == 3
+
+
+def test_diff_rules_classify_trivial_pairs():
+    rules = DiffRules()
+    # Case-only pairs never get here; case is folded before the other rules
+    assert rules.classify(["Don’t"], ["don't"]) == "unicode"
+    assert rules.classify(["don’t"], ["don't"]) == "unicode"
+    assert rules.classify(["every", "one"], ["everyone"]) == "whitespace"
+    assert rules.classify(["well-known"], ["well", "known"]) == "hyphenation"
+    assert rules.classify(["end"], ["end."]) == "punctuation"
+    assert rules.classify([], [","]) == "punctuation"
+    assert rules.classify(["love"], ["l0ve"]) == "glyph"
+    assert rules.classify(["colour"], ["co1our."]) == "glyph"
+    # Digits outside words keep their value
+    assert rules.classify(["10"], ["lo"]) is None
+    assert rules.classify(["a", "1"], ["al"]) is None
+    # Spelling changes need explicitly allowed edits, on long enough words
+    assert rules.classify(["colour"], ["color"], "FITB") is None
+    assert DiffRules(max_edits=1).classify(["colour"], ["color"], "FITB") == "edit_distance:1"
+    assert DiffRules(max_edits=1).classify(["cat"], ["cart"]) is None
+    assert DiffRules(max_edits=1).classify(["colour"], ["collar"]) is None
+    assert DiffRules(max_edits=1, max_edits_by_type={"FITB": 0}).classify(["colour"], ["color"], "FITB") is None
+
+
+def test_diff_rules_leave_real_word_swaps_to_refinement():
+    rules = DiffRules()
+    for gt_word, pred_word in [("then", "than"), ("form", "from"), ("modern", "modem"), ("Their", "there")]:
+        assert rules.classify([gt_word], [pred_word], "W") is None
+
+    pred = {"questions": [
+        {"test_number": "01", "student_answers": {"1": {"answer": "colour", "is_legible": "true"}}},
+        {"test_number": "02", "student_answers": "the quick brown form"}
+    ]}
+    gt = {"questions": [GT["questions"][0], {"test_number": "02", "question_type": "W", "student_answers": "the quick brown from"}]}
+    metrics = Evaluator(rules=rules).calculate_hallucinations(gt, pred)
+    assert [p.get("rule") for p in metrics["replaced_word_pairs"]] == [None]
+
+    model = VerdictModel()
+    refiner = Refiner(model)
+    refined = refiner.refine(metrics)
+    assert len(model.prompts) == 1 and '"pred": "form"' in model.prompts[0]
+    assert refined["total_hallucinated_words"] == 1
+    assert refiner.refinement_stats()["rule_resolved"] == 0
+
+
+def test_prefilter_keeps_ruled_pairs_away_from_the_model():
+    pred = {"questions": [
+        {"test_number": "01", "student_answers": {"1": {"answer": "co1our", "is_legible": "true"}}},
+        {"test_number": "02", "student_answers": "the quick , brown fox jumps"}
+    ]}
+    metrics = Evaluator(rules=DiffRules()).calculate_hallucinations(GT, pred)
+    # Raw counts are unchanged, the reasons are recorded on the entries
+    assert metrics["total_hallucinated_words"] == 3
+    assert [p.get("rule") for p in metrics["replaced_word_pairs"]] == ["glyph"]
+    assert [p.get("rule") for p in metrics["inserted_words"]] == ["punctuation", None]
+    assert ColumnarEvaluator(rules=DiffRules()).calculate_hallucinations(GT, pred) == metrics
+
+    model = VerdictModel()
+    refiner = Refiner(model)
+    refined = refiner.refine(metrics)
+    assert len(model.prompts) == 1
+    assert '"pred": "jumps"' in model.prompts[0] and "co1our" not in model.prompts[0] and '"pred": ","' not in model.prompts[0]
+    assert refined["total_hallucinated_words"] == 1
+    assert refiner.refinement_stats()["rule_resolved"] == 2
+
+
+if __name__ == "__main__":
+    test_refine_sends_only_items_and_recomputes_rates()
+    test_refinement_stage_splits_and_merges_verdicts()
+    test_verdict_store_resolves_seen_pairs_across_runs()
+    test_diff_rules_classify_trivial_pairs()
+    test_diff_rules_leave_real_word_swaps_to_refinement()
+    test_prefilter_keeps_ruled_pairs_away_from_the_model()
+    print("SUCCESS: refinement tests passed.")
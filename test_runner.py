@@ -0,0 +1,449 @@
+import asyncio
+import json
+import pathlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import fitz
+from fonix_ocr_bench import BenchmarkDataset, BenchmarkRunner, LocalBatchTransport, ShardedDataset, SummaryAggregator, merge_runs
+from fonix_ocr_bench.cache import CachedModel
+from fonix_ocr_bench.sharding import write_aggregate
+from fonix_ocr_bench.model_interface import ModelInterface, PredictionResult, UsageStats
+
+GT = {
+    "paper_title": "Test Paper",
+    "questions": [
+        {
+            "test_number": "01",
+            "question_type": "FITB",
+            "student_answers": {
+                "1": {"answer": "apple", "crossedout_text": [], "is_legible": "true"},
+                "2": {"answer": "", "crossedout_text": [], "is_legible": ""}
+            }
+        },
+        {
+            "test_number": "02",
+            "question_type": "W",
+            "student_answers": "the quick brown fox"
+        }
+    ]
+}
+
+
+class StubModel(ModelInterface):
+    """Answers recognition prompts with the ground truth and keeps every refinement item."""
+
+    def __init__(self, prediction):
+        self.prediction = prediction
+        self.calls = 0
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        self.calls += 1
+        if "ITEMS:" in prompt:
+            return PredictionResult(text="{}", usage=UsageStats(prompt_tokens=1, completion_tokens=1))
+        return PredictionResult(
+            text=f"```json\n{json.dumps(self.prediction)}\n```",
+            usage=UsageStats(prompt_tokens=100, completion_tokens=20)
+        )
+
+    def calculate_cost(self, usage):
+        return usage.prompt_tokens * 0.001 + usage.completion_tokens * 0.002
+
+
+def make_dataset(data_dir: pathlib.Path, names=("set_1_1", "set_1_2"), pages=2):
+    for name in names:
+        doc = fitz.open()
+        for i in range(pages):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"{name} page {i + 1}")
+        doc.save(data_dir / f"{name}.pdf")
+        doc.close()
+        (data_dir / f"{name}.json").write_text(json.dumps(GT), encoding="utf-8")
+    return BenchmarkDataset(str(data_dir))
+
+
+def read_summary(output_dir: pathlib.Path):
+    run_dir = next(p for p in output_dir.iterdir() if p.is_dir())
+    return run_dir, json.loads((run_dir / "summary.json").read_text(encoding="utf-8"))
+
+
+def test_run_whole_paper():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data")
+        runner = BenchmarkRunner(dataset, StubModel(GT), output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", max_workers=2)
+
+        run_dir, summary = read_summary(tmp / "results")
+        assert len(summary["results"]) == 2
+        assert summary["average_word_level_hallucination_rate"] == 0
+        assert (run_dir / "report.html").exists()
+        assert (run_dir / "set_1_1_result.json").exists()
+        sink_lines = (run_dir / "results.jsonl").read_text(encoding="utf-8").splitlines()
+        assert sorted(json.loads(line)["pdf_name"] for line in sink_lines) == ["set_1_1.pdf", "set_1_2.pdf"]
+
+
+def test_arun_page_by_page():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data")
+        model = StubModel(GT)
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+        asyncio.run(runner.arun("sys", "{STRUCTURE_INJECTED}", page_by_page=True,
+                                page_by_page_prompt_template="{PREVIOUS_JSON}", max_concurrency=8))
+
+        run_dir, summary = read_summary(tmp / "results")
+        assert len(summary["results"]) == 2
+        # 2 pages per sample; predictions match the GT, so refinement is skipped
+        assert model.calls == 4
+        result = json.loads((run_dir / "set_1_2_result.json").read_text(encoding="utf-8"))
+        assert result["usage"]["prompt_tokens"] == 200
+        assert result["prediction"] == GT
+
+
+def test_page_fanout_merges_pages():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", pages=3)
+        model = StubModel(GT)
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True, page_fanout=True,
+                   page_by_page_prompt_template="{PREVIOUS_JSON}", max_workers=2)
+
+        run_dir, summary = read_summary(tmp / "results")
+        assert model.calls == 6
+        assert summary["average_word_level_hallucination_rate"] == 0
+        result = json.loads((run_dir / "set_1_1_result.json").read_text(encoding="utf-8"))
+        assert [p["page"] for p in result["pages"]] == [1, 2, 3]
+        assert result["merge_conflicts"] == 0
+
+
+def test_resume_skips_saved_results_and_continues_pages():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", pages=3)
+        runner = BenchmarkRunner(dataset, StubModel(GT), output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True,
+                   page_by_page_prompt_template="{PREVIOUS_JSON}", max_workers=2)
+        run_dir, _ = read_summary(tmp / "results")
+
+        # Simulate a crash in set_1_2 after its first page
+        (run_dir / "set_1_2_result.json").unlink()
+        checkpoint = run_dir / "checkpoints" / "set_1_2_pages.json"
+        checkpoint.parent.mkdir(exist_ok=True)
+        checkpoint.write_text(json.dumps({
+            "next_page": 1,
+            "current_json": json.dumps(GT),
+            "stats": {"prompt_tokens": 100, "candidate_tokens": 20, "cost": 0.14}
+        }), encoding="utf-8")
+
+        model = StubModel(GT)
+        BenchmarkRunner(dataset, model, output_dir=str(tmp / "results")).run(
+            "sys", "{STRUCTURE_INJECTED}", page_by_page=True,
+            page_by_page_prompt_template="{PREVIOUS_JSON}", resume_from=str(run_dir))
+
+        # Pages 2 and 3 of set_1_2
+        assert model.calls == 2
+        assert not checkpoint.exists()
+        summary = json.loads((run_dir / "summary.json").read_text(encoding="utf-8"))
+        assert sorted(r["pdf_name"] for r in summary["results"]) == ["set_1_1.pdf", "set_1_2.pdf"]
+        result = json.loads((run_dir / "set_1_2_result.json").read_text(encoding="utf-8"))
+        assert result["usage"]["prompt_tokens"] == 300
+
+
+class PatchModel(StubModel):
+    """Answers delta prompts with a patch for the first still-unanswered path."""
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        if "ITEMS:" in prompt:
+            return super().call(prompt, system_instruction, image_path, image_bytes, mime_type)
+        self.calls += 1
+        self.prompts.append(prompt)
+        edits = [{"path": "01/1", "answer": "apple", "is_legible": "true"}] if "01/1" in prompt else []
+        return PredictionResult(text=json.dumps(edits), usage=UsageStats(prompt_tokens=10, completion_tokens=5))
+
+
+def test_page_delta_applies_patches():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", names=("set_1_1",), pages=2)
+        model = PatchModel(GT)
+        model.prompts = []
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True,
+                   page_by_page_prompt_template="{PREVIOUS_JSON}", page_delta=True,
+                   page_delta_prompt_template="{UNANSWERED_PATHS}")
+
+        run_dir, summary = read_summary(tmp / "results")
+        # Page 2 is only asked about the field page 1 left empty
+        assert model.prompts[1].startswith("01/2") and "01/1" not in model.prompts[1]
+        assert summary["average_word_level_hallucination_rate"] == 0
+        result = json.loads((run_dir / "set_1_1_result.json").read_text(encoding="utf-8"))
+        assert result["prediction"]["questions"][0]["student_answers"]["1"]["answer"] == "apple"
+        assert result["usage"]["delta_prompt_tokens_saved"] > 0
+        assert summary["total_delta_tokens_saved"] > 0
+
+
+def test_run_batch_through_local_transport():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data")
+        model = StubModel(GT)
+        transport = LocalBatchTransport(model, jobs_dir=str(tmp / "jobs"))
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+        runner.run_batch("sys", "{STRUCTURE_INJECTED}", transport, poll_interval=0)
+
+        run_dir, summary = read_summary(tmp / "results")
+        requests = (run_dir / "batch_requests.jsonl").read_text(encoding="utf-8").splitlines()
+        assert sorted(json.loads(line)["key"] for line in requests) == ["set_1_1.pdf", "set_1_2.pdf"]
+        assert len(summary["results"]) == 2
+        assert summary["average_word_level_hallucination_rate"] == 0
+
+        # Resuming with every result saved neither resubmits nor recomputes
+        model.calls = 0
+        runner.run_batch("sys", "{STRUCTURE_INJECTED}", transport, poll_interval=0, resume_from=str(run_dir))
+        assert model.calls == 0
+        assert len(list((tmp / "jobs").glob("*.results.jsonl"))) == 1
+
+
+def test_sharded_runs_merge_into_single_run_summary():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        names = ("set_1_1", "set_1_2", "set_2_1", "set_2_2", "set_3_1")
+        dataset = make_dataset(tmp / "data", names=names, pages=1)
+        BenchmarkRunner(dataset, StubModel(GT), output_dir=str(tmp / "single")).run("sys", "{STRUCTURE_INJECTED}")
+        _, single = read_summary(tmp / "single")
+
+        shards = [ShardedDataset(dataset, i, 2) for i in range(2)]
+        assert sorted(s[0] for shard in shards for s in shard) == sorted(s[0] for s in dataset)
+        for shard in shards:
+            BenchmarkRunner(shard, StubModel(GT), output_dir=str(tmp / "shards")).run("sys", "{STRUCTURE_INJECTED}")
+        run_dirs = sorted(str(p) for p in (tmp / "shards").iterdir())
+        assert len(run_dirs) == 2
+        merge_runs(run_dirs, str(tmp / "merged"))
+
+        merged = json.loads((tmp / "merged" / "summary.json").read_text(encoding="utf-8"))
+        assert [r["pdf_name"] for r in merged["results"]] == [r["pdf_name"] for r in single["results"]]
+        assert abs(merged["total_cost"] - single["total_cost"]) < 1e-9
+        assert merged["average_cost"] == single["average_cost"]
+        assert merged["question_type_summary"] == single["question_type_summary"]
+        assert (tmp / "merged" / "report.html").exists()
+
+
+def test_merge_recomputes_rates_and_keeps_settings():
+    def extras(hits, misses, memo_hits, memo_misses, size_bytes):
+        cache = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses),
+                 "entries": size_bytes // 10, "size_bytes": size_bytes, "max_bytes": 1024}
+        return {
+            "response_cache": cache,
+            "page_cache": dict(cache),
+            "refinement": {"calls": memo_misses, "memo_hits": memo_hits, "memo_misses": memo_misses,
+                           "memo_hit_rate": memo_hits / (memo_hits + memo_misses), "memo_entries": 40},
+        }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        run_dirs = []
+        for i, shard_extras in enumerate([extras(3, 1, 3, 1, 500), extras(1, 3, 1, 3, 800)]):
+            run_dir = tmp / f"shard_{i}"
+            run_dir.mkdir()
+            write_aggregate(run_dir, SummaryAggregator(), 1, shard_extras, shard=(i, 2))
+            run_dirs.append(str(run_dir))
+        merge_runs(run_dirs, str(tmp / "merged"))
+
+        merged = json.loads((tmp / "merged" / "summary.json").read_text(encoding="utf-8"))
+        for name in ["response_cache", "page_cache"]:
+            assert merged[name] == {"hits": 4, "misses": 4, "hit_rate": 0.5, "entries": 80, "size_bytes": 800, "max_bytes": 1024}
+        assert merged["refinement"] == {"calls": 4, "memo_hits": 4, "memo_misses": 4, "memo_hit_rate": 0.5, "memo_entries": 40}
+
+
+def test_run_with_evaluation_process_pool():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", names=("set_1_1", "set_1_2", "set_1_3"), pages=1)
+        runner = BenchmarkRunner(dataset, StubModel(GT), output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", max_workers=2, eval_workers=2, eval_queue_size=1)
+
+        run_dir, summary = read_summary(tmp / "results")
+        assert len(summary["results"]) == 3
+        assert summary["average_word_level_hallucination_rate"] == 0
+        assert summary["stages"]["evaluation"]["tasks"] == 3
+        assert summary["stages"]["evaluation"]["max_queue_depth"] == 1
+        assert summary["stages"]["refinement"]["tasks"] == 3
+        assert 0 <= summary["stages"]["recognition"]["utilization"] <= 1
+
+
+class LenientRefinementModel(StubModel):
+    """Judges every refinement item as no hallucination and counts the refinement requests."""
+
+    def __init__(self, prediction):
+        super().__init__(prediction)
+        self.item_counts = []
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        if "ITEMS:" not in prompt:
+            return super().call(prompt, system_instruction, image_path, image_bytes, mime_type)
+        items = [json.loads(line) for line in prompt.split("ITEMS:\n")[1].split("\n\n")[0].splitlines()]
+        self.item_counts.append(len(items))
+        return PredictionResult(text=json.dumps({str(item["id"]): False for item in items}), usage=UsageStats(prompt_tokens=1, completion_tokens=1))
+
+
+def test_batched_refinement_stage():
+    prediction = json.loads(json.dumps(GT))
+    prediction["questions"][1]["student_answers"] = "the quick brown dog"
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", names=("set_1_1", "set_1_2", "set_1_3"), pages=1)
+        model = LenientRefinementModel(prediction)
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", max_workers=3, refine_batch_items=2, refine_concurrency=1)
+
+        run_dir, summary = read_summary(tmp / "results")
+        assert len(summary["results"]) == 3
+        # One error item per paper, at most two per request; the same pair is only sent once per request
+        assert summary["stages"]["refinement"]["items"] == 3
+        assert summary["stages"]["refinement"]["batches"] == len(model.item_counts) >= 2
+        assert model.item_counts == [1] * len(model.item_counts)
+        assert summary["average_word_level_hallucination_rate"] > 0
+        assert summary["average_refined_word_level_hallucination_rate"] == 0
+        result = json.loads((run_dir / "set_1_2_result.json").read_text(encoding="utf-8"))
+        assert result["refined_metrics"]["replaced_word_pairs"] == []
+
+
+class FlakyPageModel(StubModel):
+    """Answers the first page with a trailing comma and the second with no JSON at all."""
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        self.calls += 1
+        text = f"```json\n{json.dumps(self.prediction)[:-1]},}}\n```" if self.calls == 1 else "Sorry, I cannot read this page."
+        return PredictionResult(text=text, usage=UsageStats(prompt_tokens=100, completion_tokens=20))
+
+
+def test_page_by_page_keeps_earlier_pages_on_bad_json():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", names=("set_1_1",), pages=2)
+        runner = BenchmarkRunner(dataset, FlakyPageModel(GT), output_dir=str(tmp / "results"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True, page_by_page_prompt_template="{PREVIOUS_JSON}")
+
+        run_dir, summary = read_summary(tmp / "results")
+        result = json.loads((run_dir / "set_1_1_result.json").read_text(encoding="utf-8"))
+        assert result["prediction"] == GT
+        assert result["json_repairs"] == [{"source": "page 1 of set_1_1.pdf", "repairs": ["trailing_comma"]}]
+        assert summary["average_word_level_hallucination_rate"] == 0
+
+
+class LegacyModel(ModelInterface):
+    """A model written against the `call` signature from before `mime_type` existed."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None):
+        self.calls += 1
+        return PredictionResult(text=f"```json\n{json.dumps(GT)}\n```", usage=UsageStats(prompt_tokens=1, completion_tokens=1))
+
+    def calculate_cost(self, usage):
+        return 0.0
+
+
+def test_page_modes_work_with_legacy_model_signature():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data", names=("set_1_1",), pages=2)
+        model = LegacyModel()
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "sequential"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True, page_by_page_prompt_template="{PREVIOUS_JSON}")
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "fanout"))
+        runner.run("sys", "{STRUCTURE_INJECTED}", page_by_page=True, page_fanout=True, page_by_page_prompt_template="{PREVIOUS_JSON}")
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "async"))
+        asyncio.run(runner.arun("sys", "{STRUCTURE_INJECTED}", page_by_page=True, page_by_page_prompt_template="{PREVIOUS_JSON}"))
+
+        assert model.calls == 6
+        for mode in ["sequential", "fanout", "async"]:
+            _, summary = read_summary(tmp / mode)
+            assert len(summary["results"]) == 1
+
+
+class BarrierModel(StubModel):
+    """Sync-only model whose calls wait for each other, so they only finish when run in parallel."""
+
+    def __init__(self, prediction, parties):
+        super().__init__(prediction)
+        self.barrier = threading.Barrier(parties, timeout=5)
+        self.threads = set()
+
+    def call(self, prompt, system_instruction, image_path=None, image_bytes=None, mime_type=None):
+        self.threads.add(threading.current_thread().name)
+        self.barrier.wait()
+        return super().call(prompt, system_instruction, image_path, image_bytes, mime_type)
+
+
+def test_arun_leaves_caller_executor_alone():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data")
+        model = BarrierModel(GT, parties=2)
+        runner = BenchmarkRunner(dataset, model, output_dir=str(tmp / "results"))
+
+        async def main():
+            loop = asyncio.get_running_loop()
+            caller = ThreadPoolExecutor(max_workers=1, thread_name_prefix="caller")
+            loop.set_default_executor(caller)
+            await runner.arun("sys", "{STRUCTURE_INJECTED}", max_concurrency=2)
+            return await loop.run_in_executor(None, lambda: threading.current_thread().name)
+
+        assert asyncio.run(main()).startswith("caller")
+        # The sync model ran on the run's pool, two calls at a time, not on the caller's single thread
+        assert len(model.threads) == 2 and not any(name.startswith("caller") for name in model.threads)
+        _, summary = read_summary(tmp / "results")
+        assert len(summary["results"]) == 2
+
+
+def test_cache_hits_count_as_saved_not_spent():
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = pathlib.Path(tmp)
+        (tmp / "data").mkdir()
+        dataset = make_dataset(tmp / "data")
+        model = CachedModel(StubModel(GT), cache_dir=str(tmp / "cache"))
+        BenchmarkRunner(dataset, model, output_dir=str(tmp / "first")).run("sys", "{STRUCTURE_INJECTED}")
+        BenchmarkRunner(dataset, model, output_dir=str(tmp / "second")).run("sys", "{STRUCTURE_INJECTED}")
+
+        _, first = read_summary(tmp / "first")
+        run_dir, second = read_summary(tmp / "second")
+        assert first["total_cost"] > 0 and "total_saved_cost" not in first
+        assert second["total_cost"] == 0
+        assert second["total_saved_cost"] == first["total_cost"]
+        assert second["total_cached_responses"] == 2
+        result = json.loads((run_dir / "set_1_1_result.json").read_text(encoding="utf-8"))
+        assert result["usage"]["prompt_tokens"] == 0 and result["usage"]["cached_responses"] == 1
+
+
+if __name__ == "__main__":
+    test_run_whole_paper()
+    test_arun_page_by_page()
+    test_page_fanout_merges_pages()
+    test_resume_skips_saved_results_and_continues_pages()
+    test_page_delta_applies_patches()
+    test_run_batch_through_local_transport()
+    test_sharded_runs_merge_into_single_run_summary()
+    test_merge_recomputes_rates_and_keeps_settings()
+    test_run_with_evaluation_process_pool()
+    test_batched_refinement_stage()
+    test_page_modes_work_with_legacy_model_signature()
+    test_page_by_page_keeps_earlier_pages_on_bad_json()
+    test_arun_leaves_caller_executor_alone()
+    test_cache_hits_count_as_saved_not_spent()
+    print("SUCCESS: runner tests passed.")
@@ -0,0 +1,79 @@
+import random
+from difflib import SequenceMatcher
+from fonix_ocr_bench import word_diff
+from fonix_ocr_bench.utils import align_words
+
+
+def sequence_matcher_diff(gt, pred):
+    """The previous `word_diff`, kept as the reference implementation."""
+    gt_words = gt.split()
+    pred_words = pred.split()
+    matcher = SequenceMatcher(None, [w.lower() for w in gt_words], [w.lower() for w in pred_words])
+    return [(tag, gt_words[i1:i2], pred_words[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+
+
+def lcs_length(a, b):
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a)):
+        for j in range(len(b)):
+            rows[i + 1][j + 1] = rows[i][j] + 1 if a[i] == b[j] else max(rows[i][j + 1], rows[i + 1][j])
+    return rows[-1][-1]
+
+
+def ocr_noise(rng, words, rate):
+    noisy = []
+    for word in words:
+        r = rng.random()
+        if r < rate / 3:
+            continue
+        if r < 2 * rate / 3:
+            noisy.append(word.upper() if rng.random() < 0.5 else word + "x")
+            continue
+        noisy.append(word)
+        if r < rate:
+            noisy.append(f"extra{rng.randrange(1000)}")
+    return noisy
+
+
+def test_matches_sequence_matcher_on_ocr_noise():
+    rng = random.Random(7)
+    for _ in range(300):
+        gt = [f"w{i}" for i in range(rng.randint(0, 150))]
+        pred = ocr_noise(rng, gt, 0.15)
+        gt_text, pred_text = " ".join(gt), " ".join(pred)
+        assert word_diff(gt_text, pred_text) == sequence_matcher_diff(gt_text, pred_text)
+
+    assert word_diff("The cat sat", "the dog sat down") == [("replace", ["cat"], ["dog"]), ("insert", [], ["down"])]
+
+
+def test_alignment_is_a_longest_common_subsequence():
+    rng = random.Random(3)
+    for _ in range(1000):
+        a = [rng.choice("abcdE") for _ in range(rng.randint(0, 20))]
+        b = [rng.choice("abcDe") for _ in range(rng.randint(0, 20))]
+        opcodes = align_words(a, b)
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            assert (i1, j1) == (i, j)
+            if tag == "equal":
+                assert [w.lower() for w in a[i1:i2]] == [w.lower() for w in b[j1:j2]]
+            i, j = i2, j2
+        assert (i, j) == (len(a), len(b))
+        aligned = sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal")
+        assert aligned == lcs_length([w.lower() for w in a], [w.lower() for w in b])
+
+
+def test_long_essay_has_no_junk_heuristic():
+    # Over 200 words SequenceMatcher treats words making up more than 1% of the text as junk
+    # and can no longer match a lone "the" between two misread words
+    gt = " ".join(f"the w{i}" for i in range(300))
+    pred = gt.replace("w150 the w151", "w15O the w15l")
+    assert word_diff(gt, pred) == [("replace", ["w150"], ["w15O"]), ("replace", ["w151"], ["w15l"])]
+    assert sequence_matcher_diff(gt, pred) == [("replace", ["w150", "the", "w151"], ["w15O", "the", "w15l"])]
+
+
+if __name__ == "__main__":
+    test_matches_sequence_matcher_on_ocr_noise()
+    test_alignment_is_a_longest_common_subsequence()
+    test_long_essay_has_no_junk_heuristic()
+    print("SUCCESS: word diff tests passed.")